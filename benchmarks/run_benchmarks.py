@@ -0,0 +1,294 @@
+"""
+Micro-benchmarks over the bundled example data.
+
+Times the hot paths of the pipeline on the files in data/example/ and writes the
+results as JSON so runs can be compared over time:
+
+    - lidar.tile_bounds                     (header read)
+    - lidar.get_metadata                    (full read and chunked)
+    - lidar.run_pdal_pipeline               (once per template in config/pdal_pipeline_templates/)
+    - hillshade() from main/view_dtm.py     (on an example DTM)
+    - VAT combination from scripts/VAT_combined.py (needs rvt)
+
+Each benchmark runs in a fresh process so its peak RSS is its own, not the
+high-water mark of everything that ran before it. Benchmarks whose inputs or
+optional dependencies are missing are reported as skipped.
+
+Usage (from the repo root):
+
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --laz data/raw/laz/RIB_A01_2014_laz_2.laz
+    python -m benchmarks.run_benchmarks --repeats 5 --only get_metadata hillshade
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<baseline>.json --threshold 0.15
+
+With --compare, a benchmark regresses if its median time or peak RSS is more than
+--threshold (fractional) worse than the baseline, or its points/s is that much
+lower; the script then exits with status 1.
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import importlib.util
+import multiprocessing as mp
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+EXAMPLE_DIR = REPO_ROOT / "data" / "example"
+TEMPLATE_DIR = REPO_ROOT / "config" / "pdal_pipeline_templates"
+RVT_SETTINGS_DIR = REPO_ROOT / "config" / "rvt_settings"
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+DEFAULT_DTM = EXAMPLE_DIR / "SFX_A01_2012_laz_1_denoised_dtm.tif"
+
+class Skip(Exception):
+    """Raised by a benchmark whose inputs or dependencies are unavailable."""
+
+def _load_module(name, path):
+    # main/ and scripts/ are not packages (and main.py shadows main/), so load by path
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _require_file(path):
+    if path is None:
+        raise Skip("no LAZ tile given (--laz PATH); none ships in data/example/")
+    if not os.path.isfile(path):
+        raise Skip(f"input not found: {path}")
+
+def _laz_point_count(laz_path):
+    import laspy
+    with laspy.open(str(laz_path)) as fh:
+        return int(fh.header.point_count)
+
+# --- Benchmarks ---------------------------------------------------------------
+# Each returns (fn, n_points or None); fn is timed and called `repeats` times.
+
+def bench_tile_bounds(args):
+    _require_file(args.laz)
+    import src.lidar as lidar
+    return (lambda: lidar.tile_bounds(args.laz)), None
+
+def bench_get_metadata(args):
+    _require_file(args.laz)
+    import src.lidar as lidar
+    return (lambda: lidar.get_metadata(args.laz, 1.0)), _laz_point_count(args.laz)
+
+def bench_get_metadata_chunked(args):
+    _require_file(args.laz)
+    import src.lidar as lidar
+    return (lambda: lidar.get_metadata(args.laz, 1.0, chunk_size=args.chunk_size)), _laz_point_count(args.laz)
+
+def _make_pipeline_bench(template_path):
+    def bench(args):
+        _require_file(args.laz)
+        import src.lidar as lidar
+        out_dir = os.path.join(tempfile.gettempdir(), "openai_to_z_bench_dtm")
+
+        def run():
+            lidar.run_pdal_pipeline(args.laz, out_dir, template_path, verbose=0, cache_mode="none")
+
+        return run, _laz_point_count(args.laz)
+    return bench
+
+def bench_hillshade(args):
+    _require_file(args.dtm)
+    import numpy as np
+    import rasterio
+    view_dtm = _load_module("view_dtm", REPO_ROOT / "main" / "view_dtm.py")
+    with rasterio.open(args.dtm) as src:
+        dem = src.read(1).astype("float64")
+        nodata = src.nodata
+    dem = np.where((dem == nodata) | (dem < -100) | (dem > 9999), np.nan, dem)
+    dem = np.nan_to_num(dem, nan=np.nanmean(dem))
+    return (lambda: view_dtm.hillshade(dem, azimuth=315, angle_altitude=45)), None
+
+def bench_vat_combined(args):
+    _require_file(args.dtm)
+    try:
+        vat = _load_module("VAT_combined", REPO_ROOT / "scripts" / "VAT_combined.py")
+    except ImportError as e:
+        raise Skip(f"rvt not available ({e})")
+    in_dir, name = os.path.split(os.path.abspath(args.dtm))
+
+    def run():
+        out_dir = tempfile.mkdtemp(prefix="bench_vat_")
+        try:
+            vat.combined_VAT(
+                in_dir, out_dir, 50,
+                vat_combination_json_path=str(RVT_SETTINGS_DIR / "blender_VAT.json"),
+                terrains_sett_json_path=str(RVT_SETTINGS_DIR / "default_terrains_settings.json"),
+                nr_processes=1, save_float=True, files=[name]
+            )
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    return run, None
+
+def get_benchmarks():
+    benchmarks = {
+        "tile_bounds": bench_tile_bounds,
+        "get_metadata": bench_get_metadata,
+        "get_metadata_chunked": bench_get_metadata_chunked,
+    }
+    for template_path in sorted(glob.glob(str(TEMPLATE_DIR / "*.json"))):
+        benchmarks[f"run_pdal_pipeline[{Path(template_path).stem}]"] = _make_pipeline_bench(template_path)
+    benchmarks["hillshade"] = bench_hillshade
+    benchmarks["vat_combined"] = bench_vat_combined
+    return benchmarks
+
+# --- Runner -------------------------------------------------------------------
+
+def _run_in_child(name, args, conn):
+    """Child process entry: set up and time one benchmark, send the result back."""
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    import io
+    import contextlib
+    from src.run_report import peak_rss_mb
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn, n_points = get_benchmarks()[name](args)
+            fn()  # warm-up (imports, file cache)
+            times = []
+            for _ in range(args.repeats):
+                t0 = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - t0)
+        median = statistics.median(times)
+        conn.send({
+            "status": "ok",
+            "repeats": args.repeats,
+            "median_s": median,
+            "min_s": min(times),
+            "max_s": max(times),
+            "points": n_points,
+            "points_per_s": n_points / median if n_points and median > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+    except Skip as e:
+        conn.send({"status": "skipped", "reason": str(e)})
+    except ImportError as e:
+        conn.send({"status": "skipped", "reason": f"missing dependency ({e})"})
+    except Exception as e:
+        conn.send({"status": "error", "reason": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+def run_benchmark(name, args):
+    ctx = mp.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_run_in_child, args=(name, args, child_conn))
+    proc.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {"status": "error", "reason": f"benchmark process exited with code {proc.exitcode}"}
+    proc.join()
+    return result
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+def compare(results, baseline, threshold):
+    """Return a list of human-readable regressions of *results* vs *baseline*."""
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or cur.get("status") != "ok" or base.get("status") != "ok":
+            continue
+        for key, higher_is_worse in (("median_s", True), ("peak_rss_mb", True), ("points_per_s", False)):
+            b, c = base.get(key), cur.get(key)
+            if not b or c is None:
+                continue
+            change = (c - b) / b
+            if (higher_is_worse and change > threshold) or (not higher_is_worse and -change > threshold):
+                regressions.append(f"{name}: {key} {b:.4g} -> {c:.4g} ({change:+.1%})")
+    return regressions
+
+def print_results(results):
+    print(f"{'Benchmark':<50} {'median (s)':>11} {'min (s)':>9} {'pt/s':>14} {'peak RSS (MiB)':>15}")
+    print("-" * 103)
+    for name, r in results.items():
+        if r["status"] != "ok":
+            print(f"{name:<50} {r['status'].upper()}: {r['reason']}")
+            continue
+        pps = f"{r['points_per_s']:,.0f}" if r["points_per_s"] else "-"
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        print(f"{name:<50} {r['median_s']:>11.4f} {r['min_s']:>9.4f} {pps:>14} {rss:>15}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run micro-benchmarks over the example data in data/example/.")
+    parser.add_argument("--laz", default=None, help="LAZ tile for the header, metadata and PDAL pipeline benchmarks, e.g. data/raw/laz/RIB_A01_2014_laz_2.laz (skipped if not given)")
+    parser.add_argument("--dtm", default=str(DEFAULT_DTM), help=f"Example DTM GeoTIFF (default: {DEFAULT_DTM.relative_to(REPO_ROOT)})")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repeats per benchmark after one warm-up run (default: 3)")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="Chunk size for get_metadata_chunked (default: 1,000,000)")
+    parser.add_argument("--only", nargs="*", default=None, help="Run only benchmarks whose name starts with one of these")
+    parser.add_argument("--output", default=None, help="Results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Fractional regression threshold for --compare (default: 0.10)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    args.laz = os.path.abspath(args.laz) if args.laz else None
+    args.dtm = os.path.abspath(args.dtm)
+
+    names = list(get_benchmarks())
+    if args.only:
+        names = [n for n in names if any(n.startswith(prefix) for prefix in args.only)]
+
+    results = {}
+    for name in names:
+        print(f"[bench] {name} ...", flush=True)
+        results[name] = run_benchmark(name, args)
+
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "inputs": {"laz": args.laz, "dtm": args.dtm, "repeats": args.repeats},
+        "results": results,
+    }
+
+    output = args.output or str(RESULTS_DIR / f"{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print()
+    print_results(results)
+    print(f"\nResults written to: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions vs {args.compare} (threshold {args.threshold:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.compare} (threshold {args.threshold:.0%}).")
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,10 @@ Used functions in main.py:
 src/config.py: Config
 src/satellite.py: show_sat_image
 src/lidar.py: print_metadata_table, run_pdal_pipeline
+src/metadata_cache.py: MetadataCache, file_sha256
+src/run_journal.py: append_entry, resume_plan
+src/tile_index.py: TileIndex
+src/vrt.py: update_vrt
 
 """
 
@@ -15,11 +19,17 @@ import time
 import argparse
 import pandas as pd
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import src.config as config
 import src.satellite as satellite
 import src.lidar as lidar
+import src.metadata_cache as metadata_cache
+import src.tile_index as tile_index
+import src.run_journal as run_journal
+import src.stage_cache as stage_cache
+import src.vrt as vrt
 
 def check_positive(value):
     ivalue = int(value)
@@ -27,7 +37,13 @@ def check_positive(value):
         raise argparse.ArgumentTypeError("%s is an invalid positive int value, must be >= 1" % value)
     return ivalue
 
-def setup_logging(logfile="log.txt"):
+def check_non_negative(value):
+    ivalue = int(value)
+    if ivalue < 0:
+        raise argparse.ArgumentTypeError("%s is an invalid non-negative int value, must be >= 0" % value)
+    return ivalue
+
+def setup_logging(logfile="log.txt", banner=True):
     logging.basicConfig(
         level=logging.INFO,
         format="[%(asctime)s] %(levelname)s: %(message)s",
@@ -36,7 +52,39 @@ def setup_logging(logfile="log.txt"):
             logging.StreamHandler(sys.stdout)
         ]
     )
-    logging.info("=== Pipeline run started ===")
+    if banner:
+        logging.info("=== Pipeline run started ===")
+
+def run_tile(filename, laz_path, tile_area_m2, dtm_dir, pipeline, print_metadata=False, metadata_chunk_size=None, cache=None, dtm_cache="manifest", report_path=None, profile_stages=False, chunk_size=None, chunk_buffer=50.0, chunk_workers=1, stage_cache_dir=None, cog_compression=None, stage_cache_max_gb=None, checksum=False):
+    """
+    Run the PDAL pipeline for a single tile. Module-level so it can be
+    dispatched to a worker process; exceptions propagate to the caller.
+
+    Returns:
+        tuple: (output_path, duration_s, sha256 of the output if checksum else None)
+    """
+    if print_metadata:
+        logging.info(f"Printing metadata for {filename}")
+        lidar.print_metadata_table(laz_path, tile_area_m2, chunk_size=metadata_chunk_size, cache=cache)
+
+    start_time = time.time()
+    output_path = lidar.run_pdal_pipeline(
+        laz_path,
+        dtm_dir,
+        pipeline,
+        verbose=2,
+        cache_mode=dtm_cache,
+        report_path=report_path,
+        profile_stages=profile_stages,
+        chunk_size=chunk_size,
+        chunk_buffer=chunk_buffer,
+        chunk_workers=chunk_workers,
+        stage_cache_dir=stage_cache_dir,
+        cog_compression=cog_compression,
+        stage_cache_max_gb=stage_cache_max_gb
+    )
+    duration = time.time() - start_time
+    return output_path, duration, metadata_cache.file_sha256(output_path) if checksum else None
 
 if __name__ == "__main__":
     setup_logging()
@@ -50,6 +98,23 @@ if __name__ == "__main__":
     parser.add_argument("--tile-name", default=None, help="Specify a specific tile (optional, mutually exclusive with --tiles)")
     parser.add_argument("--tiles", default=None, help="Path to a text or CSV file specifying filenames to process (mutually exclusive with --tile-name)")
     parser.add_argument("--tile-csv-col", default="filename", help="Column name in CSV for tile names (default: 'filename')")
+    parser.add_argument("--metadata-chunk-size", type=check_positive, default=None, metavar="N", help="With --print-metadata, stream each tile in chunks of N points instead of reading it whole (bounded memory)")
+    parser.add_argument("--no-metadata-cache", action="store_true", help="With --print-metadata, always recompute stats instead of reading the per-tile metadata cache")
+    parser.add_argument("--dtm-cache", choices=lidar.DTM_CACHE_MODES, default="manifest", help="Reuse existing DTMs: 'manifest' only if pipeline/input/PDAL version are unchanged (default), 'adopt' as manifest but first keep DTMs made before manifests existed (one-off), 'exists' if the .tif exists, 'none' to always recompute")
+    parser.add_argument("--run-report", default=None, metavar="PATH", help="JSONL run report with one record per tile (default: run_report.jsonl in the DTM directory)")
+    parser.add_argument("--profile-stages", action="store_true", help="Execute pipelines stage by stage and record per-stage time, points in/out and peak RSS in the run report")
+    parser.add_argument("--workers", type=check_positive, default=1, metavar="N", help="Number of tiles to process in parallel, one PDAL pipeline per worker process (default: 1)")
+    parser.add_argument("--chunk-size", type=float, default=None, metavar="M", help="Process each tile in buffered sub-tiles of M x M metres and mosaic the result (bounds memory on very large tiles)")
+    parser.add_argument("--chunk-buffer", type=float, default=50.0, metavar="M", help="With --chunk-size, overlap around each sub-tile in metres; keep it above the largest filter window (default: 50)")
+    parser.add_argument("--chunk-workers", type=check_positive, default=1, metavar="N", help="With --chunk-size, sub-tiles to run in parallel within a tile (default: 1)")
+    parser.add_argument("--stage-cache", default=None, metavar="DIR", help="Cache the denoised output of the readers.las + filters.outlier prefix as uncompressed LAS in DIR and reuse it across templates and re-runs (several times the LAZ size on disk; off by default)")
+    parser.add_argument("--stage-cache-max-gb", type=float, default=stage_cache.DEFAULT_STAGE_CACHE_MAX_GB, metavar="GB", help=f"With --stage-cache, remove least recently used files beyond this size; 0 for no limit (default: {stage_cache.DEFAULT_STAGE_CACHE_MAX_GB:g})")
+    parser.add_argument("--cog", choices=lidar.COG_COMPRESSIONS, default=None, help="Write DTMs as tiled Cloud-Optimized GeoTIFFs with internal overviews and this compression (floating-point predictor)")
+    parser.add_argument("--build-vrt", action="store_true", help="After the run, create/update a VRT mosaic over all DTMs in the DTM directory (<dtm dir name>.vrt)")
+    parser.add_argument("--journal", default=None, metavar="PATH", help="Append-only journal of per-tile state, duration, error and output size/mtime (default: run_journal.jsonl in the DTM directory)")
+    parser.add_argument("--resume", action="store_true", help="Skip tiles the journal records as done (output still present with the recorded size and mtime) and retry failed ones")
+    parser.add_argument("--verify-checksums", action="store_true", help="Record the SHA-256 of each output in the journal and, with --resume, re-hash done outputs against it (reads every output)")
+    parser.add_argument("--max-retries", type=check_non_negative, default=2, metavar="N", help="With --resume, give up on tiles that already failed more than N times in a row (default: 2)")
     args = parser.parse_args()
 
     if args.tile_name and args.tiles:
@@ -71,6 +136,13 @@ if __name__ == "__main__":
     pipeline_template_dir = cfg["path_to_pdal_templates"]
     pdal_pipeline_filename = cfg["pdal_pipeline_filename"]
     pipeline_path = os.path.join(CWD, pipeline_template_dir, pdal_pipeline_filename)
+    run_report_path = args.run_report or os.path.join(dtm_dir, "run_report.jsonl")
+    journal_path = args.journal or os.path.join(dtm_dir, "run_journal.jsonl")
+    stage_cache_dir = args.stage_cache
+    stage_cache_max_gb = args.stage_cache_max_gb or None
+    metadata_cache_path = os.path.join(
+        CWD, cfg["path_to_metadata"], cfg.get("metadata_cache_filename", "laz_metadata_cache.sqlite")
+    )
 
     # Verify critical files (unchanged)
     if not os.path.exists(dataset_metadata_path):
@@ -81,14 +153,31 @@ if __name__ == "__main__":
         sys.exit(1)
 
     try:
-        df = pd.read_csv(dataset_metadata_path)
+        index = tile_index.TileIndex.from_csv(
+            dataset_metadata_path,
+            cache_format=cfg.get("metadata_table_cache_format")
+        )
+        df = index.df
     except Exception as e:
         logging.error(f"Failed to read dataset metadata: {e}")
         sys.exit(1)
 
+    cache = None
+    if args.print_metadata and not args.no_metadata_cache:
+        cache = metadata_cache.MetadataCache(metadata_cache_path)
+        logging.info(f"Metadata cache: {metadata_cache_path}")
+
     logging.info(f"Loaded metadata: {dataset_metadata_path}, {len(df)} rows")
     logging.info(f"Pipeline JSON: {pipeline_path}")
 
+    # Parse and validate the template once; the parsed object is shared with every tile/worker
+    try:
+        pipeline_template = lidar.load_pipeline_template(pipeline_path)
+    except Exception as e:
+        logging.error(f"Invalid PDAL pipeline template {pipeline_path}: {e}")
+        sys.exit(1)
+    logging.info(f"Pipeline stages: {' -> '.join(str(t) for t in pipeline_template.stage_types)}")
+
     # Figure out what tiles to process
     tiles_to_process = None
 
@@ -125,16 +214,16 @@ if __name__ == "__main__":
         tiles_to_process = [args.tile_name]
     else:
         # Default behaviour (first N in full metadata)
-        tiles_to_process = list(df["filename"].head(args.n_tiles))
+        tiles_to_process = index.head(args.n_tiles)
 
+    # Resolve each tile to its work item; cheap checks and interactive display stay in this process
+    jobs = []
     for i, tile_name in enumerate(tiles_to_process, 1):
         try:
-            row = df[df["filename"] == tile_name]
-            if len(row) == 0:
+            if tile_name not in index:
                 logging.error(f"Tile '{tile_name}' not found in metadata!")
                 continue
-            row = row.iloc[0]
-            filename = row["filename"]
+            filename = tile_name
             laz_path = os.path.join(laz_raw_dir, filename)
 
             logging.info(f"Tile {i}/{len(tiles_to_process)}: {filename}")
@@ -147,28 +236,72 @@ if __name__ == "__main__":
             if args.show_sat:
                 satellite_img_path = Path(sat_raw_dir) / f"{Path(filename).stem}.png"
                 logging.info(f"Showing satellite image for {filename} (output: {satellite_img_path})")
-                satellite.show_sat_image(df, filename, save_path=satellite_img_path, overwrite=True)
-
-            if args.print_metadata:
-                logging.info(f"Printing metadata for {filename}")
-                lidar.print_metadata_table(laz_path, row["tile_area_m2"])
-
-            start_time = time.time()
-            output_path = lidar.run_pdal_pipeline(
-                laz_path,
-                dtm_dir,
-                pipeline_path,
-                verbose=2
-            )
-            duration = time.time() - start_time
-
-            logging.info(f"Pipeline for {filename} output: {output_path} (elapsed: {duration:.1f}s)")
+                satellite.show_sat_image(df, filename, save_path=satellite_img_path, overwrite=True, coords=index.bbox(filename))
 
-            # If processing only one due to --tile-name, can optionally break
-            # Not needed since tiles_to_process is correct length.
+            jobs.append((filename, laz_path, index.area(filename)))
 
         except Exception as e:
             logging.exception(f"Error processing tile {tile_name}: {e}")
             continue
 
+    # Journal entries are keyed by absolute input path so runs from another cwd still match
+    if args.resume:
+        to_run, done, given_up = run_journal.resume_plan(
+            journal_path, [os.path.abspath(laz_path) for _, laz_path, _ in jobs],
+            max_retries=args.max_retries, verify_checksum=args.verify_checksums
+        )
+        for laz_path in given_up:
+            logging.warning(f"Failed more than {args.max_retries} times according to {journal_path}, not retrying: {laz_path}")
+        logging.info(f"Resuming from {journal_path}: {len(done)} done, {len(given_up)} given up, {len(to_run)} to run")
+        to_run = set(to_run)
+        jobs = [job for job in jobs if os.path.abspath(job[1]) in to_run]
+
+    def record_result(progress, filename, laz_path, get_result):
+        # Called in this process only, so the journal has a single writer
+        try:
+            output_path, duration, sha256 = get_result()
+            logging.info(f"{progress}Pipeline for {filename} output: {output_path} (elapsed: {duration:.1f}s)")
+            run_journal.append_entry(
+                journal_path, os.path.abspath(laz_path), "done", output=os.path.abspath(output_path),
+                elapsed_s=round(duration, 3), sha256=sha256, **run_journal.output_stat(output_path)
+            )
+        except Exception as e:
+            logging.exception(f"{progress}Error processing tile {filename}: {e}")
+            run_journal.append_entry(journal_path, os.path.abspath(laz_path), "failed", error=f"{type(e).__name__}: {e}")
+
+    if args.workers == 1:
+        for filename, laz_path, tile_area_m2 in jobs:
+            record_result("", filename, laz_path, lambda: run_tile(
+                filename, laz_path, tile_area_m2, dtm_dir, pipeline_template,
+                args.print_metadata, args.metadata_chunk_size, cache, args.dtm_cache,
+                run_report_path, args.profile_stages, args.chunk_size, args.chunk_buffer, args.chunk_workers, stage_cache_dir, args.cog, stage_cache_max_gb, args.verify_checksums
+            ))
+    else:
+        logging.info(f"Processing {len(jobs)} tiles with {args.workers} worker processes")
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=setup_logging,
+            initargs=("log.txt", False)
+        ) as executor:
+            futures = {
+                executor.submit(
+                    run_tile, filename, laz_path, tile_area_m2, dtm_dir, pipeline_template,
+                    args.print_metadata, args.metadata_chunk_size, cache, args.dtm_cache,
+                    run_report_path, args.profile_stages, args.chunk_size, args.chunk_buffer, args.chunk_workers, stage_cache_dir, args.cog, stage_cache_max_gb, args.verify_checksums
+                ): (filename, laz_path)
+                for filename, laz_path, tile_area_m2 in jobs
+            }
+            for n_done, future in enumerate(as_completed(futures), 1):
+                filename, laz_path = futures[future]
+                record_result(f"[{n_done}/{len(jobs)}] ", filename, laz_path, future.result)
+
+    if args.build_vrt:
+        try:
+            vrt_path = vrt.update_vrt(dtm_dir, verbose=0)
+            logging.info(f"VRT mosaic: {vrt_path}")
+        except Exception as e:
+            logging.exception(f"Failed to update VRT mosaic for {dtm_dir}: {e}")
+
+    logging.info(f"Journal: {journal_path}")
+    logging.info(f"Run report: {run_report_path} (summarise with: python -m src.run_report {run_report_path})")
     logging.info("=== Pipeline run completed ===")
\ No newline at end of file
@@ -1,13 +1,20 @@
 import os
 import sys
+import math
 import argparse
 import logging
 from pathlib import Path
 import tempfile
 import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import laspy
 import pdal
 import json
 
+# Runnable as 'python main/lidar_enhance.py' from anywhere: make the repo root importable for src.*
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.metadata_cache import DEFAULT_CACHE_PATH, MetadataCache
+
 def setup_logging(logfile="enhance_laz_log.txt"):
     logging.basicConfig(
         level=logging.INFO,
@@ -23,28 +30,144 @@ def find_laz_files(input_dir, prefix="RIB"):
     # Finds all .laz files that start with specified prefix in input_dir
     return sorted(str(p) for p in Path(input_dir).glob(f"{prefix}*.laz"))
 
-def filter_ground_points(infile, outfile):
+def read_file_list(list_path, input_dir):
+    # One filename per line, relative to input_dir unless absolute (e.g. from src/overlap_clusters.py)
+    with open(list_path) as f:
+        names = [line.strip() for line in f if line.strip()]
+    return sorted(str(Path(input_dir) / n) for n in names)
+
+DEFAULT_STREAM_CHUNK_SIZE = 100_000
+
+def execute_pipeline(pipeline, stream_chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    """
+    Execute a PDAL pipeline (list of stages), in streaming mode when every stage
+    supports it so memory stays at ~stream_chunk_size points instead of the whole
+    point view. Falls back to standard execution for non-streamable pipelines
+    (e.g. voxel filters) or stream_chunk_size=None/0.
+    """
+    pl = pdal.Pipeline(json.dumps({"pipeline": pipeline}))
+    # Pipeline.streamable / execute_streaming need python-pdal >= 3.2
+    if stream_chunk_size and getattr(pl, "streamable", False):
+        return pl.execute_streaming(chunk_size=stream_chunk_size)
+    return pl.execute()
+
+def filter_ground_points(infile, outfile, stream_chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    # A .las outfile is written uncompressed: the merge step reads it straight back,
+    # so LAZ compression would be paid twice for nothing
     pipeline = [
         {"type": "readers.las", "filename": str(infile)},
         {"type": "filters.range", "limits": "Classification[2:2]"},
         {"type": "writers.las", "filename": str(outfile)}
     ]
-    pl = pdal.Pipeline(json.dumps(pipeline))
-    count = pl.execute()
+    count = execute_pipeline(pipeline, stream_chunk_size)
     logging.info(f"Filtered '{infile}' -> '{outfile}': {count} ground points")
     return count
 
-def merge_laz_files(laz_files, out_merged_laz):
+def tiles_without_ground(laz_files, cache_path=DEFAULT_CACHE_PATH):
+    """
+    Tiles whose cached metadata (src/metadata_cache.py) reports zero ground points.
+    Only existing cache entries are consulted; nothing is computed here, so tiles
+    that are not cached (or have changed) are never skipped.
+    """
+    if not cache_path or not os.path.isfile(cache_path):
+        return set()
+    cache = MetadataCache(cache_path)
+    empty = set()
+    for f in laz_files:
+        try:
+            meta = cache.lookup(f)
+        except Exception:
+            continue
+        if meta is not None and meta.get('n_points_ground', 1) == 0:
+            empty.add(f)
+    return empty
+
+DEDUPE_CELL = 0.01
+
+def _writer_stage(out_path):
+    if str(out_path).endswith(".copc.laz"):
+        return {"type": "writers.copc", "filename": str(out_path)}
+    return {"type": "writers.las", "filename": str(out_path)}
+
+def merge_laz_files(laz_files, out_merged_laz, bounds=None, cell=DEDUPE_CELL):
+    """
+    Merge ground-only files and drop duplicate points from overlapping tiles with
+    a voxel filter. With bounds=(min_x, max_x, min_y, max_y) only points in that
+    half-open block are kept, so adjacent blocks never share a point.
+    """
     readers = [{"type": "readers.las", "filename": f} for f in laz_files]
-    pipeline = readers + [  # concatenate instead of insert!
-        {"type": "filters.voxelcentroidnearestneighbor", "cell": 0.01},
-        {"type": "writers.las", "filename": str(out_merged_laz)}
+    pipeline = readers[:]  # concatenate instead of insert!
+    if bounds is not None:
+        x0, x1, y0, y1 = bounds
+        pipeline.append({"type": "filters.range", "limits": f"X[{x0}:{x1}),Y[{y0}:{y1})"})
+    pipeline += [
+        {"type": "filters.voxelcentroidnearestneighbor", "cell": cell},
+        _writer_stage(out_merged_laz)
     ]
-    pl = pdal.Pipeline(json.dumps({"pipeline": pipeline}))
-    total = pl.execute()
+    total = execute_pipeline(pipeline)
     logging.info(f"Merged {len(laz_files)} ground-only files -> '{out_merged_laz}': {total} points")
     return total
 
+def plan_merge_blocks(laz_files, block_size):
+    """
+    Partition the union of the files' header bounds into block_size x block_size
+    blocks and list, per block, only the files whose bounds intersect it.
+
+    Returns:
+        list of (block_id, (min_x, max_x, min_y, max_y), [files]) for non-empty blocks.
+    """
+    file_bounds = {}
+    for f in laz_files:
+        with laspy.open(f) as fh:
+            mins, maxs = fh.header.mins, fh.header.maxs
+            file_bounds[f] = (mins[0], maxs[0], mins[1], maxs[1])
+    min_x = min(b[0] for b in file_bounds.values())
+    max_x = max(b[1] for b in file_bounds.values())
+    min_y = min(b[2] for b in file_bounds.values())
+    max_y = max(b[3] for b in file_bounds.values())
+    # One extra unit so points exactly on max_x / max_y fall inside the last half-open block
+    nx = max(1, math.ceil((max_x - min_x + 1e-6) / block_size))
+    ny = max(1, math.ceil((max_y - min_y + 1e-6) / block_size))
+
+    blocks = []
+    for iy in range(ny):
+        for ix in range(nx):
+            x0, y0 = min_x + ix * block_size, min_y + iy * block_size
+            x1, y1 = x0 + block_size, y0 + block_size
+            files = [
+                f for f, (fx0, fx1, fy0, fy1) in file_bounds.items()
+                if fx0 < x1 and fx1 >= x0 and fy0 < y1 and fy1 >= y0
+            ]
+            if files:
+                blocks.append((f"{ix}_{iy}", (x0, x1, y0, y1), files))
+    return blocks
+
+def merge_blocks(laz_files, out_dir, out_stem, block_size, workers=1, suffix=".laz"):
+    """
+    Spatially partitioned merge: each block reads only the tiles intersecting it
+    and is deduplicated on its own, in a process pool, so memory scales with a
+    block's tiles rather than the whole site. Writes '<out_stem>_<ix>_<iy><suffix>'
+    per non-empty block.
+
+    Returns:
+        list of written block paths.
+    """
+    blocks = plan_merge_blocks(laz_files, block_size)
+    logging.info(f"Merging {len(laz_files)} ground-only files in {len(blocks)} blocks of {block_size:g} m")
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(merge_laz_files, files, str(Path(out_dir) / f"{out_stem}_{block_id}{suffix}"), bounds): block_id
+            for block_id, bounds, files in blocks
+        }
+        for future in as_completed(futures):
+            out_path = Path(out_dir) / f"{out_stem}_{futures[future]}{suffix}"
+            if future.result() > 0:
+                written.append(str(out_path))
+            elif out_path.exists():
+                out_path.unlink()  # block only overlapped by tile bounds, no actual points
+    return sorted(written)
+
 def main():
     parser = argparse.ArgumentParser(description="Enhance LiDAR ground point coverage by merging ground points from overlapping .laz tiles.")
     parser.add_argument('input_dir', type=str, help='Directory with input RIB*.laz files (read-only)')
@@ -52,6 +175,13 @@ def main():
     parser.add_argument('--output-name', default='enhanced_ground.laz', help="Filename for the enhanced merged .laz (default: enhanced_ground.laz)")
     parser.add_argument('--keep-tmp', action='store_true', help="Keep temporary ground-only files")
     parser.add_argument('--prefix', default='RIB', help="Filename prefix to filter input (default: 'RIB')")
+    parser.add_argument('--files', default=None, help="Text file listing the tiles to merge (one per line, e.g. an overlap cluster); overrides --prefix")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Tiles to filter in parallel (default: number of CPUs)")
+    parser.add_argument('--scratch-dir', default=None, help="Directory for the intermediate ground-only .las files; use fast local storage (default: system temp dir)")
+    parser.add_argument('--metadata-cache', default=DEFAULT_CACHE_PATH, help=f"Metadata cache used to skip tiles without ground points; '' to disable (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--block-size', type=float, default=0.0, help="Merge and deduplicate in blocks of this size (metres), one output file per block, for sites too large to merge in memory. Blocks don't overlap, so DTMs built per block have edge effects at block borders (default: 0, a single merged file)")
+    parser.add_argument('--output-format', choices=["laz", "copc"], default="laz", help="Format of the block files (default: laz)")
+    parser.add_argument('--stream-chunk-size', type=int, default=DEFAULT_STREAM_CHUNK_SIZE, help=f"Points per chunk when a pipeline can run in PDAL streaming mode; 0 disables streaming (default: {DEFAULT_STREAM_CHUNK_SIZE})")
     args = parser.parse_args()
 
     setup_logging()
@@ -78,38 +208,71 @@ def main():
         sys.exit(1)
 
     # Step 1: Find all input tiles
-    files = find_laz_files(in_dir, args.prefix)
+    if args.files:
+        listed = read_file_list(args.files, in_dir)
+        files = [f for f in listed if os.path.isfile(f)]
+        missing = [f for f in listed if f not in files]
+        if missing:
+            logging.warning(f"{len(missing)} of {len(listed)} files listed in {args.files} do not exist and are left out of the merge: {missing}")
+    else:
+        files = find_laz_files(in_dir, args.prefix)
     if not files:
-        logging.error(f"No .laz files found in {in_dir} with prefix '{args.prefix}'")
+        logging.error(f"No .laz files found in {in_dir} with prefix '{args.prefix}'" if not args.files
+                      else f"None of the files listed in {args.files} exist in {in_dir}")
         sys.exit(1)
     logging.info(f"Found {len(files)} files, e.g.: {files[:4]}{' ...' if len(files)>4 else ''}")
 
-    # Step 2: Extract ground points to temp files
-    tmp_dir = tempfile.mkdtemp(prefix="ground_extract_")
+    empty = tiles_without_ground(files, args.metadata_cache)
+    if empty:
+        logging.info(f"Skipping {len(empty)} tiles with no ground points in the metadata cache")
+        files = [f for f in files if f not in empty]
+
+    # Step 2: Extract ground points to uncompressed scratch files, in parallel
+    tmp_dir = tempfile.mkdtemp(prefix="ground_extract_", dir=args.scratch_dir)
     ground_files = []
-    for f in files:
-        out = Path(tmp_dir) / (Path(f).stem + "_ground.laz")
-        try:
-            filter_ground_points(f, out)
-            ground_files.append(str(out))
-        except Exception as e:
-            logging.error(f"Failed filtering {f}: {e}")
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(
+                filter_ground_points, f, Path(tmp_dir) / (Path(f).stem + "_ground.las"), args.stream_chunk_size
+            ): f
+            for f in files
+        }
+        for future in as_completed(futures):
+            f = futures[future]
+            out = Path(tmp_dir) / (Path(f).stem + "_ground.las")
+            try:
+                future.result()
+                # Header count rather than the returned count, which streaming mode may not report
+                with laspy.open(str(out)) as fh:
+                    has_ground = fh.header.point_count > 0
+            except Exception as e:
+                logging.error(f"Failed filtering {f}: {e}")
+                continue
+            if has_ground:
+                ground_files.append(str(out))
+    ground_files.sort()
 
     if not ground_files:
         logging.error("No ground-classified LAS/LAZ files produced.")
         shutil.rmtree(tmp_dir)
         sys.exit(1)
 
-    # Step 3: Merge all ground-only files
+    # Step 3: Merge all ground-only files into one file, or block by block with --block-size
     try:
-        merge_laz_files(ground_files, str(out_laz))
+        if args.block_size > 0:
+            suffix = ".copc.laz" if args.output_format == "copc" else ".laz"
+            out_stem = args.output_name.split(".")[0]
+            block_files = merge_blocks(ground_files, out_dir, out_stem, args.block_size, args.workers, suffix)
+            logging.info(f"Wrote {len(block_files)} block files: {[Path(b).name for b in block_files]}")
+        else:
+            merge_laz_files(ground_files, str(out_laz))
     except Exception as e:
         logging.error(f"Failed merging ground-only files: {e}")
         if not args.keep_tmp:
             shutil.rmtree(tmp_dir)
         sys.exit(1)
 
-    logging.info(f"Enhanced ground points .laz written to: {out_laz}")
+    logging.info(f"Enhanced ground points written to: {out_laz if args.block_size <= 0 else out_dir}")
 
     # Step 4: Clean up
     if not args.keep_tmp:
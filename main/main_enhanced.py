@@ -3,12 +3,22 @@ import sys
 import time
 import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import yaml
 
 import src.lidar as lidar
+import src.metadata_cache as metadata_cache
+import src.run_journal as run_journal
+import src.stage_cache as stage_cache
 
-def setup_logging(logfile="log_enhanced.txt"):
+def check_positive(value):
+    ivalue = int(value)
+    if ivalue < 1:
+        raise argparse.ArgumentTypeError("%s is an invalid positive int value, must be >= 1" % value)
+    return ivalue
+
+def setup_logging(logfile="log_enhanced.txt", banner=True):
     logging.basicConfig(
         level=logging.INFO,
         format="[%(asctime)s] %(levelname)s: %(message)s",
@@ -17,17 +27,59 @@ def setup_logging(logfile="log_enhanced.txt"):
             logging.StreamHandler(sys.stdout)
         ]
     )
-    logging.info("=== Enhanced Pipeline run started ===")
+    if banner:
+        logging.info("=== Enhanced Pipeline run started ===")
 
 def load_config(config_file):
     with open(config_file) as f:
         return yaml.safe_load(f)
 
+def run_file(laz_path, dtm_dir, pipeline, dtm_cache="manifest", report_path=None, profile_stages=False, chunk_size=None, chunk_buffer=50.0, chunk_workers=1, stage_cache_dir=None, cog_compression=None, stage_cache_max_gb=None, checksum=False):
+    """
+    Run the PDAL pipeline for one enhanced LAZ. Module-level so it can be
+    dispatched to a worker process; exceptions propagate to the caller.
+
+    Returns:
+        tuple: (output_path, duration_s, sha256 of the output if checksum else None)
+    """
+    start_time = time.time()
+    output_path = lidar.run_pdal_pipeline(
+        laz_path,
+        dtm_dir,
+        pipeline,
+        verbose=2,
+        cache_mode=dtm_cache,
+        report_path=report_path,
+        profile_stages=profile_stages,
+        chunk_size=chunk_size,
+        chunk_buffer=chunk_buffer,
+        chunk_workers=chunk_workers,
+        stage_cache_dir=stage_cache_dir,
+        cog_compression=cog_compression,
+        stage_cache_max_gb=stage_cache_max_gb
+    )
+    duration = time.time() - start_time
+    return output_path, duration, metadata_cache.file_sha256(output_path) if checksum else None
+
 if __name__ == "__main__":
     setup_logging()
 
     parser = argparse.ArgumentParser()
     parser.add_argument("config_file", type=str, help="Path to YAML config_enhanced.yml")
+    parser.add_argument("--enhanced-dir", default=None, help="Process every .laz in this directory instead of path_to_laz_enhanced/enhanced_filenames from the config (e.g. one overlap cluster)")
+    parser.add_argument("--workers", type=check_positive, default=1, metavar="N", help="Number of files to process in parallel, one PDAL pipeline per worker process (default: 1)")
+    parser.add_argument("--dtm-cache", choices=lidar.DTM_CACHE_MODES, default="manifest", help="Reuse existing DTMs: 'manifest' only if pipeline/input/PDAL version are unchanged (default), 'adopt' as manifest but first keep DTMs made before manifests existed (one-off), 'exists' if the .tif exists, 'none' to always recompute")
+    parser.add_argument("--run-report", default=None, metavar="PATH", help="JSONL run report with one timing record per file (default: run_report.jsonl in the DTM directory)")
+    parser.add_argument("--profile-stages", action="store_true", help="Execute pipelines stage by stage and record per-stage time, points in/out and peak RSS in the run report")
+    parser.add_argument("--chunk-size", type=float, default=None, metavar="M", help="Process each file in buffered sub-tiles of M x M metres and mosaic the result")
+    parser.add_argument("--chunk-buffer", type=float, default=50.0, metavar="M", help="With --chunk-size, overlap around each sub-tile in metres (default: 50)")
+    parser.add_argument("--chunk-workers", type=check_positive, default=1, metavar="N", help="With --chunk-size, sub-tiles to run in parallel within a file (default: 1)")
+    parser.add_argument("--stage-cache", default=None, metavar="DIR", help="Cache the denoised output of the readers.las + filters.outlier prefix as uncompressed LAS in DIR and reuse it across templates and re-runs (several times the LAZ size on disk; off by default)")
+    parser.add_argument("--stage-cache-max-gb", type=float, default=stage_cache.DEFAULT_STAGE_CACHE_MAX_GB, metavar="GB", help=f"With --stage-cache, remove least recently used files beyond this size; 0 for no limit (default: {stage_cache.DEFAULT_STAGE_CACHE_MAX_GB:g})")
+    parser.add_argument("--cog", choices=lidar.COG_COMPRESSIONS, default=None, help="Write DTMs as tiled Cloud-Optimized GeoTIFFs with internal overviews and this compression (floating-point predictor)")
+    parser.add_argument("--journal", default=None, metavar="PATH", help="Journal of completed/failed files (default: enhanced_journal.jsonl in the DTM directory)")
+    parser.add_argument("--resume", action="store_true", help="Skip files the journal records as done whose DTM still exists with the recorded size and mtime")
+    parser.add_argument("--verify-checksums", action="store_true", help="Record the SHA-256 of each output in the journal and, with --resume, re-hash done outputs against it (reads every output)")
     args = parser.parse_args()
 
     try:
@@ -36,36 +88,72 @@ if __name__ == "__main__":
         logging.error(f"Failed to load config: {e}")
         sys.exit(1)
 
-    laz_enhanced_dir = cfg["path_to_laz_enhanced"]
+    if args.enhanced_dir:
+        laz_enhanced_dir = args.enhanced_dir
+        enhanced_filenames = sorted(p.name for p in Path(laz_enhanced_dir).glob("*.laz"))
+    else:
+        laz_enhanced_dir = cfg["path_to_laz_enhanced"]
+        enhanced_filenames = cfg["enhanced_filenames"]
     dtm_dir = cfg["path_to_dtm"]
     pipeline_template_dir = cfg["path_to_pdal_templates"]
     pdal_pipeline_filename = cfg["pdal_pipeline_filename"]
     pipeline_path = os.path.join(pipeline_template_dir, pdal_pipeline_filename)
-    enhanced_filenames = cfg["enhanced_filenames"]
 
-    for i, fname in enumerate(enhanced_filenames, 1):
-        laz_path = os.path.join(laz_enhanced_dir, fname)
-        logging.info(f"[{i}/{len(enhanced_filenames)}] Processing: {laz_path}")
+    try:
+        pipeline_template = lidar.load_pipeline_template(pipeline_path)
+    except Exception as e:
+        logging.error(f"Invalid PDAL pipeline template {pipeline_path}: {e}")
+        sys.exit(1)
+
+    run_report_path = args.run_report or os.path.join(dtm_dir, "run_report.jsonl")
+    stage_cache_dir = args.stage_cache
+    stage_cache_max_gb = args.stage_cache_max_gb or None
+    journal_path = args.journal or os.path.join(dtm_dir, "enhanced_journal.jsonl")
+    done = run_journal.completed_inputs(journal_path, args.verify_checksums) if args.resume else set()
 
+    jobs = []
+    for fname in enhanced_filenames:
+        laz_path = os.path.abspath(os.path.join(laz_enhanced_dir, fname))
         if not os.path.exists(laz_path):
             logging.error(f"Input file does not exist: {laz_path}")
             continue
-        if not os.path.exists(pipeline_path):
-            logging.error(f"Pipeline template not found: {pipeline_path}")
+        if laz_path in done:
+            logging.info(f"Already done according to {journal_path}, skipping: {laz_path}")
             continue
+        jobs.append(laz_path)
 
-        start_time = time.time()
+    def run_and_record(n_done, laz_path, get_result):
+        # Runs in this process only, so the journal has a single writer
         try:
-            output_path = lidar.run_pdal_pipeline(
-                laz_path,
-                dtm_dir,
-                pipeline_path,
-                verbose=2
+            output_path, duration, sha256 = get_result()
+            logging.info(f"[{n_done}/{len(jobs)}] Pipeline for {os.path.basename(laz_path)} output: {output_path} (elapsed: {duration:.1f}s)")
+            # Absolute output path so a resume from another cwd still finds it
+            run_journal.append_entry(
+                journal_path, laz_path, "done", output=os.path.abspath(output_path),
+                elapsed_s=round(duration, 3), sha256=sha256, **run_journal.output_stat(output_path)
             )
-            duration = time.time() - start_time
-            logging.info(f"Pipeline for {fname} output: {output_path} (elapsed: {duration:.1f}s)")
         except Exception as e:
-            logging.error(f"Failed processing {fname}: {e}")
-            continue
+            logging.error(f"[{n_done}/{len(jobs)}] Failed processing {os.path.basename(laz_path)}: {e}")
+            run_journal.append_entry(journal_path, laz_path, "failed", error=f"{type(e).__name__}: {e}")
+
+    run_args = (
+        dtm_dir, pipeline_template, args.dtm_cache, run_report_path, args.profile_stages,
+        args.chunk_size, args.chunk_buffer, args.chunk_workers, stage_cache_dir, args.cog, stage_cache_max_gb, args.verify_checksums
+    )
+    logging.info(f"Processing {len(jobs)} files with {args.workers} worker process(es)")
+    if args.workers == 1:
+        for n_done, laz_path in enumerate(jobs, 1):
+            logging.info(f"[{n_done}/{len(jobs)}] Processing: {laz_path}")
+            run_and_record(n_done, laz_path, lambda: run_file(laz_path, *run_args))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=setup_logging,
+            initargs=("log_enhanced.txt", False)
+        ) as executor:
+            futures = {executor.submit(run_file, laz_path, *run_args): laz_path for laz_path in jobs}
+            for n_done, future in enumerate(as_completed(futures), 1):
+                run_and_record(n_done, futures[future], future.result)
 
+    logging.info(f"Journal: {journal_path}; run report: {run_report_path}")
     logging.info("=== Enhanced Pipeline run completed ===")
\ No newline at end of file
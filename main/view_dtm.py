@@ -4,6 +4,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import argparse
 import glob
+from rasterio.windows import from_bounds
 
 # Specify the directory containing your images
 DATA_DIR = 'data/processed/dtm'
@@ -36,17 +37,32 @@ def plot_dtm_and_hillshade(dem, hs, vmin, vmax, title):
     plt.title(f"Hillshade: {title}")
     plt.show()
 
-def process_dtm_tile_array(dtm_path):
-    title = os.path.split(dtm_path)[-1]
+def read_dtm(dtm_path, max_size=None, bounds=None):
+    """
+    Read band 1, optionally only the window covering bounds=(min_x, min_y, max_x, max_y)
+    and decimated so neither side exceeds max_size pixels. A decimated read is
+    served from the closest internal overview when the file has them (COGs, see
+    src/cog.py), so large DTMs are not read at full resolution just to be displayed.
+    """
     with rasterio.open(dtm_path) as src:
-        dem = src.read(1)
-        nodata = src.nodata
-        dem = np.where((dem == nodata) | (dem < -100) | (dem > 9999), np.nan, dem)
-        vmin = np.nanpercentile(dem, 1)
-        vmax = np.nanpercentile(dem, 99)
-        dem_filled = np.nan_to_num(dem, nan=np.nanmean(dem))
-        hs = hillshade(dem_filled, azimuth=315, angle_altitude=45)
-        plot_dtm_and_hillshade(dem, hs, vmin, vmax, title)
+        window = from_bounds(*bounds, transform=src.transform).round_offsets().round_lengths() if bounds else None
+        height = int(window.height) if window is not None else src.height
+        width = int(window.width) if window is not None else src.width
+        out_shape = None
+        if max_size and max(height, width) > max_size:
+            scale = max_size / max(height, width)
+            out_shape = (max(1, int(height * scale)), max(1, int(width * scale)))
+        return src.read(1, window=window, out_shape=out_shape), src.nodata
+
+def process_dtm_tile_array(dtm_path, max_size=None, bounds=None):
+    title = os.path.split(dtm_path)[-1]
+    dem, nodata = read_dtm(dtm_path, max_size, bounds)
+    dem = np.where((dem == nodata) | (dem < -100) | (dem > 9999), np.nan, dem)
+    vmin = np.nanpercentile(dem, 1)
+    vmax = np.nanpercentile(dem, 99)
+    dem_filled = np.nan_to_num(dem, nan=np.nanmean(dem))
+    hs = hillshade(dem_filled, azimuth=315, angle_altitude=45)
+    plot_dtm_and_hillshade(dem, hs, vmin, vmax, title)
     return dem, hs
 
 def find_most_recent_tif(data_dir):
@@ -68,6 +84,20 @@ def main():
         type=str,
         help=f"Path to a GeoTIFF file. If omitted, will use the most recently modified *.tif or *.tiff in DATA_DIR ({DATA_DIR})"
     )
+    parser.add_argument(
+        '--max-size',
+        type=int,
+        default=2048,
+        help="Longest side in pixels to read; larger DTMs are read from overviews/decimated (default: 2048, 0 for full resolution)"
+    )
+    parser.add_argument(
+        '--bounds',
+        type=float,
+        nargs=4,
+        metavar=('MIN_X', 'MIN_Y', 'MAX_X', 'MAX_Y'),
+        default=None,
+        help="Only read this window (in the DTM's CRS)"
+    )
     args = parser.parse_args()
 
     if args.file:
@@ -79,7 +109,7 @@ def main():
         print(f"No file specified. Using most recent file: {path_to_file}")
 
     print(f"Processing: {path_to_file}")
-    dem, hs = process_dtm_tile_array(path_to_file)
+    dem, hs = process_dtm_tile_array(path_to_file, max_size=args.max_size or None, bounds=args.bounds)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
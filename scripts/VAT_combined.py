@@ -17,6 +17,8 @@ Parameters (via argparse):
     --save_8bit        [optional]   Save 8-bit GeoTIFF outputs (default: False).
     --save_VAT_general [optional]   Also save VAT general visualization (default: False).
     --save_VAT_flat    [optional]   Also save VAT flat visualization (default: False).
+    --overview_factor  [optional]   Read DEMs at 1/N resolution (from internal overviews where present, e.g. COGs) for quick previews (default: 1).
+    --bounds           [optional]   MIN_X MIN_Y MAX_X MAX_Y: only process this window of each DEM.
 
 Example usage:
 
@@ -38,11 +40,20 @@ import os
 import rvt.vis
 import rvt.blend
 import rvt.default
+import tempfile
 import multiprocessing as mp
+import rasterio
+from rasterio.windows import from_bounds
+
+def check_positive(value):
+    ivalue = int(value)
+    if ivalue < 1:
+        raise argparse.ArgumentTypeError("%s is an invalid positive int value, must be >= 1" % value)
+    return ivalue
 
 def combined_VAT(input_dir_path, output_dir_path, general_opacity, vat_combination_json_path=None,
                  terrains_sett_json_path=None, nr_processes=7, save_float=True, save_8bit=False,
-                 save_VAT_general=False, save_VAT_flat=False, files=None):
+                 save_VAT_general=False, save_VAT_flat=False, files=None, overview_factor=1, bounds=None):
     if not save_float and not save_8bit:
         raise Exception("save_float and save_8bit are both False!")
 
@@ -78,10 +89,12 @@ def combined_VAT(input_dir_path, output_dir_path, general_opacity, vat_combinati
         dem_list = files
     else:
         dem_list = os.listdir(input_dir_path)
+    # Reduced reads get their own output names so they never pass for full-resolution results
+    suffix = ("_ovr{}".format(overview_factor) if overview_factor > 1 else "") + ("_window" if bounds else "")
     input_process_list = []
     for input_dem_name in dem_list:
         input_dem_path = os.path.join(input_dir_path, input_dem_name)
-        out_name = "{}_Archaeological_(VAT_combined)_opac{}.tif".format(input_dem_name.rstrip(".tif"), general_opacity)
+        out_name = "{}{}_Archaeological_(VAT_combined)_opac{}.tif".format(input_dem_name.rstrip(".tif"), suffix, general_opacity)
         out_comb_vat_path = os.path.abspath(os.path.join(output_dir_path, out_name))
         out_comb_vat_8bit_path = out_comb_vat_path.rstrip(".tif") + "_8bit.tif"
         if save_8bit and os.path.isfile(out_comb_vat_8bit_path) and save_float and os.path.isfile(out_comb_vat_path):
@@ -98,20 +111,62 @@ def combined_VAT(input_dir_path, output_dir_path, general_opacity, vat_combinati
         flat_combination = vat_combination_2
         general_default = default_1
         flat_default = default_2
-        out_comb_vat_general_name = "{}_Archaeological_(VAT_general).tif".format(input_dem_name.rstrip(".tif"))
+        out_comb_vat_general_name = "{}{}_Archaeological_(VAT_general).tif".format(input_dem_name.rstrip(".tif"), suffix)
         out_comb_vat_general_path = os.path.abspath(os.path.join(output_dir_path, out_comb_vat_general_name))
-        out_comb_vat_flat_name = "{}_Archaeological_(VAT_flat).tif".format(input_dem_name.rstrip(".tif"))
+        out_comb_vat_flat_name = "{}{}_Archaeological_(VAT_flat).tif".format(input_dem_name.rstrip(".tif"), suffix)
         out_comb_vat_flat_path = os.path.abspath(os.path.join(output_dir_path, out_comb_vat_flat_name))
         input_process_list.append((general_combination, flat_combination, general_default, flat_default,
                                    input_dem_path, out_comb_vat_path,
                                    general_opacity, save_float, save_8bit, save_VAT_general,
-                                   out_comb_vat_general_path, save_VAT_flat, out_comb_vat_flat_path))
+                                   out_comb_vat_general_path, save_VAT_flat, out_comb_vat_flat_path,
+                                   overview_factor, bounds))
     with mp.Pool(nr_processes) as p:
         realist = [p.apply_async(compute_save_VAT_combined, r) for r in input_process_list]
         for result in realist:
             print(result.get())
 
+def prepare_dem(input_dem_path, tmp_dir, overview_factor=1, bounds=None):
+    """
+    Return a DEM path for rvt to read: the input itself, or a temporary GeoTIFF
+    holding only the requested window and/or a 1/overview_factor resolution read.
+    Decimated reads come from internal overviews when the file has them, so only
+    the needed data is read. rvt takes georeferencing from the DEM path, hence
+    the temporary file rather than an in-memory array.
+    """
+    if overview_factor <= 1 and not bounds:
+        return input_dem_path
+    with rasterio.open(input_dem_path) as src:
+        window = from_bounds(*bounds, transform=src.transform).round_offsets().round_lengths() if bounds else None
+        height = int(window.height) if window is not None else src.height
+        width = int(window.width) if window is not None else src.width
+        out_shape = (max(1, height // overview_factor), max(1, width // overview_factor))
+        array = src.read(1, window=window, out_shape=out_shape)
+        transform = src.window_transform(window) if window is not None else src.transform
+        transform = transform * transform.scale(width / out_shape[1], height / out_shape[0])
+        profile = src.profile.copy()
+    profile.update(driver="GTiff", width=out_shape[1], height=out_shape[0], transform=transform,
+                   tiled=False, compress="deflate")
+    profile.pop("blockxsize", None)
+    profile.pop("blockysize", None)
+    reduced_path = os.path.join(tmp_dir, os.path.basename(input_dem_path))
+    with rasterio.open(reduced_path, "w", **profile) as dst:
+        dst.write(array, 1)
+    return reduced_path
+
 def compute_save_VAT_combined(
+    general_combination, flat_combination, general_default, flat_default,
+    input_dem_path, out_comb_vat_path,
+    general_transparency, save_float, save_8bit, save_VAT_general, out_comb_vat_general_path,
+    save_VAT_flat, out_comb_vat_flat_path, overview_factor=1, bounds=None):
+    with tempfile.TemporaryDirectory(prefix="vat_dem_") as tmp_dir:
+        input_dem_path = prepare_dem(input_dem_path, tmp_dir, overview_factor, bounds)
+        return _compute_save_VAT_combined(
+            general_combination, flat_combination, general_default, flat_default,
+            input_dem_path, out_comb_vat_path,
+            general_transparency, save_float, save_8bit, save_VAT_general, out_comb_vat_general_path,
+            save_VAT_flat, out_comb_vat_flat_path)
+
+def _compute_save_VAT_combined(
     general_combination, flat_combination, general_default, flat_default,
     input_dem_path, out_comb_vat_path,
     general_transparency, save_float, save_8bit, save_VAT_general, out_comb_vat_general_path,
@@ -165,6 +220,9 @@ if __name__ == "__main__":
     parser.add_argument("--save_8bit", action="store_true", help="Save 8bit output")
     parser.add_argument("--save_VAT_general", action="store_true", help="Save VAT general output")
     parser.add_argument("--save_VAT_flat", action="store_true", help="Save VAT flat output")
+    parser.add_argument("--overview_factor", type=check_positive, default=1, help="Read DEMs at 1/N resolution (uses internal overviews, e.g. COGs) for previews (default: 1)")
+    parser.add_argument("--bounds", type=float, nargs=4, default=None, metavar=("MIN_X", "MIN_Y", "MAX_X", "MAX_Y"),
+                        help="Only process this window of each DEM")
 
     args = parser.parse_args()
 
@@ -190,5 +248,7 @@ if __name__ == "__main__":
         save_8bit=args.save_8bit,
         save_VAT_general=args.save_VAT_general,
         save_VAT_flat=args.save_VAT_flat,
-        files=files
+        files=files,
+        overview_factor=args.overview_factor,
+        bounds=args.bounds
     )
\ No newline at end of file
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Asyncio Downloader with Global Connection and Bandwidth Limits
+
+An alternative engine to robust_downloader.py for large pulls. All downloads run
+as tasks on one event loop and share:
+
+    - a global semaphore capping concurrent downloads (--max_connections)
+    - a per-host semaphore (--per_host), so no single host takes all the
+      connections; it is keyed on the host of the requested URL, so a
+      redirected download counts against the host it was requested from
+    - a token bucket capping total bytes per second (--bandwidth_mbps)
+    - retries with exponential backoff and full jitter that honour the
+      server's Retry-After on 429/503, instead of a fixed sleep
+
+Files are resumed with Range requests, hashed while streaming and recorded in
+the same download manifest as robust_downloader.py, so
+check_dataset_download_is_complete.py verifies either engine's output. URLs
+start largest first when sizes are known (--sizes_csv). Each file is a single
+stream; use robust_downloader.py --parts for multi-part downloads.
+
+Parameters (via command line):
+    --download_dir:    Target directory where files will be downloaded.
+    --urls_file:       Path to a text file containing URLs (one per line).
+    --max_connections: Concurrent downloads in total (default: 16).
+    --per_host:        Concurrent downloads per host (default: 8).
+    --bandwidth_mbps:  Total download rate limit in MiB/s (default: 0, unlimited).
+
+Usage:
+    python async_downloader.py --download_dir ./my_data --urls_file urls.txt --max_connections 16 --bandwidth_mbps 50
+
+Test against the local stand-in server with injected throttling and failures:
+    python local_http_server.py --dir data/example --port 8000 --throttle_rate 0.2 --error_rate 0.1 --drop_rate 0.1
+
+Dependencies:
+    aiohttp, requests (for the shared helpers in robust_downloader.py)
+
+Logging:
+    Logs are streamed to both 'log.txt' (file) and STDOUT (console).
+"""
+
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from robust_downloader import (
+    MANIFEST_FILENAME, append_manifest, backoff_delay, get_local_path, load_inventory_sizes,
+    order_largest_first, parse_retry_after, sha256_of_prefix, sizeof_fmt
+)
+
+# Responses worth retrying; anything else (404, 403, ...) fails the file at once
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CHUNK_SIZE = 256 * 1024
+
+class RetryableError(Exception):
+    """A failed attempt that should be retried, optionally after the server's Retry-After."""
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """
+    Token bucket shared by all downloads: *rate* bytes per second on average,
+    with bursts of up to *capacity* bytes (default: a quarter second of traffic).
+    consume() takes the tokens at once and, if that leaves the bucket in debt,
+    waits until the debt is refilled; waiters are served in order, so the limit
+    holds however many tasks read concurrently.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate / 4)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def consume(self, n):
+        async with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            if self.tokens < 0:
+                await asyncio.sleep(-self.tokens / self.rate)
+
+class Limits:
+    """
+    Concurrency and bandwidth limits shared by all download tasks.
+    """
+    def __init__(self, max_connections=16, per_host=8, bandwidth=None):
+        self.total = asyncio.Semaphore(max_connections)
+        self.per_host = defaultdict(lambda: asyncio.Semaphore(per_host))
+        self.bucket = TokenBucket(bandwidth) if bandwidth else None
+
+    def host(self, url):
+        """Semaphore for the host of *url* as requested (redirects are not followed here)."""
+        return self.per_host[urlsplit(url).netloc]
+
+def _write_chunk(f, hasher, chunk):
+    f.write(chunk)
+    hasher.update(chunk)
+
+async def _fetch(session, url, local_path, limits):
+    """
+    One attempt: resume *local_path* from its current size. Disk I/O and
+    hashing run in worker threads so they don't block the event loop.
+
+    Returns:
+        tuple: (total size, bytes now on disk, sha256 hex, False), or
+        (total size, local size, None, True) if the file was already complete.
+    """
+    bytes_downloaded = os.path.getsize(local_path) if os.path.exists(local_path) else 0
+    headers = {"Range": f"bytes={bytes_downloaded}-"} if bytes_downloaded else {}
+    async with session.get(url, headers=headers) as r:
+        content_range = r.headers.get("Content-Range", "")
+        total = content_range.rsplit("/", 1)[-1] if "/" in content_range else ""
+        file_size = int(total) if total.isdigit() else (r.content_length or 0) if r.status == 200 else 0
+        if r.status == 416 and bytes_downloaded and (not file_size or bytes_downloaded >= file_size):
+            return file_size, bytes_downloaded, None, True
+        if r.status in RETRY_STATUSES:
+            raise RetryableError(f"HTTP {r.status}", parse_retry_after(r.headers.get("Retry-After")))
+        r.raise_for_status()
+        if r.status != 206:
+            bytes_downloaded = 0
+        hasher = await asyncio.to_thread(sha256_of_prefix, local_path, bytes_downloaded) if bytes_downloaded else hashlib.sha256()
+        with open(local_path, "ab" if bytes_downloaded else "wb") as f:
+            async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                if limits.bucket:
+                    await limits.bucket.consume(len(chunk))
+                await asyncio.to_thread(_write_chunk, f, hasher, chunk)
+                bytes_downloaded += len(chunk)
+    if file_size and bytes_downloaded != file_size:
+        raise RetryableError(f"Response ended at {bytes_downloaded} of {file_size} bytes")
+    return file_size, bytes_downloaded, hasher.hexdigest(), False
+
+async def download_one(session, url, download_dir, limits, manifest_path=None, max_retries=8):
+    """
+    Download one URL within the shared limits, retrying transient failures
+    (connection errors, timeouts, truncated bodies, 429/5xx) with backoff.
+
+    Returns:
+        bool: True if the file is complete.
+    """
+    local_path = get_local_path(url, download_dir)
+    name = os.path.basename(local_path)
+    for attempt in range(1, max_retries + 1):
+        retry_after = None
+        try:
+            # Host first: a task waiting on a busy host must not hold a global slot
+            async with limits.host(url), limits.total:
+                start_time = time.time()
+                start_size = os.path.getsize(local_path) if os.path.exists(local_path) else 0
+                _, size, sha256, skipped = await _fetch(session, url, local_path, limits)
+            if skipped:
+                logging.info(f"Already downloaded {name}, skipping.")
+                return True
+            elapsed = time.time() - start_time
+            speed = (size - start_size) / elapsed if elapsed > 0 else 0
+            logging.info(f"Finished: {name} ({sizeof_fmt(size)}) in {elapsed:.2f}s, avg speed {sizeof_fmt(speed)}/s")
+            if manifest_path:
+                append_manifest(manifest_path, local_path, url, size, sha256)
+            return True
+        except RetryableError as e:
+            error, retry_after = e, e.retry_after
+        except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            error = e
+        except aiohttp.ClientResponseError as e:
+            logging.info(f"FAILED: {name}: HTTP {e.status} {e.message}")
+            return False
+        if attempt < max_retries:
+            delay = backoff_delay(attempt, retry_after)
+            logging.info(f"Download of {name} failed (attempt {attempt}), retrying in {delay:.1f}s. Error: {error!r}")
+            await asyncio.sleep(delay)
+    logging.info(f"FAILED: {name} after {max_retries} attempts.")
+    return False
+
+async def download_all(urls, download_dir, max_connections=16, per_host=8, bandwidth=None,
+                       manifest_path=None, max_retries=8, timeout=60):
+    """
+    Download *urls* (in the given order of priority) concurrently within the limits.
+
+    Args:
+        bandwidth (float, optional): Total bytes per second; None for no limit.
+        timeout (float): Seconds without data before a connection counts as broken.
+
+    Returns:
+        tuple: (number of files completed, number failed)
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    limits = Limits(max_connections, per_host, bandwidth)
+    connector = aiohttp.TCPConnector(limit=max_connections, limit_per_host=per_host)
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout, trust_env=True) as session:
+        results = await asyncio.gather(*(
+            download_one(session, url, download_dir, limits, manifest_path, max_retries) for url in urls
+        ))
+    n_ok = sum(results)
+    return n_ok, len(results) - n_ok
+
+def parse_args():
+    """
+    Parse command-line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Asyncio downloader with global connection, per-host and bandwidth limits.")
+    parser.add_argument('--download_dir', default="downloads", help="Download directory (default: ./downloads)")
+    parser.add_argument('--urls_file', default="urls.txt", help="Text file with URLs (one per line)")
+    parser.add_argument('--max_connections', type=int, default=16, help="Concurrent downloads in total (default: 16)")
+    parser.add_argument('--per_host', type=int, default=8, help="Concurrent downloads per host (default: 8)")
+    parser.add_argument('--bandwidth_mbps', type=float, default=0, help="Total download rate limit in MiB/s, 0 for none (default: 0)")
+    parser.add_argument('--max_retries', type=int, default=8, help="Attempts per file before giving up (default: 8)")
+    parser.add_argument('--timeout', type=float, default=60, help="Seconds without data before retrying a connection (default: 60)")
+    parser.add_argument('--sizes_csv', default=None, help="Inventory CSV with 'filename' and file size columns, used to start the largest files first")
+    parser.add_argument('--size_col', default="file_size", help="Size column (bytes) in --sizes_csv (default: file_size)")
+    parser.add_argument('--manifest', default=None, help=f"JSONL manifest of completed files with size and SHA-256 (default: <download_dir>/{MANIFEST_FILENAME})")
+    return parser.parse_args()
+
+def main():
+    """
+    Main program flow: parse args, configure logging, run the event loop.
+    """
+    args = parse_args()
+
+    # Configure logging to file + console
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(message)s",
+        handlers=[
+            logging.FileHandler("log.txt", mode='a'),
+            logging.StreamHandler()
+        ]
+    )
+
+    if not os.path.exists(args.urls_file):
+        print(f"URL file '{args.urls_file}' not found!")
+        return
+
+    with open(args.urls_file) as f:
+        urls = [line.strip() for line in f if line.strip()]
+    if not urls:
+        logging.info("No URLs found to download!")
+        return
+
+    if args.sizes_csv:
+        by_name = load_inventory_sizes(args.sizes_csv, args.size_col)
+        urls = order_largest_first(urls, {url: by_name.get(url.split("/")[-1], 0) for url in urls})
+
+    manifest_path = args.manifest or os.path.join(args.download_dir, MANIFEST_FILENAME)
+    bandwidth = args.bandwidth_mbps * 1024**2 if args.bandwidth_mbps > 0 else None
+    t_start = time.time()
+    n_ok, n_failed = asyncio.run(download_all(
+        urls, args.download_dir, args.max_connections, args.per_host, bandwidth,
+        manifest_path, args.max_retries, args.timeout
+    ))
+    t_total = time.time() - t_start
+    logging.info(f"All downloads done: {n_ok} complete, {n_failed} failed. Total wall time: {t_total:.2f}s. Manifest: {manifest_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark Per-file Download Overhead Against a Local Server
+
+Serves N copies of one file (by default an example DTM from data/example/) from
+local_http_server.py and downloads them twice:
+
+    head+get   the previous robust_downloader behaviour: a requests.head for
+               the size, then a requests.get, with no Session (new connection
+               for every request)
+    session    robust_downloader.download_with_resume: one GET per file over the
+               thread's pooled keep-alive Session
+
+and reports wall time, time per file, HTTP requests and TCP connections used.
+On loopback this isolates the per-file overhead; over the internet every saved
+connection also saves a TLS handshake and the saved HEAD a full round trip.
+
+Usage:
+    python benchmark_downloader.py --file data/raw/laz/RIB_A01_2014_laz_2.laz --copies 50 --num_threads 4
+"""
+
+import os
+import sys
+import time
+import queue
+import shutil
+import argparse
+import tempfile
+import threading
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import robust_downloader
+from local_http_server import serve
+
+def legacy_download(url, download_dir):
+    """
+    HEAD for the size, then a plain (session-less) streamed GET.
+    """
+    local_path = robust_downloader.get_local_path(url, download_dir)
+    requests.head(url, allow_redirects=True, timeout=60)
+    with requests.get(url, stream=True, timeout=60) as r:
+        r.raise_for_status()
+        with open(local_path, "wb") as f:
+            for chunk in r.iter_content(chunk_size=1024*1024):
+                f.write(chunk)
+
+def run_variant(download, urls, download_dir, num_threads):
+    """
+    Download *urls* with *num_threads* threads pulling from a shared queue and return the wall time.
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    url_queue = robust_downloader.build_queue(urls, {})
+
+    def worker():
+        while True:
+            try:
+                url = url_queue.get_nowait()
+            except queue.Empty:
+                return
+            download(url, download_dir)
+
+    threads = [threading.Thread(target=worker) for _ in range(num_threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-file overhead of HEAD+GET without a session vs pooled single-GET downloads.")
+    parser.add_argument('--file', default=os.path.join("data", "example", "SFX_A01_2012_laz_1_denoised_dtm.tif"), help="File to serve; its content doesn't matter, only its size (default: data/example/SFX_A01_2012_laz_1_denoised_dtm.tif)")
+    parser.add_argument('--copies', type=int, default=50, help="Number of copies to download per variant (default: 50)")
+    parser.add_argument('--num_threads', type=int, default=4, help="Download threads (default: 4)")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.file):
+        print(f"ERROR: File not found: {args.file}")
+        sys.exit(1)
+
+    tmp_dir = tempfile.mkdtemp(prefix="dl_bench_")
+    try:
+        serve_dir = os.path.join(tmp_dir, "serve")
+        os.makedirs(serve_dir)
+        names = [f"copy_{i:04d}{os.path.splitext(args.file)[1]}" for i in range(args.copies)]
+        for name in names:
+            os.symlink(os.path.abspath(args.file), os.path.join(serve_dir, name))
+        server, base_url = serve(serve_dir)
+        urls = [f"{base_url}/{name}" for name in names]
+        size = os.path.getsize(args.file)
+
+        print(f"{args.copies} x {robust_downloader.sizeof_fmt(size)}, {args.num_threads} threads, {base_url}")
+        print(f"  {'Variant':<10} {'wall (s)':>9} {'ms/file':>9} {'requests':>9} {'connections':>12} {'MB/s':>8}")
+        for variant, download in (("head+get", legacy_download), ("session", robust_downloader.download_with_resume)):
+            server.stats.update(requests=0, connections=0)
+            wall = run_variant(download, urls, os.path.join(tmp_dir, variant), args.num_threads)
+            print(f"  {variant:<10} {wall:>9.3f} {1000 * wall / len(urls):>9.2f} {server.stats['requests']:>9} "
+                  f"{server.stats['connections']:>12} {len(urls) * size / wall / 1024**2:>8.1f}")
+        server.shutdown()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
 #!/usr/bin/env python3
 """
-Check for missing LAZ files based on a metadata CSV inventory.
+Check for missing, truncated or corrupt LAZ files based on a metadata CSV inventory.
 
 This script compares a metadata CSV file (with a required column 'filename')
 against the contents of a specified directory, and reports which expected LAZ
-files are missing from that directory.
+files are missing from that directory. Files that are present are then verified
+in parallel:
+
+    size    against the download manifest written by robust_downloader.py
+            (and/or a size column of the CSV, --size_col)
+    hash    SHA-256 against the manifest (skip with --no_hash)
+    header  a LAZ/LAS header sanity read: readable header, point count > 0,
+            finite bounds, point data inside the file and, for compressed files,
+            a LAZ chunk table that lies inside the file, for uncompressed LAS
+            offset + point count x record length within the file (catches truncation)
+
+Files without a manifest entry get the header check only.
 
 USAGE:
     python check_missing_laz.py --csv /path/to/metadata.csv --laz_dir /path/to/laz_folder
@@ -12,53 +23,185 @@ USAGE:
 Arguments:
     --csv      Path to a CSV file listing expected LAZ filenames; must contain a 'filename' column.
     --laz_dir  Path to the directory where LAZ files should be located.
+    --manifest Download manifest (default: <laz_dir>/download_manifest.jsonl, if present).
+    --size_col Optional CSV column with the expected size in bytes.
+    --workers  Files verified in parallel (default: 8).
+    --no_hash  Skip SHA-256 verification (header and size checks only).
 
 Example:
     python check_missing_laz.py --csv ./tiles_inventory.csv --laz_dir ./las_tiles/
 
 Returns:
-    Prints a list of missing filenames if any are found; otherwise confirms all are present.
+    Prints a list of missing filenames and of files failing verification, if any;
+    otherwise confirms all are present and valid. Exits with status 1 on any problem.
 """
 
 import os
+import sys
+import json
+import struct
+import hashlib
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
-def check_missing_laz(csv_path, laz_dir):
+MANIFEST_FILENAME = "download_manifest.jsonl"
+
+def scan_dir(laz_dir):
+    """
+    {filename: size in bytes} of the regular files in *laz_dir*, from a single os.scandir pass.
+    """
+    with os.scandir(laz_dir) as it:
+        return {e.name: e.stat().st_size for e in it if e.is_file()}
+
+def load_manifest(manifest_path):
+    """
+    {filename: entry} from a robust_downloader.py manifest; the last line per file wins.
+    """
+    entries = {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["filename"]] = entry
+    return entries
+
+def file_sha256(path, block_size=8 * 1024 * 1024):
+    """Stream a file through SHA-256 and return the hex digest."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def check_laz_header(path, size):
+    """
+    Sanity-check the LAS/LAZ header of *path* (*size* bytes).
+
+    Returns:
+        str: Description of the first problem found, or None if the header looks valid.
+    """
+    import laspy
+    try:
+        with laspy.open(path) as reader:
+            header = reader.header
+            compressed = reader.header.are_points_compressed
+    except Exception as e:
+        return f"unreadable header ({type(e).__name__}: {e})"
+    if header.point_count <= 0:
+        return "header reports no points"
+    if not (np.all(np.isfinite(header.mins)) and np.all(np.isfinite(header.maxs)) and np.all(header.mins <= header.maxs)):
+        return "invalid bounds in header"
+    if header.offset_to_point_data >= size:
+        return f"point data offset {header.offset_to_point_data} beyond end of file ({size} bytes)"
+    if compressed:
+        # LAZ: the first 8 bytes of the point data hold the chunk table offset
+        # (-1: stored in the last 8 bytes of the file instead)
+        try:
+            with open(path, "rb") as f:
+                f.seek(header.offset_to_point_data)
+                table_offset = struct.unpack("<q", f.read(8))[0]
+                if table_offset == -1:
+                    f.seek(size - 8)
+                    table_offset = struct.unpack("<q", f.read(8))[0]
+                if not header.offset_to_point_data < table_offset <= size - 8:
+                    return f"LAZ chunk table offset {table_offset} outside the file ({size} bytes), file is truncated"
+                f.seek(table_offset)
+                version, _ = struct.unpack("<II", f.read(8))
+        except (OSError, struct.error) as e:
+            return f"unreadable LAZ chunk table ({type(e).__name__}: {e})"
+        if version != 0:
+            return f"invalid LAZ chunk table at offset {table_offset}"
+    else:
+        # LAS: fixed-size records, so the point data must fit in the file
+        end_of_points = header.offset_to_point_data + header.point_count * header.point_format.size
+        if end_of_points > size:
+            return f"point data ends at byte {end_of_points}, beyond end of file ({size} bytes), file is truncated"
+    return None
+
+def verify_file(path, size, expected_size=None, expected_sha256=None, check_hash=True):
+    """
+    Verify one downloaded file.
+
+    Args:
+        path (str): File to verify.
+        size (int): Its size on disk (from the directory scan).
+        expected_size (int, optional): Size it should have.
+        expected_sha256 (str, optional): SHA-256 it should have.
+        check_hash (bool): Compute and compare the SHA-256 if one is expected.
+
+    Returns:
+        list: Problems found (empty if the file is valid).
+    """
+    if expected_size is not None and size != expected_size:
+        return [f"size {size} != expected {expected_size}"]
+    problems = []
+    header_problem = check_laz_header(path, size)
+    if header_problem:
+        problems.append(header_problem)
+    if check_hash and expected_sha256 and file_sha256(path) != expected_sha256:
+        problems.append("SHA-256 mismatch")
+    return problems
+
+def check_missing_laz(csv_path, laz_dir, manifest_path=None, size_col=None, workers=8, check_hash=True):
     """
-    Loads the metadata CSV and checks for missing files in the supplied `laz_dir`.
-    Prints missing filenames, if any.
+    Loads the metadata CSV and checks for missing files in the supplied `laz_dir`,
+    then verifies the files that are present.
+    Prints missing filenames and failed files, if any.
 
     Args:
         csv_path (str): Path to the metadata CSV file (must have a 'filename' column)
         laz_dir (str): Path to the directory containing LAZ files
+        manifest_path (str, optional): Download manifest with expected sizes and hashes
+        size_col (str, optional): CSV column with the expected size in bytes
+        workers (int): Files verified in parallel
+        check_hash (bool): Verify SHA-256 hashes from the manifest
+
+    Returns:
+        bool: True if all files are present and valid.
     """
     # Load the metadata CSV into a DataFrame
     try:
         df = pd.read_csv(csv_path)
     except FileNotFoundError:
         print(f"ERROR: Metadata CSV not found at: {csv_path}")
-        return
+        return False
     except Exception as e:
         print(f"ERROR: Failed to load metadata CSV: {e}")
-        return
+        return False
 
     if "filename" not in df.columns:
         print("ERROR: The metadata CSV does not contain a 'filename' column!")
-        return
+        return False
+    if size_col and size_col not in df.columns:
+        print(f"ERROR: The metadata CSV does not contain a '{size_col}' column!")
+        return False
 
-    # Get all filenames in the LAZ directory
+    # Get all filenames (and sizes) in the LAZ directory
     try:
-        laz_files = set(os.listdir(laz_dir))
+        laz_files = scan_dir(laz_dir)
     except FileNotFoundError:
         print(f"ERROR: LAZ directory not found at: {laz_dir}")
-        return
+        return False
     except Exception as e:
         print(f"ERROR: Failed to list files in LAZ_DIR: {e}")
-        return
+        return False
+
+    manifest = {}
+    if manifest_path:
+        try:
+            manifest = load_manifest(manifest_path)
+        except FileNotFoundError:
+            print(f"ERROR: Download manifest not found at: {manifest_path}")
+            return False
 
     # Find rows where the 'filename' from the CSV is not present in the directory
-    missing = df[~df["filename"].isin(laz_files)]
+    present = df["filename"].isin(laz_files)
+    missing = df[~present]
 
     if missing.empty:
         print("All filenames listed in the metadata CSV exist in the LAZ directory.")
@@ -66,9 +209,30 @@ def check_missing_laz(csv_path, laz_dir):
         print("The following filenames from the metadata CSV are missing in the LAZ directory:")
         print(missing['filename'].to_string(index=False))
 
+    jobs = []
+    for row in df[present].to_dict("records"):
+        name = row["filename"]
+        entry = manifest.get(name, {})
+        expected_size = entry.get("size")
+        if expected_size is None and size_col and pd.notna(row[size_col]):
+            expected_size = int(row[size_col])
+        jobs.append((name, os.path.join(laz_dir, name), laz_files[name], expected_size, entry.get("sha256")))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            lambda job: (job[0], verify_file(job[1], job[2], job[3], job[4], check_hash)), jobs
+        ))
+    failed = [(name, problems) for name, problems in results if problems]
+    unlisted = sum(1 for job in jobs if job[0] not in manifest)
+
+    print(f"Verified {len(jobs)} files ({len(jobs) - unlisted} with a manifest entry), {len(failed)} failed.")
+    for name, problems in failed:
+        print(f"  {name}: {'; '.join(problems)}")
+    return missing.empty and not failed
+
 def main():
     parser = argparse.ArgumentParser(
-        description="Check which LAZ files from a metadata CSV are missing in a given directory."
+        description="Check which LAZ files from a metadata CSV are missing in a given directory, and verify the ones present."
     )
     parser.add_argument(
         '--csv',
@@ -80,8 +244,35 @@ def main():
         required=True,
         help="Path to the directory containing the LAZ files."
     )
+    parser.add_argument(
+        '--manifest',
+        default=None,
+        help=f"Download manifest from robust_downloader.py (default: <laz_dir>/{MANIFEST_FILENAME}, if present)."
+    )
+    parser.add_argument(
+        '--size_col',
+        default=None,
+        help="Optional CSV column with the expected file size in bytes."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=8,
+        help="Number of files verified in parallel (default: 8)."
+    )
+    parser.add_argument(
+        '--no_hash',
+        action='store_true',
+        help="Skip SHA-256 verification (size and header checks only)."
+    )
     args = parser.parse_args()
-    check_missing_laz(args.csv, args.laz_dir)
+
+    manifest_path = args.manifest
+    default_manifest = os.path.join(args.laz_dir, MANIFEST_FILENAME)
+    if manifest_path is None and os.path.isfile(default_manifest):
+        manifest_path = default_manifest
+    ok = check_missing_laz(args.csv, args.laz_dir, manifest_path, args.size_col, args.workers, not args.no_hash)
+    sys.exit(0 if ok else 1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
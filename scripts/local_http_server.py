@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Local Stand-in HTTP Server for Downloader Tests and Benchmarks
+
+Serves the files of one directory over HTTP/1.1 with keep-alive and byte-range
+support (206 Partial Content / 416 Range Not Satisfiable), which is what
+robust_downloader.py relies on from the DAAC. Python's built-in
+http.server speaks HTTP/1.0 and ignores Range, so it can't stand in for it.
+
+The server counts requests and TCP connections, so a benchmark can show how many
+handshakes a download run cost. It can also inject the failures the real
+server produces, at random with a fixed seed:
+
+    --throttle_rate  fraction of requests answered 429 Too Many Requests
+    --error_rate     fraction of requests answered 503 Service Unavailable
+    --drop_rate      fraction of responses cut off halfway through the body
+    --retry_after    Retry-After seconds sent with 429/503 (omitted if negative)
+
+Usage:
+    python local_http_server.py --dir data/example --port 8000
+
+    from local_http_server import serve
+    server, base_url = serve("data/example")
+    ...
+    server.shutdown()
+"""
+
+import os
+import re
+import sys
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET/HEAD handler for the files in server.directory, honouring single byte ranges.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.stats["connections"] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        name = os.path.basename(self.path.split("?", 1)[0])
+        path = os.path.join(self.server.directory, name)
+        return path if name and os.path.isfile(path) else None
+
+    def _send_empty(self, status, headers=()):
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _parse_range(self, size):
+        """
+        (start, end) inclusive for the Range header, None for no/unsupported Range,
+        or False if the range can't be satisfied.
+        """
+        match = _RANGE.match(self.headers.get("Range", "").strip())
+        if not match:
+            return None
+        start, end = match.groups()
+        if not start:  # suffix range: last N bytes
+            if not end:
+                return None
+            start, end = max(0, size - int(end)), size - 1
+        else:
+            start, end = int(start), min(int(end) if end else size - 1, size - 1)
+        if start >= size or start > end:
+            return False
+        return start, end
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def _handle(self, send_body):
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+            roll = self.server.rng.random()
+        faults = self.server.faults
+        for status, rate_key in ((429, "throttle_rate"), (503, "error_rate")):
+            if roll < faults[rate_key]:
+                with self.server.stats_lock:
+                    self.server.stats[str(status)] += 1
+                retry_after = faults["retry_after"]
+                self._send_empty(status, [("Retry-After", str(retry_after))] if retry_after >= 0 else [])
+                return
+            roll -= faults[rate_key]
+        drop = roll < faults["drop_rate"]
+        path = self._resolve()
+        if path is None:
+            self._send_empty(404)
+            return
+        size = os.path.getsize(path)
+        byte_range = self._parse_range(size)
+        if byte_range is False:
+            self._send_empty(416, [("Content-Range", f"bytes */{size}")])
+            return
+        start, end = byte_range or (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if send_body and drop:
+            with self.server.stats_lock:
+                self.server.stats["dropped"] += 1
+            self._send_bytes(path, start, (end - start + 1) // 2)
+            self.close_connection = True
+        elif send_body:
+            self._send_bytes(path, start, end - start + 1)
+
+    def _send_bytes(self, path, offset, length):
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while length > 0:
+                block = f.read(min(length, 1024 * 1024))
+                if not block:
+                    break
+                self.wfile.write(block)
+                length -= len(block)
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing a connection mid-body (e.g. an abandoned stream) is normal here
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+def serve(directory, host="127.0.0.1", port=0, handler=RangeRequestHandler,
+          throttle_rate=0.0, error_rate=0.0, drop_rate=0.0, retry_after=1, seed=0):
+    """
+    Start a threaded server for *directory* in a background thread.
+
+    Args:
+        directory (str): Directory whose files are served by basename.
+        port (int): Port to bind; 0 picks a free port.
+        handler: Request handler class (RangeRequestHandler or a subclass).
+        throttle_rate, error_rate, drop_rate (float): Fractions of requests that get
+            a 429, a 503, or a body cut off halfway (see module docstring).
+        retry_after (int): Retry-After seconds sent with 429/503; negative to omit it.
+        seed (int): Seed for the fault injection.
+
+    Returns:
+        tuple: (server, base_url). Call server.shutdown() when done; server.stats
+        holds request, connection and injected-fault counts, and server.faults
+        can be changed while it runs.
+    """
+    server = _Server((host, port), handler)
+    server.directory = os.path.abspath(directory)
+    server.stats = {"requests": 0, "connections": 0, "429": 0, "503": 0, "dropped": 0}
+    server.stats_lock = threading.Lock()
+    server.faults = {"throttle_rate": throttle_rate, "error_rate": error_rate, "drop_rate": drop_rate, "retry_after": retry_after}
+    server.rng = random.Random(seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a directory over HTTP/1.1 with byte-range support.")
+    parser.add_argument('--dir', default=".", help="Directory to serve (default: current directory)")
+    parser.add_argument('--host', default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8000, help="Port (default: 8000)")
+    parser.add_argument('--throttle_rate', type=float, default=0.0, help="Fraction of requests answered 429 (default: 0)")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Fraction of requests answered 503 (default: 0)")
+    parser.add_argument('--drop_rate', type=float, default=0.0, help="Fraction of responses cut off halfway (default: 0)")
+    parser.add_argument('--retry_after', type=int, default=1, help="Retry-After seconds with 429/503, negative to omit (default: 1)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for fault injection (default: 0)")
+    args = parser.parse_args()
+
+    server, base_url = serve(
+        args.dir, args.host, args.port, throttle_rate=args.throttle_rate, error_rate=args.error_rate,
+        drop_rate=args.drop_rate, retry_after=args.retry_after, seed=args.seed
+    )
+    print(f"Serving {server.directory} at {base_url}/ (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
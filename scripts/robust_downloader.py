@@ -9,6 +9,33 @@ Parameters (via command line):
     --download_dir: Target directory where files will be downloaded.
     --urls_file:    Path to a text file containing URLs (one per line).
     --num_threads:  Number of worker threads for parallel downloads.
+    --sizes_csv:    Optional inventory CSV with file sizes (columns --size_col and 'filename'),
+                    used to order the queue largest first.
+    --size_probe:   Without --sizes_csv, size every URL with a HEAD request up front
+                    to order the queue (one extra round trip per file).
+    --parts:        Byte ranges fetched concurrently for files of at least
+                    --multipart_min_size_mb (1 disables multi-part downloads).
+    --manifest:     JSONL manifest of completed files (default: <download_dir>/download_manifest.jsonl).
+
+Workers pull URLs from one shared queue, largest file first when sizes are
+known, so a thread that gets a few huge tiles doesn't hold up the run while the
+others sit idle; without sizes the queue keeps the order of the URL file.
+Each thread keeps one requests.Session, so connections (and TLS sessions) are
+reused across files, and every file costs a single GET: the total size is read
+from that response's Content-Range/Content-Length instead of a separate HEAD.
+
+Large files (when the server advertises Accept-Ranges) are split into --parts
+byte ranges that are fetched concurrently and written in place into a
+preallocated file. Per-part progress is kept in '<file>.parts.json' until the
+file is complete, so an interrupted download only re-fetches the missing bytes
+of each part. Small files keep using a single stream.
+
+Every completed file is appended to the manifest with its size and SHA-256,
+one JSON object per line: {"filename", "size", "sha256", "url", "time"}.
+Single-stream downloads are hashed while they are written (a resumed file's
+existing bytes are hashed first); multi-part files, whose parts arrive out of
+order, are hashed in one sequential read once complete.
+scripts/check_dataset_download_is_complete.py verifies the files against it.
 
 Usage:
     python downloader.py --download_dir ./my_data --urls_file urls.txt --num_threads 8
@@ -23,12 +50,19 @@ Logging:
     Logs are streamed to both 'log.txt' (file) and STDOUT (console).
 """
 
+import json
+import random
+import hashlib
 import logging
 import os
 import time
+import email.utils
 import requests
+import requests.adapters
+import queue
 import threading
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 def sizeof_fmt(num, suffix='B'):
     """
@@ -40,6 +74,78 @@ def sizeof_fmt(num, suffix='B'):
         num /= 1024.0
     return f"{num:.1f}P{suffix}"
 
+DEFAULT_PARTS = 4
+DEFAULT_MULTIPART_MIN_SIZE_MB = 64
+# Flush a part to disk and record its progress after this many bytes
+PART_CHECKPOINT_BYTES = 16 * 1024 * 1024
+
+MANIFEST_FILENAME = "download_manifest.jsonl"
+# Exponential backoff between retries: full jitter over [0, min(cap, base * 2**attempt)]
+BACKOFF_BASE_S = 1.0
+BACKOFF_CAP_S = 60.0
+
+_thread_local = threading.local()
+_manifest_lock = threading.Lock()
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header (delay in seconds or an HTTP date), or None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+def backoff_delay(attempt, retry_after=None, base=BACKOFF_BASE_S, cap=BACKOFF_CAP_S):
+    """
+    Seconds to wait before retry number *attempt* (1-based): the server's
+    Retry-After if it sent one, otherwise exponential backoff with full jitter,
+    so threads that failed together don't retry in lockstep.
+    """
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def retry_after_of(exc):
+    """
+    Parsed Retry-After of the HTTP response attached to a requests exception, if any.
+    """
+    response = getattr(exc, "response", None)
+    return parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+
+def get_session():
+    """
+    The calling thread's requests.Session (created on first use). Sessions keep
+    connections alive between requests; they are not shared between threads.
+    """
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _thread_local.session = session
+    return session
+
+def total_size_from_response(r):
+    """
+    Total remote file size from a GET response: the '/total' of Content-Range for
+    206/416 responses, else Content-Length of a 200. Returns 0 if unknown.
+    """
+    content_range = r.headers.get("Content-Range", "")
+    total = content_range.rsplit("/", 1)[-1] if "/" in content_range else ""
+    if total.isdigit():
+        return int(total)
+    if r.status_code == 200:
+        return int(r.headers.get("Content-Length", 0))
+    return 0
+
 def get_local_path(url, download_dir):
     """
     Given a URL and download directory, return the target local file path.
@@ -47,65 +153,253 @@ def get_local_path(url, download_dir):
     fname = url.split("/")[-1]
     return os.path.join(download_dir, fname)
 
-def download_with_resume(url, download_dir):
+def sha256_of_prefix(path, length, block_size=8 * 1024 * 1024):
+    """
+    SHA-256 hash object fed with the first *length* bytes of *path*, ready to be
+    updated with the bytes that follow.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while length > 0:
+            block = f.read(min(block_size, length))
+            if not block:
+                break
+            h.update(block)
+            length -= len(block)
+    return h
+
+def append_manifest(manifest_path, local_path, url, size, sha256):
+    """
+    Record a completed download (one JSON line; the last line for a filename wins).
+    """
+    entry = {
+        "filename": os.path.basename(local_path),
+        "size": size,
+        "sha256": sha256,
+        "url": url,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with _manifest_lock:
+        with open(manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+def part_state_path(local_path):
+    """
+    Path of the per-part progress file of a multi-part download.
+    """
+    return f"{local_path}.parts.json"
+
+def load_part_state(local_path):
+    """
+    Progress of an unfinished multi-part download of *local_path*, or None if
+    there is none. A progress file that doesn't match the local file is removed.
+    """
+    state_path = part_state_path(local_path)
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(local_path) or os.path.getsize(local_path) != state.get("size"):
+        os.remove(state_path)
+        return None
+    return state
+
+def save_part_state(local_path, state):
+    """
+    Atomically write the per-part progress file.
+    """
+    tmp_path = f"{part_state_path(local_path)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, part_state_path(local_path))
+
+def plan_parts(file_size, num_parts):
+    """
+    Split a file of *file_size* bytes into up to *num_parts* contiguous byte ranges
+    (inclusive 'start'/'end', as in a Range header), each with 0 bytes 'done'.
+    """
+    step = -(-file_size // max(1, num_parts))
+    return [{"start": start, "end": min(start + step, file_size) - 1, "done": 0} for start in range(0, file_size, step)]
+
+def preallocate(path, size):
+    """
+    Create *path* with its final size so parts can be written at their offsets.
+    """
+    with open(path, "wb") as f:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+
+def fetch_part(url, local_path, part, state, lock, max_retries=5):
+    """
+    Fetch the missing bytes of one part into place, retrying on errors.
+
+    Progress is recorded only after the written bytes were flushed to disk, so
+    'done' never claims data that a crash could lose.
+    """
+    name = os.path.basename(local_path)
+    length = part["end"] - part["start"] + 1
+    done = part["done"]
+
+    def checkpoint(f):
+        f.flush()
+        os.fsync(f.fileno())
+        with lock:
+            part["done"] = done
+            save_part_state(local_path, state)
+
+    attempt = 0
+    with open(local_path, "r+b") as f:
+        while done < length:
+            offset = part["start"] + done
+            try:
+                with get_session().get(url, headers={"Range": f"bytes={offset}-{part['end']}"}, stream=True, timeout=60) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise requests.exceptions.HTTPError(f"Expected 206 for a range request, got {r.status_code}")
+                    f.seek(offset)
+                    unsaved = 0
+                    for chunk in r.iter_content(chunk_size=1024*1024):
+                        chunk = chunk[:length - done]
+                        f.write(chunk)
+                        done += len(chunk)
+                        unsaved += len(chunk)
+                        if unsaved >= PART_CHECKPOINT_BYTES:
+                            checkpoint(f)
+                            unsaved = 0
+                        if done >= length:
+                            break
+                if done < length:
+                    raise requests.exceptions.ConnectionError(f"Response ended {length - done} bytes short")
+            except (requests.exceptions.RequestException, OSError) as e:
+                checkpoint(f)
+                attempt += 1
+                if attempt >= max_retries:
+                    raise
+                delay = backoff_delay(attempt, retry_after_of(e))
+                logging.info(f"Connection broken while downloading bytes {part['start']}-{part['end']} of {name} (attempt {attempt}), retrying in {delay:.1f}s. Error: {e}")
+                time.sleep(delay)
+        checkpoint(f)
+
+def download_multipart(url, local_path, file_size, num_parts=DEFAULT_PARTS, state=None, manifest_path=None):
+    """
+    Download *url* as concurrently fetched byte ranges written into a preallocated
+    *local_path*, or continue the unfinished download described by *state*.
+
+    Returns:
+        bool: True once every part is complete (the progress file is then removed
+        and the file recorded in *manifest_path*).
+    """
+    name = os.path.basename(local_path)
+    if state is None:
+        # Progress file first: a preallocated file without one would look complete
+        state = {"url": url, "size": file_size, "parts": plan_parts(file_size, num_parts)}
+        save_part_state(local_path, state)
+        preallocate(local_path, file_size)
+    todo = [p for p in state["parts"] if p["done"] < p["end"] - p["start"] + 1]
+    remaining = sum(p["end"] - p["start"] + 1 - p["done"] for p in todo)
+    logging.info(f"Downloading {name} (total {sizeof_fmt(file_size)}) in {len(state['parts'])} parts, {sizeof_fmt(remaining)} remaining")
+
+    lock = threading.Lock()
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, len(todo))) as pool:
+        futures = [pool.submit(fetch_part, url, local_path, part, state, lock) for part in todo]
+        errors = [fut.exception() for fut in futures if fut.exception() is not None]
+    if errors:
+        logging.info(f"FAILED: {name}: {len(errors)} of {len(todo)} parts incomplete ({errors[0]}), progress kept for resume.")
+        return False
+    os.remove(part_state_path(local_path))
+    if manifest_path:
+        append_manifest(manifest_path, local_path, url, file_size, sha256_of_prefix(local_path, file_size).hexdigest())
+    elapsed = time.time() - start_time
+    speed = remaining / elapsed if elapsed > 0 else remaining
+    logging.info(f"Finished: {name} ({sizeof_fmt(file_size)}) in {elapsed:.2f}s, avg speed {sizeof_fmt(speed)}/s")
+    return True
+
+def download_with_resume(url, download_dir, num_parts=1, multipart_min_size=DEFAULT_MULTIPART_MIN_SIZE_MB * 1024**2,
+                         manifest_path=None):
     """
     Downloads a file from the specified URL to the given download_dir.
     Supports resuming partial/incomplete downloads and retries upon failures.
 
+    A partial local file is resumed with a Range request; a server that answers
+    416 (range not satisfiable) for it means the file is already complete, and a
+    200 instead of 206 means the server ignored the range and the file restarts.
+
+    A new file of at least *multipart_min_size* bytes from a server that accepts
+    ranges is handed to download_multipart() once the first response has given
+    its size; an unfinished multi-part download is always continued as one.
+
     Args:
         url (str): The remote file URL.
         download_dir (str): Local target directory for the download.
+        num_parts (int): Byte ranges to fetch concurrently for large files (1: always single stream).
+        multipart_min_size (int): Smallest file size in bytes to split into parts.
+        manifest_path (str, optional): Append size and SHA-256 of the completed file here.
+            A file whose final size differs from the server's is reported as failed instead.
     """
     local_path = get_local_path(url, download_dir)
     os.makedirs(os.path.dirname(local_path), exist_ok=True)
-    headers = {}
-    mode = "wb"
-
-    try:
-        head = requests.head(url, allow_redirects=True)
-        file_size = int(head.headers.get("Content-Length", 0))
-    except Exception as e:
-        logging.info(f"HEAD failed for {url}: {e}")
+    state = load_part_state(local_path)
+    if state is not None:
+        download_multipart(url, local_path, state["size"], state=state, manifest_path=manifest_path)
         return
-
-    if os.path.exists(local_path):
-        local_size = os.path.getsize(local_path)
-        if file_size and local_size >= file_size:
-            logging.info(f"Already downloaded {os.path.basename(local_path)}, skipping.")
-            return
-        headers["Range"] = f"bytes={local_size}-"
-        mode = "ab"
-    else:
-        local_size = 0
-
-    logging.info(f"Downloading {os.path.basename(local_path)} (total {sizeof_fmt(file_size)}) starting at {sizeof_fmt(local_size)}")
+    session = get_session()
+    local_size = os.path.getsize(local_path) if os.path.exists(local_path) else 0
 
     max_retries = 5
     attempt = 0
     success = False
+    multipart = False
+    file_size = 0
     bytes_downloaded = local_size
     start_time = time.time()
     while attempt < max_retries and not success:
+        headers = {"Range": f"bytes={bytes_downloaded}-"} if bytes_downloaded else {}
         try:
-            with requests.get(url, headers=headers, stream=True, timeout=60) as r:
+            with session.get(url, headers=headers, stream=True, timeout=60) as r:
+                file_size = total_size_from_response(r) or file_size
+                if r.status_code == 416 and bytes_downloaded and (not file_size or bytes_downloaded >= file_size):
+                    logging.info(f"Already downloaded {os.path.basename(local_path)}, skipping.")
+                    return
                 r.raise_for_status()
+                if r.status_code != 206:
+                    bytes_downloaded = local_size = 0
+                if (num_parts > 1 and not bytes_downloaded and file_size >= multipart_min_size
+                        and r.headers.get("Accept-Ranges") == "bytes"):
+                    multipart = True
+                    break
+                mode = "ab" if bytes_downloaded else "wb"
+                if attempt == 0:
+                    logging.info(f"Downloading {os.path.basename(local_path)} (total {sizeof_fmt(file_size)}) starting at {sizeof_fmt(bytes_downloaded)}")
+                hasher = sha256_of_prefix(local_path, bytes_downloaded) if bytes_downloaded else hashlib.sha256()
                 with open(local_path, mode) as f:
                     for chunk in r.iter_content(chunk_size=1024*1024):
                         if chunk:
                             f.write(chunk)
+                            hasher.update(chunk)
                             bytes_downloaded += len(chunk)
             success = True
         except (requests.exceptions.RequestException, OSError) as e:
             attempt += 1
-            logging.info(f"Connection broken while downloading {os.path.basename(local_path)} (attempt {attempt}), will retry. Error: {e}")
-            time.sleep(5)
-            mode = "ab"
+            delay = backoff_delay(attempt, retry_after_of(e))
+            logging.info(f"Connection broken while downloading {os.path.basename(local_path)} (attempt {attempt}), retrying in {delay:.1f}s. Error: {e}")
+            time.sleep(delay)
             if os.path.exists(local_path):
                 bytes_downloaded = os.path.getsize(local_path)
-            headers["Range"] = f"bytes={bytes_downloaded}-"
+
+    if multipart:
+        download_multipart(url, local_path, file_size, num_parts, manifest_path=manifest_path)
+        return
 
     elapsed = time.time() - start_time
-    if success:
+    if success and file_size and bytes_downloaded != file_size:
+        logging.info(f"FAILED: {os.path.basename(local_path)} is {bytes_downloaded} bytes, server reported {file_size}.")
+    elif success:
+        if manifest_path:
+            append_manifest(manifest_path, local_path, url, bytes_downloaded, hasher.hexdigest())
         speed = bytes_downloaded - local_size
         if elapsed > 0:
             speed /= elapsed
@@ -113,15 +407,56 @@ def download_with_resume(url, download_dir):
     else:
         logging.info(f"FAILED: {os.path.basename(local_path)} after {max_retries} attempts.")
 
-def worker(urls, download_dir):
+def probe_size(url):
+    """
+    Remote file size from a HEAD request (0 if unknown or the request fails).
+    """
+    try:
+        head = get_session().head(url, allow_redirects=True, timeout=60)
+        return int(head.headers.get("Content-Length", 0))
+    except Exception as e:
+        logging.info(f"HEAD failed for {url}: {e}")
+        return 0
+
+def load_inventory_sizes(csv_path, size_col="file_size"):
+    """
+    Read {filename: size in bytes} from an inventory CSV with 'filename' and *size_col* columns.
+    """
+    import pandas as pd
+    df = pd.read_csv(csv_path, usecols=["filename", size_col])
+    return dict(zip(df["filename"], df[size_col].fillna(0).astype("int64")))
+
+def order_largest_first(urls, sizes):
     """
-    Worker function for thread: downloads all URLs in its batch.
+    Sort URLs by size, largest first (longest-processing-time-first scheduling).
+    URLs of unknown size keep their input order and go last.
     """
-    for url in urls:
+    return sorted(urls, key=lambda url: -sizes.get(url, 0))
+
+def build_queue(urls, sizes):
+    """
+    Shared work queue for the download threads, largest files first.
+    """
+    q = queue.Queue()
+    for url in order_largest_first(urls, sizes):
+        q.put(url)
+    return q
+
+def worker(url_queue, download_dir, num_parts=1, multipart_min_size=DEFAULT_MULTIPART_MIN_SIZE_MB * 1024**2, manifest_path=None):
+    """
+    Worker function for thread: keeps taking the next URL from the shared queue until it is empty.
+    """
+    while True:
         try:
-            download_with_resume(url, download_dir)
+            url = url_queue.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            download_with_resume(url, download_dir, num_parts, multipart_min_size, manifest_path)
         except Exception as e:
             logging.info(f"UNCAUGHT ERROR {url}: {e}")
+        finally:
+            url_queue.task_done()
 
 def parse_args():
     """
@@ -131,6 +466,12 @@ def parse_args():
     parser.add_argument('--download_dir', default="downloads", help="Download directory (default: ./downloads)")
     parser.add_argument('--urls_file', default="urls.txt", help="Text file with URLs (one per line)")
     parser.add_argument('--num_threads', type=int, default=10, help="Number of download threads (default: 10)")
+    parser.add_argument('--sizes_csv', default=None, help="Inventory CSV with 'filename' and file size columns, used to download the largest files first")
+    parser.add_argument('--size_col', default="file_size", help="Size column (bytes) in --sizes_csv (default: file_size)")
+    parser.add_argument('--parts', type=int, default=DEFAULT_PARTS, help=f"Byte ranges fetched concurrently per large file, 1 to disable (default: {DEFAULT_PARTS})")
+    parser.add_argument('--multipart_min_size_mb', type=float, default=DEFAULT_MULTIPART_MIN_SIZE_MB, help=f"Only split files of at least this many MiB into parts (default: {DEFAULT_MULTIPART_MIN_SIZE_MB})")
+    parser.add_argument('--manifest', default=None, help=f"JSONL manifest of completed files with size and SHA-256 (default: <download_dir>/{MANIFEST_FILENAME})")
+    parser.add_argument('--size_probe', action="store_true", help="Without --sizes_csv, size every URL with a HEAD request first to download the largest files first (default: keep the file order)")
     return parser.parse_args()
 
 def main():
@@ -159,17 +500,30 @@ def main():
         logging.info("No URLs found to download!")
         return
 
-    batches = [urls[i::args.num_threads] for i in range(args.num_threads)]
-    threads = []
     t_start = time.time()
-    for batch in batches:
-        t = threading.Thread(target=worker, args=(batch, args.download_dir))
+    if args.sizes_csv:
+        by_name = load_inventory_sizes(args.sizes_csv, args.size_col)
+        sizes = {url: by_name.get(url.split("/")[-1], 0) for url in urls}
+    elif args.size_probe:
+        with ThreadPoolExecutor(max_workers=args.num_threads) as pool:
+            sizes = dict(zip(urls, pool.map(probe_size, urls)))
+    else:
+        sizes = {}
+    known = [size for size in sizes.values() if size]
+    logging.info(f"{len(urls)} URLs, {len(known)} with known size ({sizeof_fmt(sum(known))})")
+
+    os.makedirs(args.download_dir, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.download_dir, MANIFEST_FILENAME)
+    url_queue = build_queue(urls, sizes)
+    threads = []
+    for _ in range(min(args.num_threads, len(urls))):
+        t = threading.Thread(target=worker, args=(url_queue, args.download_dir, args.parts, int(args.multipart_min_size_mb * 1024**2), manifest_path))
         t.start()
         threads.append(t)
     for t in threads:
         t.join()
     t_total = time.time() - t_start
-    logging.info(f"All downloads done. Total wall time: {t_total:.2f}s")
+    logging.info(f"All downloads done. Total wall time: {t_total:.2f}s. Manifest: {manifest_path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
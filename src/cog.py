@@ -0,0 +1,146 @@
+# src/cog.py
+"""
+Cloud-Optimized GeoTIFF output for DTMs.
+
+The templates write plain striped GTiff with COMPRESS=LZW (no predictor), so
+any viewer or mosaic has to read the whole file and float elevations barely
+compress. to_cog() rewrites a DTM with GDAL's COG driver: 512 x 512 tiles,
+internal overviews and DEFLATE or ZSTD with the floating-point predictor.
+Readers can then fetch a window or an overview level instead of the full raster.
+
+run_pdal_pipeline(..., cog_compression="zstd") converts each DTM right after PDAL writes it.
+To compare profiles on an existing DTM (file size, full / overview / window read time):
+
+    python -m src.cog data/example/SFX_A01_2012_laz_1_denoised_dtm.tif --benchmark
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Dict, List, Optional
+
+COG_COMPRESSIONS = ("deflate", "zstd")
+
+# Creation options per profile; "gtiff-lzw" is what the templates write today
+PROFILES: Dict[str, Dict[str, str]] = {
+    "gtiff-lzw": {"driver": "GTiff", "COMPRESS": "LZW"},
+    "cog-deflate": {"driver": "COG", "COMPRESS": "DEFLATE", "PREDICTOR": "YES", "LEVEL": "6"},
+    "cog-zstd": {"driver": "COG", "COMPRESS": "ZSTD", "PREDICTOR": "YES", "LEVEL": "9"},
+}
+
+def to_cog(src_path, dst_path=None, compression: str = "zstd", blocksize: int = 512,
+           resampling: str = "average", num_threads: str = "ALL_CPUS") -> str:
+    """
+    Rewrite *src_path* as a COG (in place if dst_path is None).
+
+    PREDICTOR=YES selects the floating-point predictor for float rasters and the
+    horizontal predictor for integer ones. Overviews are averaged, which is what
+    a zoomed-out DTM should show. The result is written to a temporary file and renamed.
+
+    Returns:
+        str: The output path.
+    """
+    import rasterio.shutil
+
+    if compression not in COG_COMPRESSIONS:
+        raise ValueError(f"compression must be one of {COG_COMPRESSIONS}, got {compression!r}")
+    options = dict(PROFILES[f"cog-{compression}"])
+    driver = options.pop("driver")
+    dst_path = str(dst_path or src_path)
+    tmp_path = f"{dst_path}.tmp.{os.getpid()}.tif"
+    try:
+        rasterio.shutil.copy(
+            str(src_path), tmp_path, driver=driver, BLOCKSIZE=str(blocksize),
+            OVERVIEW_RESAMPLING=resampling.upper(), NUM_THREADS=num_threads, **options
+        )
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return dst_path
+
+def _write_profile(src_path, dst_path, profile):
+    import rasterio.shutil
+    options = dict(PROFILES[profile])
+    driver = options.pop("driver")
+    rasterio.shutil.copy(str(src_path), str(dst_path), driver=driver, **options)
+
+def _time_read(path, repeats, **read_kwargs):
+    import rasterio
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        with rasterio.open(path) as src:
+            kwargs = {k: (v(src) if callable(v) else v) for k, v in read_kwargs.items()}
+            src.read(1, **kwargs)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+def benchmark_profiles(dtm_path, profiles: Optional[List[str]] = None, repeats: int = 3,
+                       overview_factor: int = 8, window_px: int = 512) -> List[Dict[str, float]]:
+    """
+    Write *dtm_path* with each profile and time three typical reads (best of *repeats*):
+    the full raster, a 1/overview_factor preview, and a window_px square window at the centre.
+    """
+    from rasterio.windows import Window
+
+    def preview_shape(src):
+        return (max(1, src.height // overview_factor), max(1, src.width // overview_factor))
+
+    def centre_window(src):
+        w, h = min(window_px, src.width), min(window_px, src.height)
+        return Window((src.width - w) // 2, (src.height - h) // 2, w, h)
+
+    results = []
+    tmp_dir = tempfile.mkdtemp(prefix="cog_bench_")
+    try:
+        for profile in profiles or list(PROFILES):
+            out_path = os.path.join(tmp_dir, f"{profile}.tif")
+            t0 = time.perf_counter()
+            _write_profile(dtm_path, out_path, profile)
+            results.append({
+                "profile": profile,
+                "write_s": time.perf_counter() - t0,
+                "size_mb": os.path.getsize(out_path) / 1024 ** 2,
+                "full_read_s": _time_read(out_path, repeats),
+                "preview_read_s": _time_read(out_path, repeats, out_shape=preview_shape),
+                "window_read_s": _time_read(out_path, repeats, window=centre_window),
+            })
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert DTM GeoTIFFs to Cloud-Optimized GeoTIFF, or benchmark output profiles.")
+    parser.add_argument("tifs", nargs="+", help="Input GeoTIFF(s)")
+    parser.add_argument("--compression", choices=COG_COMPRESSIONS, default="zstd", help="COG compression (default: zstd)")
+    parser.add_argument("--output-dir", default=None, help="Write COGs here instead of converting in place")
+    parser.add_argument("--benchmark", action="store_true", help="Report file size and read times per profile instead of converting")
+    parser.add_argument("--repeats", type=int, default=3, help="Reads per measurement with --benchmark, best is reported (default: 3)")
+    args = parser.parse_args()
+
+    missing = [p for p in args.tifs if not os.path.isfile(p)]
+    if missing:
+        print(f"ERROR: File(s) not found: {missing}")
+        sys.exit(1)
+
+    if args.benchmark:
+        for tif in args.tifs:
+            print(f"[cog] {tif}")
+            print(f"  {'Profile':<14} {'size (MiB)':>11} {'write (s)':>10} {'full (s)':>10} {'preview (s)':>12} {'window (s)':>11}")
+            for r in benchmark_profiles(tif, repeats=args.repeats):
+                print(f"  {r['profile']:<14} {r['size_mb']:>11.2f} {r['write_s']:>10.3f} {r['full_read_s']:>10.4f} "
+                      f"{r['preview_read_s']:>12.4f} {r['window_read_s']:>11.4f}")
+        return
+
+    for tif in args.tifs:
+        dst = os.path.join(args.output_dir, os.path.basename(tif)) if args.output_dir else None
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        print(f"[cog] Wrote: {to_cog(tif, dst, compression=args.compression)}")
+
+if __name__ == "__main__":
+    main()
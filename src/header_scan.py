@@ -0,0 +1,163 @@
+# src/header_scan.py
+"""
+Header-only ("fast") LAZ inventory scan.
+
+get_metadata() decompresses every point. Everything here comes from the LAS
+header and VLRs alone (point count, bounds, per-return counts, point format,
+scale/offset, CRS), so thousands of tiles can be scanned in seconds and the
+resulting table used to pre-screen tiles before committing to a full decode.
+
+    python -m src.header_scan data/raw/laz --workers 32 --output data/metadata/laz_headers.csv
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Union
+
+import laspy
+import numpy as np
+import pandas as pd
+
+# LAS 1.4 headers carry 15 per-return counts; older versions 5 (padded with 0)
+N_RETURNS = 15
+
+# GeoKeyDirectoryTag and OGC WKT VLRs
+_CRS_RECORD_IDS = {34735: "geotiff", 2112: "wkt"}
+
+HEADER_DTYPES = {
+    "filename": "string",
+    "file_size": "Int64",
+    "las_version": "string",
+    "point_format": "Int16",
+    "point_count": "Int64",
+    "min_x": "float64", "max_x": "float64",
+    "min_y": "float64", "max_y": "float64",
+    "min_z": "float64", "max_z": "float64",
+    "scale_x": "float64", "scale_y": "float64", "scale_z": "float64",
+    "offset_x": "float64", "offset_y": "float64", "offset_z": "float64",
+    "bbox_area": "float64",
+    "header_density": "float64",
+    "crs_vlr": "string",
+    "crs_epsg": "Int64",
+    "crs_name": "string",
+    "creation_date": "string",
+    "generating_software": "string",
+    "error": "string",
+}
+HEADER_DTYPES.update({f"n_return_{i}": "Int64" for i in range(1, N_RETURNS + 1)})
+
+def _parse_crs(hdr):
+    """(epsg, name) from the header's CRS VLRs; needs pyproj, else (None, None)."""
+    try:
+        crs = hdr.parse_crs()
+    except Exception:
+        return None, None
+    if crs is None:
+        return None, None
+    return crs.to_epsg(), crs.name
+
+def get_header_metadata(path_to_laz: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Read header-level metadata for one LAS/LAZ file without decoding any points.
+
+    Returns a flat dict with the keys in HEADER_DTYPES. bbox_area is in the
+    file's horizontal units (m^2 for the projected CMS Brazil tiles) and
+    header_density = point_count / bbox_area.
+    """
+    path_to_laz = str(path_to_laz)
+    with laspy.open(path_to_laz) as fh:
+        hdr = fh.header
+        by_return = np.zeros(N_RETURNS, dtype=np.int64)
+        counts = np.asarray(hdr.number_of_points_by_return, dtype=np.int64)[:N_RETURNS]
+        by_return[:len(counts)] = counts
+
+        crs_vlrs = sorted({_CRS_RECORD_IDS[v.record_id] for v in hdr.vlrs if v.record_id in _CRS_RECORD_IDS})
+        epsg, crs_name = _parse_crs(hdr)
+
+        mins, maxs = hdr.mins, hdr.maxs
+        bbox_area = float((maxs[0] - mins[0]) * (maxs[1] - mins[1]))
+        meta = {
+            "filename": os.path.basename(path_to_laz),
+            "file_size": os.path.getsize(path_to_laz),
+            "las_version": str(hdr.version),
+            "point_format": int(hdr.point_format.id),
+            "point_count": int(hdr.point_count),
+            "min_x": float(mins[0]), "max_x": float(maxs[0]),
+            "min_y": float(mins[1]), "max_y": float(maxs[1]),
+            "min_z": float(mins[2]), "max_z": float(maxs[2]),
+            "scale_x": float(hdr.scales[0]), "scale_y": float(hdr.scales[1]), "scale_z": float(hdr.scales[2]),
+            "offset_x": float(hdr.offsets[0]), "offset_y": float(hdr.offsets[1]), "offset_z": float(hdr.offsets[2]),
+            "bbox_area": bbox_area,
+            "header_density": int(hdr.point_count) / bbox_area if bbox_area > 0 else np.nan,
+            "crs_vlr": ",".join(crs_vlrs) if crs_vlrs else None,
+            "crs_epsg": epsg,
+            "crs_name": crs_name,
+            "creation_date": str(hdr.creation_date) if hdr.creation_date else None,
+            "generating_software": hdr.generating_software,
+            "error": None,
+        }
+        for i in range(N_RETURNS):
+            meta[f"n_return_{i + 1}"] = int(by_return[i])
+    return meta
+
+def _safe_header_metadata(path):
+    try:
+        return get_header_metadata(path)
+    except Exception as e:
+        return {"filename": os.path.basename(str(path)), "error": f"{type(e).__name__}: {e}"}
+
+def scan_headers(paths: Iterable[Union[str, Path]], workers: int = 16) -> pd.DataFrame:
+    """
+    Read headers for many files concurrently and return a typed DataFrame
+    (one row per file, columns/dtypes from HEADER_DTYPES). Unreadable files get
+    a row with only 'filename' and 'error' set.
+
+    Header reads are a few KB of I/O each, so a thread pool is enough.
+    """
+    paths = [str(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        rows: List[Dict[str, Any]] = list(executor.map(_safe_header_metadata, paths))
+    # Nullable integer dtypes so rows for unreadable files don't turn counts into floats
+    return pd.DataFrame(rows, columns=list(HEADER_DTYPES)).astype(HEADER_DTYPES)
+
+def main():
+    parser = argparse.ArgumentParser(description="Header-only metadata scan of a directory of LAS/LAZ files.")
+    parser.add_argument("laz_dir", type=str, help="Directory containing .laz files")
+    parser.add_argument("--pattern", default="*.laz", help="Glob pattern for input files (default: '*.laz')")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent header reads (default: 16)")
+    parser.add_argument("--output", default=None, help="Write the table to this .csv or .parquet file")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.laz_dir):
+        print(f"ERROR: LAZ directory not found at: {args.laz_dir}")
+        sys.exit(1)
+
+    paths = sorted(str(p) for p in Path(args.laz_dir).glob(args.pattern))
+    if not paths:
+        print(f"No files matching '{args.pattern}' in {args.laz_dir}")
+        return
+
+    t0 = time.time()
+    df = scan_headers(paths, workers=args.workers)
+    elapsed = time.time() - t0
+    n_err = int(df["error"].notna().sum())
+    print(f"[header_scan] Scanned {len(df)} files in {elapsed:.1f}s ({n_err} unreadable)")
+    print(f"[header_scan] Total points: {int(df['point_count'].sum()):,}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        if args.output.lower().endswith(".parquet"):
+            df.to_parquet(args.output, index=False)
+        else:
+            df.to_csv(args.output, index=False)
+        print(f"[header_scan] Wrote: {args.output}")
+    else:
+        with pd.option_context("display.max_columns", 12, "display.width", 160):
+            print(df.head(20))
+
+if __name__ == "__main__":
+    main()
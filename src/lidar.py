@@ -2,15 +2,23 @@
 
 import os
 import json
+import glob
+import hashlib
 import pathlib
 import pdal
 import laspy
 from collections import Counter
 import numpy as np
-from typing import Dict, Any, List, Union
+from typing import Dict, Any, List, Optional, Union
 import time
 from pathlib import Path
 
+from src.pipeline_template import PipelineTemplate, load_pipeline_template
+import src.run_report as run_report
+import src.subtile as subtile
+import src.stage_cache as stage_cache
+import src.cog as cog
+
 def pt(msg=None):
     current_time = time.strftime("%H:%M:%S")
     if msg:
@@ -34,18 +42,19 @@ def tile_bounds(laz_path, res=2.0):
 def load_template(path):
     """
     Load a JSON string (may contain placeholders like '{in_laz}', '{out_tif}').
+    Prefer load_pipeline_template(), which parses and validates once.
     """
     print(f"[lidar] Loading pipeline template from: {path}")
     return pathlib.Path(path).read_text()
 
 def build_pipeline(template_text, **kwargs):
     """
-    Fill placeholders in *template_text* and return as parsed dict.
+    Fill placeholders in *template_text* (str or PipelineTemplate) and return as parsed dict.
     """
     print(f"[lidar] Building PDAL pipeline from template...")
-    tpl = template_text.format(**{k: str(v) for k, v in kwargs.items()})
-    pipeline_def = json.loads(tpl)
-    return pipeline_def
+    if not isinstance(template_text, PipelineTemplate):
+        template_text = PipelineTemplate(template_text, required=())
+    return template_text.fill(**kwargs)
 
 def run_pipeline(pipeline_def):
 
@@ -56,11 +65,73 @@ def run_pipeline(pipeline_def):
     count = pl.execute()
     print(f"[lidar] PDAL complete, {count} points processed.")
 
+class _RunningStats:
+    """
+    Streaming min/max/mean/std (population, ddof=0) over chunks of values,
+    combined with Chan et al.'s pairwise form of Welford's update.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n_b = values.size
+        if n_b == 0:
+            return
+        mean_b = float(values.mean())
+        m2_b = float(np.square(values - mean_b).sum())
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.n * n_b / n
+        self.n = n
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def std(self):
+        return float(np.sqrt(self.m2 / self.n)) if self.n else np.nan
+
+def _fill_stats(meta, prefix, stats, fields=('min', 'max', 'mean', 'std')):
+    """Write *prefix*_{min,max,mean,std} into meta from a _RunningStats (NaN if missing/empty)."""
+    for f in fields:
+        if stats is None or stats.n == 0:
+            meta[f'{prefix}_{f}'] = np.nan
+        elif f == 'std':
+            meta[f'{prefix}_{f}'] = stats.std()
+        else:
+            meta[f'{prefix}_{f}'] = float(getattr(stats, f))
+
+def _fill_class_meta(meta, class_count_dict, n_total, tile_area_m2, all_classes, ground_class):
+    """Class counts/percentages, named class aliases and densities (shared by both get_metadata modes)."""
+    meta['n_points_total'] = n_total
+    for cls in all_classes:
+        cnt = class_count_dict.get(cls, 0)
+        meta[f'class_{cls}_count'] = int(cnt)
+        meta[f'class_{cls}_pct'] = (float(cnt) / n_total) if n_total else 0.0
+
+    meta['n_points_ground'] = meta[f'class_{ground_class}_count']
+    meta['ground_pct'] = meta[f'class_{ground_class}_pct']
+    for k, v in zip(
+        ["unclassified", "veg_low", "veg_med", "veg_high"],
+        [1, 3, 4, 5]
+    ):
+        meta[f'n_points_{k}'] = meta.get(f'class_{v}_count', 0)
+
+    meta['tile_area_m2'] = tile_area_m2
+    meta['density_total'] = n_total / tile_area_m2 if tile_area_m2 > 0 else np.nan
+    meta['density_ground'] = meta['n_points_ground'] / tile_area_m2 if tile_area_m2 > 0 else np.nan
+
 def get_metadata(
     path_to_laz, 
     tile_area_m2, 
     all_classes=range(0,20), 
-    ground_class=2
+    ground_class=2,
+    chunk_size=None
 ):
     """
     Compute stats for a LAZ tile. Returns a dict with keys:
@@ -74,33 +145,26 @@ def get_metadata(
         - only_return_pct
         - scan_angle_min, scan_angle_max, scan_angle_mean, scan_angle_std
         - gps_time_min, gps_time_max
+
+    If *chunk_size* is given, the tile is streamed in chunks of that many points
+    (see get_metadata_chunked) instead of being read into memory in one go.
     """
+    if chunk_size:
+        return get_metadata_chunked(
+            path_to_laz, tile_area_m2, all_classes=all_classes,
+            ground_class=ground_class, chunk_size=chunk_size
+        )
+
     meta = {}
     with laspy.open(path_to_laz) as lfile:
         las = lfile.read()
         classifications = np.asarray(las.classification)
         n_total = len(classifications)
-        meta['n_points_total'] = n_total
 
         # Class stats
         unique_classes, counts = np.unique(classifications, return_counts=True)
         class_count_dict = dict(zip(unique_classes, counts))
-        for cls in all_classes:
-            cnt = class_count_dict.get(cls, 0)
-            meta[f'class_{cls}_count'] = int(cnt)
-            meta[f'class_{cls}_pct'] = (float(cnt) / n_total) if n_total else 0.0
-
-        meta['n_points_ground'] = meta[f'class_{ground_class}_count']
-        meta['ground_pct'] = meta[f'class_{ground_class}_pct']
-        for k, v in zip(
-            ["unclassified", "veg_low", "veg_med", "veg_high"],
-            [1, 3, 4, 5]
-        ):
-            meta[f'n_points_{k}'] = meta.get(f'class_{v}_count', 0)
-
-        meta['tile_area_m2'] = tile_area_m2
-        meta['density_total'] = n_total / tile_area_m2 if tile_area_m2 > 0 else np.nan
-        meta['density_ground'] = meta['n_points_ground'] / tile_area_m2 if tile_area_m2 > 0 else np.nan
+        _fill_class_meta(meta, class_count_dict, n_total, tile_area_m2, all_classes, ground_class)
 
         z = np.asarray(las.z)
         meta['z_min'] = float(z.min())
@@ -161,15 +225,98 @@ def get_metadata(
 
     return meta
 
-def get_laz_classification_counts(path_to_file, all_classes=range(0, 20)):
+def get_metadata_chunked(
+    path_to_laz,
+    tile_area_m2,
+    all_classes=range(0,20),
+    ground_class=2,
+    chunk_size=1_000_000
+):
+    """
+    Single-pass, bounded-memory equivalent of get_metadata().
+
+    Iterates over the tile with laspy's chunk iterator, so at most *chunk_size*
+    points are decompressed at once. Class counts and only-return counts are
+    summed, and min/max/mean/std are accumulated with a streaming (Welford)
+    update. Returns a dict with exactly the same keys, in the same order, as
+    get_metadata().
+    """
+    class_counts = Counter()
+    z_stats = _RunningStats()
+    z_ground_stats = _RunningStats()
+    inten_stats = _RunningStats()
+    scan_stats = _RunningStats()
+    gps_stats = _RunningStats()
+    has_inten = has_scan = has_gps = has_returns = True
+    n_only_return = 0
+    n_total = 0
+
+    with laspy.open(path_to_laz) as lfile:
+        for chunk in lfile.chunk_iterator(chunk_size):
+            classifications = np.asarray(chunk.classification)
+            n_total += len(classifications)
+
+            unique_classes, counts = np.unique(classifications, return_counts=True)
+            class_counts.update(dict(zip(unique_classes.tolist(), counts.tolist())))
+
+            z = np.asarray(chunk.z)
+            z_stats.update(z)
+            z_ground_stats.update(z[classifications == ground_class])
+
+            if has_inten:
+                inten = getattr(chunk, "intensity", None)
+                if inten is None:
+                    has_inten = False
+                else:
+                    inten_stats.update(inten)
+
+            if has_returns:
+                try:
+                    return_number = np.asarray(chunk.return_number)
+                    num_returns = np.asarray(chunk.number_of_returns)
+                    n_only_return += int((return_number == num_returns).sum())
+                except Exception:
+                    has_returns = False
+
+            if has_scan:
+                scan = getattr(chunk, 'scan_angle', None)
+                if scan is None:
+                    has_scan = False
+                else:
+                    scan_stats.update(scan)
+
+            if has_gps:
+                gps = getattr(chunk, 'gps_time', None)
+                if gps is None:
+                    has_gps = False
+                else:
+                    gps_stats.update(gps)
+
+    meta = {}
+    _fill_class_meta(meta, class_counts, n_total, tile_area_m2, all_classes, ground_class)
+    _fill_stats(meta, 'z', z_stats)
+    _fill_stats(meta, 'z_ground', z_ground_stats)
+    _fill_stats(meta, 'intensity', inten_stats if has_inten else None)
+    if has_returns:
+        meta['only_return_pct'] = n_only_return / n_total if n_total else 0
+    else:
+        meta['only_return_pct'] = np.nan
+    _fill_stats(meta, 'scan_angle', scan_stats if has_scan else None)
+    _fill_stats(meta, 'gps_time', gps_stats if has_gps else None, fields=('min', 'max'))
+    return meta
+
+def get_laz_classification_counts(path_to_file, all_classes=range(0, 20), chunk_size=None, cache=None):
     """
     Efficiently reads a LAS/LAZ file and returns the counts of point classifications,
     by using the optimized get_metadata() function.
     :param path_to_file: Path to the LAS file.
     :param all_classes: range or list of classification codes to include
+    :param chunk_size: if set, stream the file in chunks of this many points
+    :param cache: optional src.metadata_cache.MetadataCache to read through
     :return: Counter object with classification counts, and total number of points.
     """
-    meta = get_metadata(path_to_file, tile_area_m2=1.0, all_classes=all_classes)
+    _get_metadata = cache.get_metadata if cache is not None else get_metadata
+    meta = _get_metadata(path_to_file, tile_area_m2=1.0, all_classes=all_classes, chunk_size=chunk_size)
     counts = Counter({
         cls: meta.get(f'class_{cls}_count', 0) for cls in all_classes
     })
@@ -216,11 +363,6 @@ def print_laz_classification_counts(counts, total):
     print('-' * len(header))
     print(f"{'TOTAL':<10} {total:>10} {100:9.2f}%")
 
-import os
-import json
-from typing import Any
-import pdal
-
 def laz_to_dtm(
     config: Any,
     filename_laz: str,
@@ -276,52 +418,23 @@ def laz_to_dtm(
     if not os.path.isfile(pipeline_template_path):
         raise FileNotFoundError(f"PDAL pipeline template not found: {pipeline_template_path}")
 
-    # 2. Read pipeline template as string
-    try:
-        with open(pipeline_template_path, 'r', encoding='utf-8') as f:
-            pipeline_template = f.read()
-        if verbose >= 2:
-            print("[laz_to_dtm] Read pipeline template (may not be valid JSON yet!):")
-            print(pipeline_template)
-    except Exception as e:
-        raise RuntimeError(f"Error reading pipeline template: {e}")
+    # 2. Parse and validate the template (cached per process)
+    template = load_pipeline_template(pipeline_template_path)
+    if verbose >= 2:
+        print(f"[laz_to_dtm] Loaded {template!r}")
 
     # 3. Substitute in the variable placeholders
-    try:
-        pipeline_filled = pipeline_template.format(
-            in_laz=laz_full_path,
-            out_tif=dtm_path
-        )
-        if verbose >= 2:
-            print("[laz_to_dtm] Pipeline after .format() (should be valid JSON):")
-            print(pipeline_filled)
-    except KeyError as e:
-        raise ValueError(f"Missing template variable in pipeline: {e}")
-    except Exception as e:
-        raise ValueError(f"Error formatting pipeline template: {e}")
-
-    # 4. Load JSON
-    try:
-        pipeline_dict = json.loads(pipeline_filled)
-        if verbose >= 2:
-            print("[laz_to_dtm] Parsed pipeline JSON (Python dict):")
-            print(json.dumps(pipeline_dict, indent=2))
-    except Exception as e:
-        raise ValueError(f"Formatted pipeline is not valid JSON: {e}")
-
-    # 5. Get the actual pipeline steps (list)
-    if isinstance(pipeline_dict, dict) and "pipeline" in pipeline_dict:
-        pdal_pipeline = pipeline_dict["pipeline"]
-    elif isinstance(pipeline_dict, list):
-        pdal_pipeline = pipeline_dict
-    else:
-        raise ValueError("Pipeline template must be a list or a dict with a 'pipeline' key.")
+    pipeline_dict = template.fill(in_laz=laz_full_path, out_tif=dtm_path)
+    pdal_pipeline = pipeline_dict["pipeline"]
+    if verbose >= 2:
+        print("[laz_to_dtm] Filled pipeline JSON:")
+        print(json.dumps(pipeline_dict, indent=2))
 
-    # 6. Report output path if verbose
+    # Report output path if verbose
     if verbose >= 1:
         print(f"[laz_to_dtm] Full path to generated DTM (tif): {dtm_path}")
 
-    # 7. Construct and execute PDAL pipeline
+    # 4. Construct and execute PDAL pipeline
     try:
         pipeline_json_str = json.dumps(pdal_pipeline)
         pl = pdal.Pipeline(pipeline_json_str)
@@ -333,7 +446,7 @@ def laz_to_dtm(
     except Exception as e:
         raise RuntimeError(f"Error running PDAL pipeline: {e}")
 
-    # 8. Confirm output file exists
+    # 5. Confirm output file exists
     if not os.path.isfile(dtm_path):
         raise RuntimeError(f"PDAL pipeline ran without error, but output DTM file was not created: {dtm_path}")
 
@@ -344,7 +457,9 @@ def laz_to_dtm(
 
 def print_metadata_table(
     laz_path: str,
-    tile_area_m2: float
+    tile_area_m2: float,
+    chunk_size: Optional[int] = None,
+    cache: Optional[Any] = None
 ) -> None:
     """
     Fetches and prints LiDAR metadata in a formatted table.
@@ -352,10 +467,14 @@ def print_metadata_table(
     Args:
         laz_path (str): Path to .laz file.
         tile_area_m2 (float): Tile area in square meters.
-        lidar: An object with a get_metadata method.
+        chunk_size (int, optional): Stream the tile in chunks of this many points
+            (bounded memory) instead of reading it whole.
+        cache (MetadataCache, optional): Read stats through this
+            src.metadata_cache.MetadataCache instead of recomputing them.
     """
     print("Printing metadata...\n")
-    metadata: Dict[str, Any] = get_metadata(laz_path, tile_area_m2)
+    _get_metadata = cache.get_metadata if cache is not None else get_metadata
+    metadata: Dict[str, Any] = _get_metadata(laz_path, tile_area_m2, chunk_size=chunk_size)
     
     n_points_total: int = metadata['n_points_total']
     tile_area_m2: float = metadata['tile_area_m2']
@@ -375,11 +494,157 @@ def print_metadata_table(
     print(f"{'Point density:':<38} {point_density:>19.2f} pt/m\u00b2")
     print(f"{'Classification 2 point density:':<38} {class_2_density:>19.2f} pt/m\u00b2")
 
+DTM_CACHE_MODES = ("manifest", "adopt", "exists", "none")
+COG_COMPRESSIONS = cog.COG_COMPRESSIONS
+
+def pdal_version() -> str:
+    """Version string for python-pdal and the underlying libpdal (part of the DTM cache key)."""
+    info = getattr(pdal, "info", None)
+    lib_version = getattr(info, "version", None) or "unknown"
+    return f"python-pdal {getattr(pdal, '__version__', 'unknown')}; libpdal {lib_version}"
+
+def dtm_manifest_entry(pdal_pipe, input_path, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Build the cache key for one DTM output: a SHA-256 over the canonical filled
+    pipeline JSON, the input file's size and mtime, and the PDAL version.
+    *options* holds execution settings that change the output (e.g. sub-tiling).
+    """
+    st = os.stat(input_path)
+    entry = {
+        "pipeline_sha256": hashlib.sha256(
+            json.dumps(pdal_pipe, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        ).hexdigest(),
+        "input_path": os.path.abspath(input_path),
+        "input_size": st.st_size,
+        "input_mtime_ns": st.st_mtime_ns,
+        "pdal_version": pdal_version(),
+    }
+    if options:
+        entry["options"] = options
+    entry["key"] = hashlib.sha256(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()
+    return entry
+
+def _manifest_path(out_tif_path) -> str:
+    return f"{out_tif_path}.manifest.json"
+
+def is_dtm_cached(out_tif_path, entry) -> bool:
+    """True if *out_tif_path* exists and its sidecar manifest has the same key as *entry*."""
+    if not os.path.isfile(out_tif_path):
+        return False
+    try:
+        with open(_manifest_path(out_tif_path), "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return stored.get("key") == entry["key"]
+
+def write_dtm_manifest(out_tif_path, entry) -> None:
+    """Atomically write the sidecar manifest for a freshly produced DTM."""
+    manifest = dict(entry, output_size=os.path.getsize(out_tif_path), created=time.time())
+    tmp_path = f"{_manifest_path(out_tif_path)}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, _manifest_path(out_tif_path))
+
+def _reader_point_count(pipe) -> Optional[int]:
+    """Points read by the reader stage(s), from executed pipeline metadata (None if unavailable)."""
+    try:
+        meta = pipe.metadata
+        if isinstance(meta, str):
+            meta = json.loads(meta)
+        meta = meta.get("metadata", meta)
+        total = 0
+        for key, value in meta.items():
+            if not key.startswith("readers."):
+                continue
+            for entry in (value if isinstance(value, list) else [value]):
+                total += int(entry.get("count", 0))
+        return total
+    except Exception:
+        return None
+
+# Writer option that assigns an SRS, for re-attaching the reader's SRS in profiled runs
+_WRITER_SRS_OPTION = {"writers.gdal": "override_srs", "writers.las": "a_srs", "writers.copc": "a_srs"}
+
+def _pipeline_srs(pipe) -> Optional[str]:
+    """WKT of the SRS of an executed pipeline's points (None if it has none)."""
+    srs = getattr(pipe, "srswkt2", None)
+    if srs:
+        return srs
+    try:
+        meta = pipe.metadata
+        if isinstance(meta, str):
+            meta = json.loads(meta)
+        meta = meta.get("metadata", meta)
+        for key, value in meta.items():
+            if key.startswith("readers."):
+                entry = value[0] if isinstance(value, list) else value
+                return entry.get("comp_spatialreference") or entry.get("spatialreference") or None
+    except Exception:
+        pass
+    return None
+
+def execute_pipeline(pdal_pipe, profile_stages: bool = False):
+    """
+    Execute a list of PDAL stages.
+
+    With profile_stages=True each stage is run as its own pdal.Pipeline, fed the
+    previous stage's arrays, so wall time, points in/out and peak RSS can be
+    measured per stage. This keeps the point view in Python between stages, so
+    use it for profiling rather than production runs. Arrays passed between
+    stages lose the spatial reference, so the reader's SRS is set explicitly on
+    writers.gdal/las/copc stages (unless the template already sets one).
+
+    Returns:
+        tuple: (points_out, points_in, stage_records)
+    """
+    if not profile_stages:
+        pipe = pdal.Pipeline(json.dumps(pdal_pipe))
+        count = pipe.execute()
+        return count, _reader_point_count(pipe), []
+
+    arrays = None
+    srs = None
+    stages = []
+    count = 0
+    for i, stage in enumerate(pdal_pipe):
+        # Numpy arrays carry no SRS, so give the writers the one the reader found
+        srs_option = _WRITER_SRS_OPTION.get(stage.get("type")) if isinstance(stage, dict) else None
+        if srs and srs_option and srs_option not in stage:
+            stage = dict(stage, **{srs_option: srs})
+        spec = json.dumps([stage])
+        points_in = sum(len(a) for a in arrays) if arrays else 0
+        pipe = pdal.Pipeline(spec, arrays=arrays) if arrays else pdal.Pipeline(spec)
+        t0 = time.perf_counter()
+        count = pipe.execute()
+        elapsed = time.perf_counter() - t0
+        arrays = pipe.arrays
+        if i == 0:
+            srs = _pipeline_srs(pipe)
+        stages.append({
+            "index": i,
+            "type": stage.get("type", "readers (inferred)") if isinstance(stage, dict) else "readers (inferred)",
+            "elapsed_s": elapsed,
+            "points_in": points_in,
+            "points_out": sum(len(a) for a in arrays),
+            "peak_rss_mb": run_report.peak_rss_mb(),
+        })
+    return count, (stages[0]["points_out"] if stages else None), stages
+
 def run_pdal_pipeline(
     input_path: Union[str, Path],
     output_dir: Union[str, Path],
-    template_path: Union[str, Path],
-    verbose: int = 0
+    template_path: Union[str, Path, PipelineTemplate],
+    verbose: int = 0,
+    cache_mode: str = "manifest",
+    report_path: Optional[Union[str, Path]] = None,
+    profile_stages: bool = False,
+    chunk_size: Optional[float] = None,
+    chunk_buffer: float = subtile.DEFAULT_CHUNK_BUFFER,
+    chunk_workers: int = 1,
+    stage_cache_dir: Optional[Union[str, Path]] = None,
+    cog_compression: Optional[str] = None,
+    stage_cache_max_gb: Optional[float] = None
 ) -> str:
     """
     Run a PDAL pipeline from a template using a .laz input file.
@@ -390,8 +655,38 @@ def run_pdal_pipeline(
     Args:
         input_path (str): Path to input .laz file.
         output_dir (str): Output directory for the .tif.
-        template_path (str): Path to template JSON.
-        verbose (int): Verbosity.
+        template_path (str | PipelineTemplate): Path to template JSON, or an
+            already-parsed PipelineTemplate (e.g. shared across a worker pool).
+        verbose (int): Verbosity. >= 3 also prints the full filled pipeline.
+        cache_mode (str): How to decide whether an existing output can be reused:
+            "manifest" - reuse only if the sidecar manifest (<out>.tif.manifest.json)
+                         matches the filled pipeline hash, input size/mtime and PDAL version.
+            "adopt"    - as "manifest", but an output without any manifest that is newer
+                         than its input (written before manifests existed) is taken to
+                         match the current template: a manifest is written for it and it
+                         is reused. A one-off for migrating old outputs; it can't tell
+                         which template produced them.
+            "exists"   - reuse whenever the output .tif exists (legacy behaviour)
+            "none"     - always recompute
+        report_path (str, optional): Append one JSON record for this tile (status,
+            elapsed time, points in/out, peak RSS, and per-stage timings when
+            profiled) to this JSONL run report. See src/run_report.py.
+        profile_stages (bool): Execute stage by stage to time each stage
+            (see execute_pipeline). Ignored when chunk_size is set. Profiled
+            outputs get their own manifest key, so normal runs don't reuse them.
+        chunk_size (float, optional): Process the tile in buffered sub-tiles of this
+            edge length (CRS units) and mosaic the results, bounding memory on very
+            large tiles (see src/subtile.py). None runs the whole tile at once.
+        chunk_buffer (float): Overlap around each sub-tile; should exceed the
+            largest filter window in the template.
+        chunk_workers (int): Sub-tiles to run in parallel.
+        stage_cache_dir (str, optional): Cache the output of the pipeline's
+            readers.las + filters.outlier prefix here and start from it on later
+            runs/templates (see src/stage_cache.py). Not used with chunk_size.
+        cog_compression (str, optional): "deflate" or "zstd" to rewrite the output
+            as a tiled Cloud-Optimized GeoTIFF with overviews (see src/cog.py).
+        stage_cache_max_gb (float, optional): Size limit of stage_cache_dir in GiB;
+            least recently used files are removed beyond it. None for no limit.
 
     Returns:
         str: The output .tif path.
@@ -404,15 +699,14 @@ def run_pdal_pipeline(
     # Convert all input paths to string for downstream use
     input_path = str(input_path)
     output_dir = str(output_dir)
-    template_path = str(template_path)
+    if not isinstance(template_path, PipelineTemplate):
+        template_path = str(template_path)
     
     # --- TYPE CHECKING ---
     if not isinstance(input_path, str):
         raise TypeError(f"input_path must be a string, got {type(input_path)}")
     if not isinstance(output_dir, str):
         raise TypeError(f"output_dir must be a string, got {type(output_dir)}")
-    if not isinstance(template_path, str):
-        raise TypeError(f"template_path must be a string, got {type(template_path)}")
     if not isinstance(verbose, int):
         raise TypeError(f"verbose must be int, got {type(verbose)}")
     # --- END TYPE CHECKING ---
@@ -420,53 +714,139 @@ def run_pdal_pipeline(
     pt("Checking input and template files")
     if not os.path.isfile(input_path):
         raise FileNotFoundError(f"Input .laz file not found: {input_path}")
-    if not os.path.isfile(template_path):
-        raise FileNotFoundError(f"Pipeline template not found: {template_path}")
+    if isinstance(template_path, PipelineTemplate):
+        template = template_path
+    else:
+        if not os.path.isfile(template_path):
+            raise FileNotFoundError(f"Pipeline template not found: {template_path}")
+        template = load_pipeline_template(template_path)
 
     # Determine output .tif filename
     input_name = os.path.splitext(os.path.basename(input_path))[0]
-    template_name = os.path.splitext(os.path.basename(template_path))[0]
+    template_name = template.name
     out_filename = f"{input_name}_{template_name}.tif"
     if not os.path.isdir(output_dir):
         os.makedirs(output_dir, exist_ok=True)
     out_tif_path = os.path.join(output_dir, out_filename)
 
-    # SKIP IF ALREADY DONE
-    if os.path.isfile(out_tif_path):
-        if verbose:
-            print(f"Output already exists for {input_path}: {out_tif_path} (skipping)")
-        return out_tif_path
-
-    pt("Reading and substituting pipeline template")
-    with open(template_path, 'r', encoding='utf-8') as f:
-        tpl = f.read()
-    try:
-        pipeline_filled = tpl.format(in_laz=input_path, out_tif=out_tif_path)
-    except Exception as e:
-        raise ValueError(f"Error formatting template: {e}")
+    pdal_pipe = template.fill(in_laz=input_path, out_tif=out_tif_path)["pipeline"]
+    # PDAL writes to a temporary name that is renamed on success, so an interrupted
+    # run never leaves a partial .tif under the final name
+    tmp_tif_path = f"{out_tif_path}.tmp.{os.getpid()}.tif"
+
+    record = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "input": input_path,
+        "output": out_tif_path,
+        "template": template.name,
+        "status": "cached",
+        "elapsed_s": 0.0,
+    }
 
-    pt(f"Filled pipeline definition:\n{pipeline_filled}")
+    # SKIP IF ALREADY DONE
+    manifest = None
+    if cache_mode in ("manifest", "adopt"):
+        options = {}
+        if chunk_size:
+            options.update(chunk_size=chunk_size, chunk_buffer=chunk_buffer)
+        if cog_compression:
+            options.update(cog_compression=cog_compression)
+        if profile_stages and not chunk_size:
+            # Stage-by-stage execution is a different code path; keep its outputs apart
+            options.update(profile_stages=True)
+        manifest = dtm_manifest_entry(pdal_pipe, input_path, options or None)
+        if is_dtm_cached(out_tif_path, manifest):
+            if verbose:
+                print(f"Up-to-date output for {input_path}: {out_tif_path} (manifest hit, skipping)")
+            if report_path:
+                run_report.append_record(report_path, record)
+            return out_tif_path
+        if os.path.isfile(out_tif_path) and not os.path.exists(_manifest_path(out_tif_path)):
+            if cache_mode == "adopt" and os.path.getmtime(out_tif_path) >= os.path.getmtime(input_path):
+                print(f"WARNING: Adopting existing output without a manifest for {input_path}: {out_tif_path}")
+                write_dtm_manifest(out_tif_path, dict(manifest, adopted=True))
+                if report_path:
+                    run_report.append_record(report_path, record)
+                return out_tif_path
+            print(
+                f"WARNING: Existing output for {input_path} has no manifest, recomputing: {out_tif_path}. "
+                f"Run once with cache_mode='adopt' (--dtm-cache adopt) to keep DTMs made before manifests existed."
+            )
+        if verbose and os.path.isfile(out_tif_path):
+            print(f"Output for {input_path} is stale, recomputing: {out_tif_path}")
+    elif cache_mode == "exists":
+        if os.path.isfile(out_tif_path):
+            if verbose:
+                print(f"Output already exists for {input_path}: {out_tif_path} (skipping)")
+            if report_path:
+                run_report.append_record(report_path, record)
+            return out_tif_path
+    elif cache_mode != "none":
+        raise ValueError(f"cache_mode must be one of {DTM_CACHE_MODES}, got {cache_mode!r}")
+
+    pt(f"Pipeline '{template.name}': {' -> '.join(str(t) for t in template.stage_types)}")
+    if verbose >= 3:
+        print(json.dumps(pdal_pipe, indent=2))
+
+    # Drop any old manifest and output first so a crash mid-write can never look like a
+    # valid cache hit, nor leave a stale output for cache_mode='adopt' to pick up
+    for stale in (_manifest_path(out_tif_path), out_tif_path):
+        if os.path.exists(stale):
+            os.remove(stale)
+    # ... and temporary outputs left behind by interrupted runs
+    for stale in glob.glob(f"{glob.escape(out_tif_path)}.tmp.*"):
+        os.remove(stale)
 
+    pt("Running PDAL pipeline")
+    t0 = time.perf_counter()
     try:
-        pipeline_obj = json.loads(pipeline_filled)
-        pt("Pipeline is valid JSON after substitution")
+        if chunk_size:
+            count, points_in, stages = subtile.execute_chunked(
+                template, input_path, tmp_tif_path, chunk_size, chunk_buffer,
+                workers=chunk_workers, verbose=verbose
+            )
+        else:
+            run_stages = template.fill(in_laz=input_path, out_tif=tmp_tif_path)["pipeline"]
+            if stage_cache_dir:
+                run_stages, hit = stage_cache.apply_stage_cache(
+                    run_stages, input_path, pdal_version(), stage_cache_dir, verbose,
+                    int(stage_cache_max_gb * 1024**3) if stage_cache_max_gb is not None else None
+                )
+                if hit is not None:
+                    record["stage_cache"] = "hit" if hit else "miss"
+            count, points_in, stages = execute_pipeline(run_stages, profile_stages=profile_stages)
+        if not os.path.isfile(tmp_tif_path):
+            raise RuntimeError(f"Expected output file not created: {out_tif_path}")
+        if cog_compression:
+            cog.to_cog(tmp_tif_path, compression=cog_compression)
+        os.replace(tmp_tif_path, out_tif_path)
     except Exception as e:
-        raise ValueError(f"Pipeline is not valid JSON after substitution: {e}")
-
-    if isinstance(pipeline_obj, dict) and "pipeline" in pipeline_obj:
-        pdal_pipe = pipeline_obj["pipeline"]
-    elif isinstance(pipeline_obj, list):
-        pdal_pipe = pipeline_obj
-    else:
-        raise ValueError("Pipeline template must be a list or a dict with a 'pipeline' key.")
-
-    pt("Running PDAL pipeline")
-    pipe = pdal.Pipeline(json.dumps(pdal_pipe))
-    count = pipe.execute()
+        if os.path.exists(tmp_tif_path):
+            os.remove(tmp_tif_path)
+        if report_path:
+            record.update(
+                status="error", elapsed_s=time.perf_counter() - t0,
+                peak_rss_mb=run_report.peak_rss_mb(), error=f"{type(e).__name__}: {e}"
+            )
+            run_report.append_record(report_path, record)
+        raise
+    elapsed = time.perf_counter() - t0
     if verbose:
         print(f"Processed {count} points ({input_path})")
+        for stage in stages:
+            print(
+                f"  [{stage['index']}] {stage['type']:<20} {stage['elapsed_s']:8.2f}s  "
+                f"{stage['points_in']:>12,} -> {stage['points_out']:>12,} pts"
+            )
+
+    if report_path:
+        record.update(
+            status="ok", elapsed_s=elapsed, points_in=points_in, points_out=count,
+            peak_rss_mb=run_report.peak_rss_mb(), pdal_version=pdal_version(), stages=stages
+        )
+        run_report.append_record(report_path, record)
 
-    if not os.path.isfile(out_tif_path):
-        raise RuntimeError(f"Expected output file not created: {out_tif_path}")
+    if manifest is not None:
+        write_dtm_manifest(out_tif_path, manifest)
 
     return out_tif_path
\ No newline at end of file
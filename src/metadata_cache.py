@@ -0,0 +1,230 @@
+# src/metadata_cache.py
+"""
+Persistent per-tile metadata cache.
+
+get_metadata() decompresses a whole LAZ tile, so results are stored in a small
+SQLite database (default: data/metadata/laz_metadata_cache.sqlite) keyed by the
+file's absolute path, size and mtime, and optionally a SHA-256 of its contents.
+A lookup whose file identity still matches returns the stored stats without
+touching the point data; anything else is recomputed and written back.
+
+Warm the cache for a whole directory in parallel with:
+
+    python -m src.metadata_cache data/raw/laz --workers 8
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+import numpy as np
+
+import src.lidar as lidar
+
+DEFAULT_CACHE_PATH = os.path.join("data", "metadata", "laz_metadata_cache.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS laz_metadata (
+    path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    meta TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (path, params)
+)
+"""
+
+def file_sha256(path, block_size=8 * 1024 * 1024):
+    """Stream a file through SHA-256 and return the hex digest."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _json_default(o):
+    # numpy scalars (e.g. np.float64 from np.mean) are not JSON serialisable
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def _apply_area(meta, tile_area_m2):
+    """Fill the tile-area dependent fields; everything else is independent of area."""
+    meta['tile_area_m2'] = tile_area_m2
+    meta['density_total'] = meta['n_points_total'] / tile_area_m2 if tile_area_m2 > 0 else np.nan
+    meta['density_ground'] = meta['n_points_ground'] / tile_area_m2 if tile_area_m2 > 0 else np.nan
+    return meta
+
+class MetadataCache:
+    """
+    SQLite-backed cache for lidar.get_metadata().
+
+    Only the database path is held on the instance (connections are opened per
+    call), so a MetadataCache can be passed to worker processes.
+
+    Args:
+        db_path (str): Path to the SQLite file (created if missing).
+        use_hash (bool): Also store a SHA-256 of each file. A file whose mtime
+            changed but whose size and hash are unchanged (e.g. re-downloaded or
+            copied) is then still a cache hit.
+    """
+
+    def __init__(self, db_path: Union[str, Path] = DEFAULT_CACHE_PATH, use_hash: bool = False):
+        self.db_path = str(db_path)
+        self.use_hash = use_hash
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as con:
+            con.execute(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    @staticmethod
+    def _params(all_classes, ground_class):
+        return json.dumps({"all_classes": list(all_classes), "ground_class": ground_class})
+
+    def lookup(self, path, all_classes=range(0, 20), ground_class=2) -> Optional[Dict[str, Any]]:
+        """Return the stored (area-independent) metadata if the file is unchanged, else None."""
+        path = os.path.abspath(str(path))
+        st = os.stat(path)
+        params = self._params(all_classes, ground_class)
+        with self._connect() as con:
+            row = con.execute(
+                "SELECT size, mtime_ns, sha256, meta FROM laz_metadata WHERE path = ? AND params = ?",
+                (path, params)
+            ).fetchone()
+            if row is None:
+                return None
+            size, mtime_ns, sha256, meta = row
+            if size != st.st_size:
+                return None
+            if mtime_ns != st.st_mtime_ns:
+                if not (self.use_hash and sha256 and file_sha256(path) == sha256):
+                    return None
+                con.execute(
+                    "UPDATE laz_metadata SET mtime_ns = ? WHERE path = ? AND params = ?",
+                    (st.st_mtime_ns, path, params)
+                )
+        return json.loads(meta)
+
+    def store(self, path, meta, all_classes=range(0, 20), ground_class=2, st=None, sha256=None):
+        """Insert or replace the metadata for *path*. *st* is the os.stat taken before computing."""
+        path = os.path.abspath(str(path))
+        st = st or os.stat(path)
+        if self.use_hash and sha256 is None:
+            sha256 = file_sha256(path)
+        with self._connect() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO laz_metadata (path, params, size, mtime_ns, sha256, meta, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    path, self._params(all_classes, ground_class), st.st_size, st.st_mtime_ns,
+                    sha256, json.dumps(meta, default=_json_default), time.time()
+                )
+            )
+
+    def get_metadata(
+        self,
+        path,
+        tile_area_m2,
+        all_classes=range(0, 20),
+        ground_class=2,
+        chunk_size=None
+    ) -> Dict[str, Any]:
+        """
+        Cached drop-in for lidar.get_metadata(); same arguments, same returned keys.
+        """
+        meta = self.lookup(path, all_classes, ground_class)
+        if meta is None:
+            st = os.stat(path)
+            meta = lidar.get_metadata(
+                path, 1.0, all_classes=all_classes, ground_class=ground_class, chunk_size=chunk_size
+            )
+            self.store(path, meta, all_classes, ground_class, st=st)
+        return _apply_area(meta, tile_area_m2)
+
+    def warm(
+        self,
+        paths: Iterable[Union[str, Path]],
+        workers: int = 1,
+        all_classes=range(0, 20),
+        ground_class=2,
+        chunk_size=None,
+        verbose: bool = True
+    ):
+        """
+        Compute and store metadata for every path that is missing or stale.
+        Tiles are decoded in a process pool; all writes happen in this process.
+
+        Returns:
+            tuple: (n_cached, n_computed, n_failed)
+        """
+        paths = [str(p) for p in paths]
+        todo = [p for p in paths if self.lookup(p, all_classes, ground_class) is None]
+        n_cached = len(paths) - len(todo)
+        n_computed = n_failed = 0
+        if verbose:
+            print(f"[metadata_cache] {len(todo)} file(s) to compute, {n_cached} already cached")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_compute, p, all_classes, ground_class, chunk_size, self.use_hash): p
+                for p in todo
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                p = futures[future]
+                try:
+                    meta, st, sha256 = future.result()
+                    self.store(p, meta, all_classes, ground_class, st=st, sha256=sha256)
+                    n_computed += 1
+                    if verbose:
+                        print(f"[metadata_cache] [{i}/{len(todo)}] {os.path.basename(p)}: {meta['n_points_total']:,} points")
+                except Exception as e:
+                    n_failed += 1
+                    print(f"[metadata_cache] [{i}/{len(todo)}] FAILED {p}: {e}")
+        return n_cached, n_computed, n_failed
+
+def _compute(path, all_classes, ground_class, chunk_size, use_hash):
+    """Worker: stat, hash (optional) and compute metadata for one file."""
+    st = os.stat(path)
+    sha256 = file_sha256(path) if use_hash else None
+    meta = lidar.get_metadata(
+        path, 1.0, all_classes=list(all_classes), ground_class=ground_class, chunk_size=chunk_size
+    )
+    return meta, st, sha256
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the per-tile LAZ metadata cache for a directory.")
+    parser.add_argument("laz_dir", type=str, help="Directory containing .laz files")
+    parser.add_argument("--db", default=DEFAULT_CACHE_PATH, help=f"SQLite cache path (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--pattern", default="*.laz", help="Glob pattern for input files (default: '*.laz')")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Stream tiles in chunks of N points (bounded memory)")
+    parser.add_argument("--hash", action="store_true", help="Also key entries on a SHA-256 of the file contents")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.laz_dir):
+        print(f"ERROR: LAZ directory not found at: {args.laz_dir}")
+        sys.exit(1)
+
+    paths = sorted(str(p) for p in Path(args.laz_dir).glob(args.pattern))
+    if not paths:
+        print(f"No files matching '{args.pattern}' in {args.laz_dir}")
+        return
+
+    cache = MetadataCache(args.db, use_hash=args.hash)
+    t0 = time.time()
+    n_cached, n_computed, n_failed = cache.warm(paths, workers=args.workers, chunk_size=args.chunk_size)
+    print(f"[metadata_cache] Done in {time.time() - t0:.1f}s: {n_cached} cached, {n_computed} computed, {n_failed} failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# src/overlap_clusters.py
+"""
+Group LAZ tiles into connected overlap clusters.
+
+The CMS Brazil survey flew many sites more than once, so some tiles overlap
+(the RIB* tiles being the case lidar_enhance was written for). Selecting inputs
+by filename prefix merges tiles that do not overlap at all; here tiles are
+grouped by their actual header bounds instead:
+
+    1. header bounds for every file are read in parallel (src/header_scan.py),
+    2. tiles are bucketed in a uniform grid (a simple spatial index) so only
+       tiles sharing a grid cell are compared,
+    3. overlapping pairs are joined with union-find into connected clusters.
+
+Tiles in different CRSs (e.g. UTM zones) are never compared.
+
+    python -m src.overlap_clusters data/raw/laz --workers 32 --output data/metadata/overlap_clusters.csv
+
+With --enhance-dir each cluster of two or more tiles is then run through
+main/lidar_enhance.py (and, with --dtm-config, main/main_enhanced.py) as its own
+job, several clusters at a time with --cluster-workers.
+"""
+
+import os
+import sys
+import math
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from src.header_scan import scan_headers
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+def _overlap_area(a, b):
+    dx = min(a[1], b[1]) - max(a[0], b[0])
+    dy = min(a[3], b[3]) - max(a[2], b[2])
+    return dx * dy if dx > 0 and dy > 0 else 0.0
+
+def find_overlap_clusters(headers: pd.DataFrame, min_overlap_m2: float = 0.0, cell_size: Optional[float] = None) -> pd.DataFrame:
+    """
+    Assign every tile to a connected overlap cluster.
+
+    Args:
+        headers (pd.DataFrame): Output of header_scan.scan_headers() (needs filename,
+            min_x, max_x, min_y, max_y, crs_epsg). Rows with an error are dropped.
+        min_overlap_m2 (float): Two tiles are connected if their bounding boxes
+            intersect in more than this area (default 0: any positive overlap;
+            tiles that only touch along an edge are not connected).
+        cell_size (float, optional): Grid cell size of the spatial index
+            (default: the median tile extent).
+
+    Returns:
+        pd.DataFrame: filename, cluster_id, cluster_size and the tile bounds,
+        sorted by cluster (largest cluster first) then filename.
+    """
+    df = headers[headers["error"].isna()].reset_index(drop=True)
+    bounds = df[["min_x", "max_x", "min_y", "max_y"]].to_numpy(dtype=float)
+    crs = df["crs_epsg"].astype("object").where(df["crs_epsg"].notna(), None).tolist()
+    if cell_size is None:
+        extents = [max(b[1] - b[0], b[3] - b[2]) for b in bounds]
+        cell_size = float(pd.Series(extents).median()) if extents else 1.0
+    cell_size = max(cell_size, 1e-6)
+
+    grid: Dict[tuple, List[int]] = defaultdict(list)
+    for i, (x0, x1, y0, y1) in enumerate(bounds):
+        for gx in range(math.floor(x0 / cell_size), math.floor(x1 / cell_size) + 1):
+            for gy in range(math.floor(y0 / cell_size), math.floor(y1 / cell_size) + 1):
+                grid[(crs[i], gx, gy)].append(i)
+
+    uf = _UnionFind(len(df))
+    seen = set()
+    for members in grid.values():
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                i, j = members[a], members[b]
+                if (i, j) in seen:
+                    continue
+                seen.add((i, j))
+                if _overlap_area(bounds[i], bounds[j]) > min_overlap_m2:
+                    uf.union(i, j)
+
+    roots = [uf.find(i) for i in range(len(df))]
+    sizes = pd.Series(roots).value_counts()
+    # Number clusters largest first so cluster 0 is the biggest overlap group
+    order = sorted(sizes.index, key=lambda r: (-sizes[r], df.at[r, "filename"]))
+    cluster_ids = {root: n for n, root in enumerate(order)}
+
+    out = df[["filename", "min_x", "max_x", "min_y", "max_y", "crs_epsg"]].copy()
+    out.insert(1, "cluster_id", [cluster_ids[r] for r in roots])
+    out.insert(2, "cluster_size", [int(sizes[r]) for r in roots])
+    return out.sort_values(["cluster_id", "filename"]).reset_index(drop=True)
+
+def _run(cmd, log_path):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")])))
+    with open(log_path, "w", encoding="utf-8") as log:
+        return subprocess.run(cmd, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+
+def run_cluster(cluster_id, files, laz_dir, enhance_dir, dtm_config=None, workers=1):
+    """
+    Run lidar_enhance on one cluster's tiles into <enhance_dir>/cluster_<id>/ and,
+    if dtm_config is given, main_enhanced on the resulting enhanced files.
+    Logs go to cluster_<id>_enhance.log / cluster_<id>_dtm.log in that directory.
+
+    Returns:
+        tuple: (cluster_id, status, elapsed_s)
+    """
+    t0 = time.time()
+    name = f"cluster_{cluster_id:04d}"
+    # Absolute paths: the child processes run from the repo root
+    out_dir = Path(enhance_dir).resolve() / name
+    out_dir.mkdir(parents=True, exist_ok=True)
+    list_path = out_dir / f"{name}_tiles.txt"
+    list_path.write_text("\n".join(files) + "\n", encoding="utf-8")
+
+    rc = _run(
+        [sys.executable, str(REPO_ROOT / "main" / "lidar_enhance.py"), os.path.abspath(laz_dir), str(out_dir),
+         "--files", str(list_path), "--output-name", f"{name}.laz", "--workers", str(workers)],
+        out_dir / f"{name}_enhance.log"
+    )
+    if rc != 0:
+        return cluster_id, f"enhance failed (exit {rc})", time.time() - t0
+    if dtm_config:
+        rc = _run(
+            [sys.executable, str(REPO_ROOT / "main" / "main_enhanced.py"), os.path.abspath(dtm_config), "--enhanced-dir", str(out_dir)],
+            out_dir / f"{name}_dtm.log"
+        )
+        if rc != 0:
+            return cluster_id, f"dtm failed (exit {rc})", time.time() - t0
+    return cluster_id, "ok", time.time() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description="Group LAZ tiles into connected overlap clusters by header bounds, optionally enhancing each cluster.")
+    parser.add_argument("laz_dir", type=str, help="Directory containing .laz files")
+    parser.add_argument("--pattern", default="*.laz", help="Glob pattern for input files (default: '*.laz')")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent header reads (default: 16)")
+    parser.add_argument("--min-overlap", type=float, default=0.0, help="Minimum bbox overlap in m^2 for two tiles to be connected (default: 0)")
+    parser.add_argument("--output", default=None, help="Write the tile -> cluster table to this CSV")
+    parser.add_argument("--enhance-dir", default=None, help="Run lidar_enhance per cluster (>= 2 tiles) into <enhance-dir>/cluster_<id>/")
+    parser.add_argument("--dtm-config", default=None, help="With --enhance-dir, also run main_enhanced.py with this config on each cluster's output")
+    parser.add_argument("--cluster-workers", type=int, default=1, help="Clusters to process concurrently (default: 1)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.laz_dir):
+        print(f"ERROR: LAZ directory not found at: {args.laz_dir}")
+        sys.exit(1)
+
+    paths = sorted(str(p) for p in Path(args.laz_dir).glob(args.pattern))
+    if not paths:
+        print(f"No files matching '{args.pattern}' in {args.laz_dir}")
+        return
+
+    t0 = time.time()
+    clusters = find_overlap_clusters(scan_headers(paths, workers=args.workers), min_overlap_m2=args.min_overlap)
+    multi = clusters[clusters["cluster_size"] > 1]
+    print(f"[overlap_clusters] {len(clusters)} tiles in {clusters['cluster_id'].nunique()} clusters "
+          f"({multi['cluster_id'].nunique()} with overlaps, {len(multi)} tiles) in {time.time() - t0:.1f}s")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        clusters.to_csv(args.output, index=False)
+        print(f"[overlap_clusters] Wrote: {args.output}")
+    else:
+        for cluster_id, group in multi.groupby("cluster_id"):
+            print(f"  cluster {cluster_id}: {list(group['filename'])}")
+
+    if not args.enhance_dir:
+        return
+
+    # Split the cores between concurrently running clusters
+    workers_per_cluster = max(1, (os.cpu_count() or 1) // max(1, args.cluster_workers))
+    jobs = {cid: list(group["filename"]) for cid, group in multi.groupby("cluster_id")}
+    with ThreadPoolExecutor(max_workers=args.cluster_workers) as executor:
+        futures = [
+            executor.submit(run_cluster, cid, files, args.laz_dir, args.enhance_dir, args.dtm_config, workers_per_cluster)
+            for cid, files in jobs.items()
+        ]
+        for n_done, future in enumerate(as_completed(futures), 1):
+            cid, status, elapsed = future.result()
+            print(f"[overlap_clusters] [{n_done}/{len(jobs)}] cluster {cid} ({len(jobs[cid])} tiles): {status} ({elapsed:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# src/pipeline_template.py
+"""
+Pre-compiled PDAL pipeline templates.
+
+Templates in config/pdal_pipeline_templates/ are str.format templates: JSON
+structure uses doubled braces and variables are single-brace placeholders such
+as {in_laz} and {out_tif}. A PipelineTemplate parses and validates a template
+once (placeholders, JSON, stage types) and then stamps out per-tile pipelines
+by substituting values into the already-parsed stages, so the template file is
+not re-read, re-formatted and re-parsed for every tile.
+
+Instances hold only plain data and are cheap to pickle to worker processes.
+"""
+
+import os
+import re
+import json
+import string
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+DEFAULT_PLACEHOLDERS = ("in_laz", "out_tif")
+
+_STAGE_TYPE_RE = re.compile(r"^(readers|filters|writers)\.[a-z0-9_]+$")
+
+def _sentinel(name):
+    # JSON-safe marker that survives json.loads unchanged
+    return f"@@{name}@@"
+
+def _substitute(obj, mapping):
+    """Recursively replace sentinel markers in every string inside *obj*."""
+    if isinstance(obj, str):
+        for sentinel, value in mapping.items():
+            if sentinel in obj:
+                obj = obj.replace(sentinel, value)
+        return obj
+    if isinstance(obj, list):
+        return [_substitute(v, mapping) for v in obj]
+    if isinstance(obj, dict):
+        return {k: _substitute(v, mapping) for k, v in obj.items()}
+    return obj
+
+def _contains_sentinel(obj, sentinels):
+    if isinstance(obj, str):
+        return any(s in obj for s in sentinels)
+    if isinstance(obj, list):
+        return any(_contains_sentinel(v, sentinels) for v in obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if any(s in k for s in sentinels):
+                raise ValueError(f"Placeholders are only allowed in values, found one in key '{k}'")
+            if _contains_sentinel(v, sentinels):
+                return True
+    return False
+
+class PipelineTemplate:
+    """
+    A parsed, validated PDAL pipeline template.
+
+    Args:
+        text (str): Template text (doubled braces for JSON, {name} placeholders).
+        name (str): Template name, used in output filenames (default: "template").
+        required (tuple): Placeholders that must appear in the template.
+
+    Raises:
+        ValueError: If placeholders are missing/malformed, the template is not
+            valid JSON after substitution, or a stage has an unknown type.
+    """
+
+    def __init__(self, text: str, name: str = "template", required: Tuple[str, ...] = DEFAULT_PLACEHOLDERS):
+        self.text = text
+        self.name = name
+
+        try:
+            fields = [f for _, f, _, _ in string.Formatter().parse(text) if f is not None]
+        except ValueError as e:
+            raise ValueError(f"Malformed template '{name}': {e}")
+        for f in fields:
+            if not f.isidentifier():
+                raise ValueError(f"Template '{name}' has an invalid placeholder '{{{f}}}'")
+        self.placeholders = tuple(dict.fromkeys(fields))
+        missing = [p for p in required if p not in self.placeholders]
+        if missing:
+            raise ValueError(f"Template '{name}' is missing required placeholder(s): {missing}")
+
+        try:
+            parsed = json.loads(text.format(**{p: _sentinel(p) for p in self.placeholders}))
+        except ValueError as e:
+            raise ValueError(f"Template '{name}' is not valid JSON after substitution: {e}")
+
+        if isinstance(parsed, dict) and "pipeline" in parsed:
+            stages = parsed["pipeline"]
+        elif isinstance(parsed, list):
+            stages = parsed
+        else:
+            raise ValueError("Pipeline template must be a list or a dict with a 'pipeline' key.")
+        if not stages:
+            raise ValueError(f"Template '{name}' has no stages")
+
+        sentinels = [_sentinel(p) for p in self.placeholders]
+        for i, stage in enumerate(stages):
+            if isinstance(stage, str):
+                continue  # bare filename stage, PDAL infers the driver
+            if not isinstance(stage, dict):
+                raise ValueError(f"Template '{name}' stage {i} must be an object or a filename string")
+            stage_type = stage.get("type")
+            if stage_type is not None and not _STAGE_TYPE_RE.match(str(stage_type)):
+                raise ValueError(f"Template '{name}' stage {i} has an invalid type '{stage_type}'")
+
+        self.stages: List[Any] = stages
+        # Only stages that actually contain placeholders need rebuilding per tile
+        self._templated = [_contains_sentinel(stage, sentinels) for stage in stages]
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path], required: Tuple[str, ...] = DEFAULT_PLACEHOLDERS) -> "PipelineTemplate":
+        path = Path(path)
+        if not path.is_file():
+            raise FileNotFoundError(f"Pipeline template not found: {path}")
+        return cls(path.read_text(encoding="utf-8"), name=path.stem, required=required)
+
+    @property
+    def stage_types(self) -> List[Optional[str]]:
+        return [s.get("type") if isinstance(s, dict) else None for s in self.stages]
+
+    def fill(self, **values) -> Dict[str, List[Any]]:
+        """
+        Return {"pipeline": [...]} with every placeholder replaced by str(value).
+        Untemplated stages are shared with the template, so treat the result as read-only.
+        """
+        missing = [p for p in self.placeholders if p not in values]
+        if missing:
+            raise ValueError(f"Missing template variable(s) for '{self.name}': {missing}")
+        mapping = {_sentinel(p): str(values[p]) for p in self.placeholders}
+        stages = [
+            _substitute(stage, mapping) if templated else stage
+            for stage, templated in zip(self.stages, self._templated)
+        ]
+        return {"pipeline": stages}
+
+    def to_json(self, **values) -> str:
+        """Filled pipeline as a JSON string, ready for pdal.Pipeline()."""
+        return json.dumps(self.fill(**values))
+
+    def __repr__(self) -> str:
+        return f"PipelineTemplate({self.name!r}, stages={self.stage_types})"
+
+def dump_template_text(stages: List[Any], indent: int = 4) -> str:
+    """
+    Inverse of PipelineTemplate parsing: serialise (possibly modified) template
+    stages, which still contain placeholder sentinels, back to template text with
+    doubled braces and {name} placeholders.
+    """
+    text = json.dumps({"pipeline": stages}, indent=indent)
+    text = text.replace("{", "{{").replace("}", "}}")
+    return re.sub(r"@@([A-Za-z_][A-Za-z0-9_]*)@@", r"{\1}", text)
+
+_TEMPLATE_CACHE: Dict[Tuple[str, int], PipelineTemplate] = {}
+
+def load_pipeline_template(path: Union[str, Path]) -> PipelineTemplate:
+    """
+    Per-process cached PipelineTemplate.from_file(); re-parsed if the file's mtime changes.
+    """
+    path = os.path.abspath(str(path))
+    key = (path, os.stat(path).st_mtime_ns)
+    template = _TEMPLATE_CACHE.get(key)
+    if template is None:
+        template = PipelineTemplate.from_file(path)
+        _TEMPLATE_CACHE[key] = template
+    return template
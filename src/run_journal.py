@@ -0,0 +1,106 @@
+# src/run_journal.py
+"""
+Append-only JSONL journal of per-input job outcomes, used to resume interrupted runs.
+
+One line per finished attempt:
+
+    {"time": ..., "input": ..., "state": "done" | "failed", "output": ..., "elapsed_s": ...,
+     "error": ..., "output_size": ..., "output_mtime_ns": ..., "sha256": ...}
+
+A resumed run checks a done output's size and mtime against the journal, which
+costs one stat per input; the SHA-256 (if recorded) is only compared on request.
+
+The last line for an input wins. Lines are written with a single append and the
+file is never rewritten, so a crash can at worst lose the line being written.
+Outputs are produced via temp-file-and-rename (see lidar.run_pdal_pipeline), so
+an input without a "done" line never leaves a half-written output behind.
+"""
+
+import os
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.metadata_cache import file_sha256
+
+def append_entry(journal_path, input_path, state: str, output: Optional[str] = None,
+                 elapsed_s: Optional[float] = None, error: Optional[str] = None, **extra) -> None:
+    """Record one finished attempt for *input_path*."""
+    entry = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "input": str(input_path),
+        "state": state,
+        "output": output,
+        "elapsed_s": elapsed_s,
+        "error": error,
+    }
+    entry.update(extra)
+    os.makedirs(os.path.dirname(os.path.abspath(str(journal_path))), exist_ok=True)
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+def output_stat(output_path) -> Dict[str, int]:
+    """Integrity fields for a done entry: size and mtime (ns) of *output_path*."""
+    st = os.stat(output_path)
+    return {"output_size": st.st_size, "output_mtime_ns": st.st_mtime_ns}
+
+def load_journal(journal_path) -> Dict[str, Dict[str, Any]]:
+    """
+    Latest entry per input, with 'failures' set to the number of failed attempts
+    since the input last succeeded. A missing journal is empty; a torn line is ignored.
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    if not os.path.isfile(journal_path):
+        return latest
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            previous = latest.get(entry["input"], {})
+            entry["failures"] = previous.get("failures", 0) + 1 if entry.get("state") == "failed" else 0
+            latest[entry["input"]] = entry
+    return latest
+
+def is_done(entry: Dict[str, Any], verify_checksum: bool = False) -> bool:
+    """
+    True if *entry* is 'done' and its output still exists with the recorded size
+    and mtime and, with *verify_checksum*, the recorded SHA-256.
+    """
+    if entry.get("state") != "done" or not entry.get("output") or not os.path.isfile(entry["output"]):
+        return False
+    if "output_size" in entry and output_stat(entry["output"]) != {
+            "output_size": entry["output_size"], "output_mtime_ns": entry.get("output_mtime_ns")}:
+        return False
+    if verify_checksum and entry.get("sha256"):
+        return file_sha256(entry["output"]) == entry["sha256"]
+    return True
+
+def completed_inputs(journal_path, verify_checksum: bool = False) -> Set[str]:
+    """Inputs whose latest entry is 'done' with the output still in place."""
+    return {inp for inp, e in load_journal(journal_path).items() if is_done(e, verify_checksum)}
+
+def resume_plan(journal_path, inputs: Iterable[str], max_retries: Optional[int] = None,
+                verify_checksum: bool = False) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Split *inputs* for a resumed run.
+
+    Args:
+        max_retries (int, optional): Inputs that already failed more than this many
+            times in a row are not retried (None: always retry).
+
+    Returns:
+        tuple: (to_run, done, given_up), each in the order of *inputs*.
+    """
+    journal = load_journal(journal_path)
+    to_run, done, given_up = [], [], []
+    for inp in inputs:
+        entry = journal.get(str(inp))
+        if entry and is_done(entry, verify_checksum):
+            done.append(inp)
+        elif entry and max_retries is not None and entry.get("failures", 0) > max_retries:
+            given_up.append(inp)
+        else:
+            to_run.append(inp)
+    return to_run, done, given_up
@@ -0,0 +1,134 @@
+# src/run_report.py
+"""
+JSONL run reports for PDAL pipeline runs.
+
+run_pdal_pipeline(..., report_path=...) appends one JSON object per tile:
+
+    {"time": ..., "input": ..., "output": ..., "template": ..., "status": "ok" | "cached" | "error",
+     "elapsed_s": ..., "points_in": ..., "points_out": ..., "peak_rss_mb": ..., "pdal_version": ...,
+     "stages": [{"index": 0, "type": "readers.las", "elapsed_s": ..., "points_in": ..., "points_out": ...,
+                 "peak_rss_mb": ...}, ...]}
+
+"stages" is only filled when the run was profiled stage by stage. Each record is
+written with a single append, so worker processes can share one report file.
+
+Summarise a report per template (and per stage) with:
+
+    python -m src.run_report data/processed/dtm/run_report.jsonl
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    High-water mark of this process's resident set size in MiB (None if unavailable).
+    In a long-lived worker this is the peak over every tile it has processed so far.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+def append_record(report_path, record: Dict[str, Any]) -> None:
+    """Append *record* as one JSON line (single write so concurrent appenders don't interleave)."""
+    report_dir = os.path.dirname(os.path.abspath(str(report_path)))
+    os.makedirs(report_dir, exist_ok=True)
+    line = json.dumps(record, default=str) + "\n"
+    with open(report_path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+def read_records(report_path) -> Iterator[Dict[str, Any]]:
+    with open(report_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    n = len(values)
+    return {
+        "n": n,
+        "mean": sum(values) / n if n else float("nan"),
+        "median": values[n // 2] if n else float("nan"),
+        "max": values[-1] if n else float("nan"),
+    }
+
+def summarize(records) -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregate records per template: tile counts by status, elapsed/peak-RSS stats
+    and throughput over "ok" runs, and per-stage elapsed stats from profiled runs.
+    """
+    per_template: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+        "status": defaultdict(int), "elapsed": [], "rss": [], "points": 0, "stage_elapsed": defaultdict(list)
+    })
+    for rec in records:
+        t = per_template[rec.get("template", "?")]
+        t["status"][rec.get("status", "?")] += 1
+        if rec.get("status") != "ok":
+            continue
+        t["elapsed"].append(rec.get("elapsed_s", 0.0))
+        if rec.get("peak_rss_mb") is not None:
+            t["rss"].append(rec["peak_rss_mb"])
+        t["points"] += rec.get("points_in") or 0
+        for stage in rec.get("stages") or []:
+            t["stage_elapsed"][(stage["index"], stage["type"])].append(stage["elapsed_s"])
+
+    summary = {}
+    for name, t in per_template.items():
+        total_elapsed = sum(t["elapsed"])
+        summary[name] = {
+            "status": dict(t["status"]),
+            "elapsed_s": _stats(t["elapsed"]),
+            "peak_rss_mb": _stats(t["rss"]),
+            "points_per_s": t["points"] / total_elapsed if total_elapsed > 0 else float("nan"),
+            "stages": {
+                f"{idx}:{stage_type}": _stats(v)
+                for (idx, stage_type), v in sorted(t["stage_elapsed"].items())
+            },
+        }
+    return summary
+
+def print_summary(summary: Dict[str, Dict[str, Any]]) -> None:
+    for name, s in sorted(summary.items()):
+        e = s["elapsed_s"]
+        print(f"Template: {name}")
+        print(f"  {'Tiles by status:':<28} {s['status']}")
+        print(f"  {'Elapsed per tile (s):':<28} mean {e['mean']:.1f}, median {e['median']:.1f}, max {e['max']:.1f} (n={e['n']})")
+        print(f"  {'Peak RSS (MiB):':<28} max {s['peak_rss_mb']['max']:.0f}")
+        print(f"  {'Throughput (pt/s):':<28} {s['points_per_s']:,.0f}")
+        if s["stages"]:
+            print(f"  {'Stage':<32} {'mean (s)':>10} {'max (s)':>10} {'n':>6}")
+            for stage, st in s["stages"].items():
+                print(f"  {stage:<32} {st['mean']:>10.2f} {st['max']:>10.2f} {st['n']:>6}")
+        print()
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a JSONL PDAL run report per template and stage.")
+    parser.add_argument("report", type=str, help="Path to the JSONL run report")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.report):
+        print(f"ERROR: Run report not found at: {args.report}")
+        sys.exit(1)
+
+    summary = summarize(read_records(args.report))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+if __name__ == "__main__":
+    main()
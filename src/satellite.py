@@ -69,8 +69,10 @@ def get_coords_from_df(df, filename):
 
     return min_lat, max_lat, min_lon, max_lon
 
-def show_sat_image(df, filename, save_path=None, overwrite=False):
-    coords = get_coords_from_df(df, filename)
+def show_sat_image(df, filename, save_path=None, overwrite=False, coords=None):
+    # Callers holding a TileIndex can pass coords directly and skip the DataFrame scan
+    if coords is None:
+        coords = get_coords_from_df(df, filename)
 
     img = fetch_esri_from_coords(coords, save_path=save_path, overwrite=overwrite)
     plt.figure(figsize=(6, 6))
@@ -0,0 +1,268 @@
+# src/smrf_tuning.py
+"""
+SMRF parameter tuning on sampled sub-windows.
+
+Instead of re-running whole tiles for every hand-edited template, a few small
+windows are cut from each tile (one streaming pass per tile, see
+src/subtile.py). Every candidate set of filters.smrf parameters is then run on
+every window in a process pool and scored on the resulting DTM patch:
+
+    nodata_fraction  share of cells with no ground point (lower is better)
+    roughness        mean |Laplacian| of the filled DTM in metres (lower is
+                     smoother; vegetation left in the ground class shows up as spikes)
+    score            nodata_fraction + roughness_weight * roughness
+
+The best candidate (lowest mean score over all windows) is written out as a new
+template with the same stages as the base template, so the expensive full-tile
+runs happen once, with tuned parameters.
+
+    python -m src.smrf_tuning config/pdal_pipeline_templates/openai_optimised_04.json data/raw/laz/RIB_A01_2014_laz_2.laz \\
+        --param slope=0.1,0.15,0.2 --param window=12,18,24 --param threshold=0.35,0.45,0.55 --workers 8
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import random
+import shutil
+import argparse
+import itertools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import laspy
+import numpy as np
+import pandas as pd
+import pdal
+
+from src.pipeline_template import PipelineTemplate, dump_template_text
+from src.subtile import split_to_chunks
+
+DEFAULT_PARAM_GRID = {
+    "scalar": [0.5, 1.0, 1.25],
+    "slope": [0.1, 0.15, 0.2],
+    "threshold": [0.35, 0.45, 0.55],
+    "window": [12.0, 18.0, 24.0],
+}
+
+def sample_windows(laz_path, n_windows: int = 4, window_size: float = 100.0, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Pick up to n_windows square windows spread over the tile: the tile is divided
+    into a near-square grid of n_windows cells and one window is placed at a random
+    position inside each cell, so windows cover different parts of the tile.
+
+    Returns:
+        list of dicts with 'id' and 'buffered' = (min_x, max_x, min_y, max_y), the
+        format split_to_chunks() expects.
+    """
+    with laspy.open(str(laz_path)) as fh:
+        min_x, min_y = fh.header.mins[:2]
+        max_x, max_y = fh.header.maxs[:2]
+    rng = random.Random(seed)
+    nx = int(np.ceil(np.sqrt(n_windows)))
+    ny = int(np.ceil(n_windows / nx))
+    cell_w, cell_h = (max_x - min_x) / nx, (max_y - min_y) / ny
+    size_x, size_y = min(window_size, max_x - min_x), min(window_size, max_y - min_y)
+
+    windows = []
+    for iy in range(ny):
+        for ix in range(nx):
+            if len(windows) == n_windows:
+                break
+            cx = min_x + (ix + rng.random()) * cell_w
+            cy = min_y + (iy + rng.random()) * cell_h
+            x0 = float(np.clip(cx - size_x / 2, min_x, max_x - size_x))
+            y0 = float(np.clip(cy - size_y / 2, min_y, max_y - size_y))
+            windows.append({"id": f"{Path(laz_path).stem}_w{len(windows)}", "buffered": (x0, x0 + size_x, y0, y0 + size_y)})
+    return windows
+
+def candidate_params(param_grid: Dict[str, List[float]], search: str = "grid",
+                     n_candidates: Optional[int] = None, seed: int = 0) -> List[Dict[str, float]]:
+    """Full grid, or n_candidates random draws from it (search='random')."""
+    keys = sorted(param_grid)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+    if search == "random" and n_candidates and n_candidates < len(grid):
+        return random.Random(seed).sample(grid, n_candidates)
+    return grid
+
+def _smrf_stage(stages):
+    for stage in stages:
+        if isinstance(stage, dict) and stage.get("type") == "filters.smrf":
+            return stage
+    raise ValueError("Template has no filters.smrf stage to tune")
+
+def score_dtm(tif_path, roughness_weight: float = 0.1) -> Dict[str, float]:
+    """nodata fraction, roughness and combined score of a DTM patch (see module docstring)."""
+    import rasterio
+    with rasterio.open(tif_path) as src:
+        dem = src.read(1, masked=True)
+    valid = ~np.ma.getmaskarray(dem) & np.isfinite(dem.filled(np.nan))
+    nodata_fraction = 1.0 - valid.mean() if valid.size else 1.0
+    if valid.sum() < 9:
+        return {"nodata_fraction": float(nodata_fraction), "roughness": np.nan, "score": np.inf}
+    filled = np.where(valid, dem.filled(np.nan), np.nanmean(dem.filled(np.nan)))
+    laplacian = (
+        filled[1:-1, :-2] + filled[1:-1, 2:] + filled[:-2, 1:-1] + filled[2:, 1:-1] - 4 * filled[1:-1, 1:-1]
+    )
+    inner_valid = valid[1:-1, 1:-1]
+    roughness = float(np.mean(np.abs(laplacian[inner_valid]))) if inner_valid.any() else np.nan
+    return {
+        "nodata_fraction": float(nodata_fraction),
+        "roughness": roughness,
+        "score": float(nodata_fraction + roughness_weight * (roughness if np.isfinite(roughness) else 0.0)),
+    }
+
+def _evaluate(template, params, window, out_tif, roughness_weight):
+    """Worker: run the template with *params* on one window LAS and score the DTM patch."""
+    stages = copy.deepcopy(template.fill(in_laz=window["las_path"], out_tif=out_tif)["pipeline"])
+    _smrf_stage(stages).update(params)
+    x0, x1, y0, y1 = window["buffered"]
+    for stage in stages:
+        if isinstance(stage, dict) and stage.get("type") == "writers.gdal":
+            stage["bounds"] = f"([{x0}, {x1}], [{y0}, {y1}])"
+    t0 = time.perf_counter()
+    try:
+        pdal.Pipeline(json.dumps(stages)).execute()
+        result = score_dtm(out_tif, roughness_weight)
+        result["error"] = None
+    except Exception as e:
+        result = {"nodata_fraction": np.nan, "roughness": np.nan, "score": np.inf, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        if os.path.exists(out_tif):
+            os.remove(out_tif)
+    result["elapsed_s"] = time.perf_counter() - t0
+    return result
+
+def tune(
+    template: PipelineTemplate,
+    laz_paths: List[str],
+    candidates: List[Dict[str, float]],
+    n_windows: int = 4,
+    window_size: float = 100.0,
+    min_points: int = 1000,
+    workers: int = 1,
+    roughness_weight: float = 0.1,
+    seed: int = 0,
+    scratch_dir: Optional[str] = None,
+    verbose: int = 1
+) -> pd.DataFrame:
+    """
+    Score every candidate on sampled windows of every tile.
+
+    Returns:
+        pd.DataFrame: one row per (candidate, window_id) with the parameters,
+        nodata_fraction, roughness, score, elapsed_s and error.
+    """
+    _smrf_stage(template.stages)  # fail early if there is nothing to tune
+    own_scratch = scratch_dir is None
+    scratch_dir = scratch_dir or tempfile.mkdtemp(prefix="smrf_tuning_")
+    os.makedirs(scratch_dir, exist_ok=True)
+    try:
+        windows = []
+        for laz_path in laz_paths:
+            tile_windows = split_to_chunks(laz_path, sample_windows(laz_path, n_windows, window_size, seed), scratch_dir)
+            windows += [w for w in tile_windows if w["n_points"] >= min_points]
+        if not windows:
+            raise RuntimeError(f"No window with at least {min_points} points in {laz_paths}")
+        if verbose:
+            print(f"[smrf_tuning] {len(candidates)} candidates x {len(windows)} windows = {len(candidates) * len(windows)} runs")
+
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for c, params in enumerate(candidates):
+                for window in windows:
+                    out_tif = os.path.join(scratch_dir, f"c{c}_{window['id']}.tif")
+                    futures[executor.submit(_evaluate, template, params, window, out_tif, roughness_weight)] = (c, params, window)
+            for n_done, future in enumerate(as_completed(futures), 1):
+                c, params, window = futures[future]
+                rows.append({"candidate": c, **params, "window_id": window["id"], "n_points": window["n_points"], **future.result()})
+                if verbose and n_done % max(1, len(futures) // 10) == 0:
+                    print(f"[smrf_tuning] {n_done}/{len(futures)} runs done")
+        return pd.DataFrame(rows).sort_values(["candidate", "window_id"]).reset_index(drop=True)
+    finally:
+        if own_scratch:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+def rank_candidates(results: pd.DataFrame, param_names: List[str]) -> pd.DataFrame:
+    """Mean metrics per candidate, best (lowest mean score) first."""
+    ranked = results.groupby(["candidate"] + sorted(param_names), as_index=False).agg(
+        score=("score", "mean"),
+        nodata_fraction=("nodata_fraction", "mean"),
+        roughness=("roughness", "mean"),
+        n_failed=("error", lambda e: int(e.notna().sum())),
+    )
+    return ranked.sort_values(["score", "candidate"]).reset_index(drop=True)
+
+def write_tuned_template(template: PipelineTemplate, params: Dict[str, float], out_path) -> str:
+    """Write *template* with its filters.smrf stage updated to *params*."""
+    stages = copy.deepcopy(template.stages)
+    _smrf_stage(stages).update(params)
+    text = dump_template_text(stages)
+    PipelineTemplate(text, name=Path(out_path).stem)  # round-trip check
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return str(out_path)
+
+def _parse_param(value):
+    name, _, values = value.partition("=")
+    if not name or not values:
+        raise argparse.ArgumentTypeError(f"Expected name=v1,v2,..., got '{value}'")
+    return name, [float(v) for v in values.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune filters.smrf parameters of a PDAL template on sampled sub-windows.")
+    parser.add_argument("template", type=str, help="Base PDAL pipeline template (.json)")
+    parser.add_argument("laz", nargs="+", help="Tiles to sample windows from")
+    parser.add_argument("--param", type=_parse_param, action="append", default=None, metavar="NAME=V1,V2,...",
+                        help="SMRF parameter values to search (repeatable; default: a small grid over scalar/slope/threshold/window)")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid", help="Full grid, or --n-candidates random draws from it (default: grid)")
+    parser.add_argument("--n-candidates", type=int, default=20, help="Candidates for --search random (default: 20)")
+    parser.add_argument("--windows", type=int, default=4, help="Windows per tile (default: 4)")
+    parser.add_argument("--window-size", type=float, default=100.0, help="Window edge length in metres (default: 100)")
+    parser.add_argument("--min-points", type=int, default=1000, help="Skip windows with fewer points (default: 1000)")
+    parser.add_argument("--roughness-weight", type=float, default=0.1, help="Weight of roughness in the score (default: 0.1)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel runs (default: number of CPUs)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for window placement and random search (default: 0)")
+    parser.add_argument("--output", default=None, help="Tuned template path (default: <template>_tuned.json next to the base template)")
+    parser.add_argument("--results", default=None, help="Also write the per-run scores to this CSV")
+    args = parser.parse_args()
+
+    missing = [p for p in [args.template] + args.laz if not os.path.isfile(p)]
+    if missing:
+        print(f"ERROR: File(s) not found: {missing}")
+        sys.exit(1)
+
+    template = PipelineTemplate.from_file(args.template)
+    param_grid = dict(args.param) if args.param else DEFAULT_PARAM_GRID
+    candidates = candidate_params(param_grid, args.search, args.n_candidates, args.seed)
+
+    t0 = time.time()
+    results = tune(
+        template, args.laz, candidates, n_windows=args.windows, window_size=args.window_size,
+        min_points=args.min_points, workers=args.workers, roughness_weight=args.roughness_weight, seed=args.seed
+    )
+    ranked = rank_candidates(results, list(param_grid))
+    print(f"[smrf_tuning] Done in {time.time() - t0:.1f}s. Best candidates:")
+    with pd.option_context("display.width", 160):
+        print(ranked.head(10).to_string(index=False))
+
+    if args.results:
+        results.to_csv(args.results, index=False)
+        print(f"[smrf_tuning] Wrote per-run scores: {args.results}")
+
+    best = ranked.iloc[0]
+    if not np.isfinite(best["score"]):
+        print("ERROR: Every candidate failed; no template written")
+        sys.exit(1)
+    best_params = {k: float(best[k]) for k in param_grid}
+    output = args.output or os.path.join(os.path.dirname(args.template), f"{template.name}_tuned.json")
+    write_tuned_template(template, best_params, output)
+    print(f"[smrf_tuning] Tuned template ({best_params}): {output}")
+
+if __name__ == "__main__":
+    main()
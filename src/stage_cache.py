@@ -0,0 +1,151 @@
+# src/stage_cache.py
+"""
+Persistent cache for the shared denoising prefix of PDAL pipelines.
+
+Most templates in config/pdal_pipeline_templates/ start with the same stages:
+readers.las followed by one or more filters.outlier. That prefix (LAZ decode +
+KNN outlier search) is a large part of every run and does not depend on the
+ground-filter settings that differ between templates. Here the prefix is cut
+off, keyed by a hash of its stages, the input file and the PDAL version, and its
+output is written once as an uncompressed LAS in the cache directory (opt-in,
+main.py --stage-cache DIR). The rest of the pipeline then reads that file instead.
+
+Uncompressed LAS is roughly 5-10x the size of the LAZ it comes from, so the
+cache is bounded: after each write the least recently used files are removed
+until it fits in max_bytes (prune_cache).
+
+filters.outlier only classifies noise (class 7), it does not drop points, so the
+cached cloud keeps every point; all dimensions and the header are forwarded.
+"""
+
+import os
+import json
+import hashlib
+import time
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+import pdal
+
+DEFAULT_STAGE_CACHE_DIR = os.path.join("data", "processed", "denoised")
+DEFAULT_STAGE_CACHE_MAX_GB = 50.0
+
+# Stages that may be part of a cached prefix after the reader
+CACHEABLE_STAGE_TYPES = ("filters.outlier", "filters.elm")
+
+def _stage_type(stage):
+    return stage.get("type") if isinstance(stage, dict) else None
+
+def split_cacheable_prefix(stages: List[Any]) -> Tuple[List[Any], List[Any]]:
+    """
+    Split *stages* into (prefix, rest), where prefix is a single readers.las
+    followed by the run of CACHEABLE_STAGE_TYPES stages directly after it.
+    Returns ([], stages) if the pipeline has no such prefix.
+    """
+    if not stages or _stage_type(stages[0]) != "readers.las":
+        return [], stages
+    n = 1
+    while n < len(stages) and _stage_type(stages[n]) in CACHEABLE_STAGE_TYPES:
+        n += 1
+    if n == 1:
+        return [], stages
+    return stages[:n], stages[n:]
+
+def prefix_key(prefix: List[Any], input_path, pdal_version: str) -> str:
+    """SHA-256 over the prefix stages (reader filename replaced by the input's identity) and PDAL version."""
+    st = os.stat(input_path)
+    reader = dict(prefix[0], filename=None)
+    payload = {
+        "stages": [reader] + prefix[1:],
+        "input": [os.path.abspath(str(input_path)), st.st_size, st.st_mtime_ns],
+        "pdal_version": pdal_version,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def cached_prefix_path(input_path, key: str, cache_dir=DEFAULT_STAGE_CACHE_DIR) -> str:
+    return os.path.join(str(cache_dir), f"{Path(input_path).stem}_{key[:16]}.las")
+
+def prune_cache(cache_dir, max_bytes: int, keep=(), verbose: int = 0) -> int:
+    """
+    Remove the least recently used cached files (oldest mtime first; hits touch
+    their file) until the cache holds at most *max_bytes*. Files in *keep* and
+    in-progress temporary files are never removed.
+
+    Returns:
+        int: Number of bytes freed.
+    """
+    keep = {os.path.abspath(str(k)) for k in keep}
+    entries = []
+    with os.scandir(str(cache_dir)) as it:
+        for e in it:
+            if e.is_file() and e.name.endswith(".las") and ".tmp" not in e.name:
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # pruned concurrently by another worker
+            pass
+        freed += size
+        if verbose:
+            print(f"[stage_cache] Pruned: {path}")
+    return freed
+
+def ensure_prefix_output(prefix: List[Any], input_path, pdal_version: str,
+                         cache_dir=DEFAULT_STAGE_CACHE_DIR, verbose: int = 0,
+                         max_bytes: Optional[int] = None) -> Tuple[str, bool]:
+    """
+    Return the cached output of *prefix* for *input_path*, running the prefix
+    first if it is not cached yet. The file is written under a temporary name
+    and renamed, so concurrent workers and interrupted runs never see a partial file.
+    With *max_bytes*, the cache is pruned to that size after a write (see prune_cache).
+
+    Returns:
+        tuple: (path to the cached .las, True if it was already cached)
+    """
+    key = prefix_key(prefix, input_path, pdal_version)
+    out_path = cached_prefix_path(input_path, key, cache_dir)
+    if os.path.isfile(out_path):
+        os.utime(out_path)  # mark as recently used for prune_cache
+        if verbose:
+            print(f"[stage_cache] Hit: {out_path}")
+        return out_path, True
+
+    os.makedirs(str(cache_dir), exist_ok=True)
+    tmp_path = f"{out_path[:-4]}.tmp{os.getpid()}.las"
+    writer = {"type": "writers.las", "filename": tmp_path, "forward": "all", "extra_dims": "all"}
+    t0 = time.perf_counter()
+    try:
+        pdal.Pipeline(json.dumps(prefix + [writer])).execute()
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if verbose:
+        print(f"[stage_cache] Wrote: {out_path} ({time.perf_counter() - t0:.1f}s)")
+    if max_bytes is not None:
+        prune_cache(cache_dir, max_bytes, keep=[out_path], verbose=verbose)
+    return out_path, False
+
+def apply_stage_cache(stages: List[Any], input_path, pdal_version: str,
+                      cache_dir=DEFAULT_STAGE_CACHE_DIR, verbose: int = 0,
+                      max_bytes: Optional[int] = None) -> Tuple[List[Any], Optional[bool]]:
+    """
+    If *stages* start with a cacheable prefix, make sure its output is cached and
+    swap the prefix for a reader of the cached file.
+
+    Returns:
+        tuple: (stages to execute, True/False for a cache hit/miss, or None if
+        the pipeline has no cacheable prefix and *stages* is returned unchanged)
+    """
+    prefix, rest = split_cacheable_prefix(stages)
+    if not prefix:
+        return stages, None
+    cached_path, hit = ensure_prefix_output(prefix, input_path, pdal_version, cache_dir, verbose, max_bytes)
+    return [{"type": "readers.las", "filename": cached_path}] + rest, hit
@@ -0,0 +1,211 @@
+# src/subtile.py
+"""
+Buffered sub-tiling for very large LAZ tiles.
+
+SMRF and the statistical outlier filter work on the whole point view, so on
+tiles with tens of millions of points a single pipeline can exhaust memory.
+execute_chunked() instead:
+
+    1. streams the tile once with laspy's chunk iterator and writes every point
+       into the (uncompressed) LAS file of each buffered sub-window it falls in,
+    2. runs the template on each sub-window, in parallel if requested, with the
+       GDAL writer's bounds set to the sub-window's unbuffered core so the
+       buffer only provides context to the filters and is cropped from the raster,
+    3. mosaics the core rasters into the requested output GeoTIFF.
+
+Peak memory is then bounded by the chunk size (plus buffer) rather than the tile.
+"""
+
+import os
+import json
+import math
+import time
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import laspy
+import numpy as np
+import pdal
+
+DEFAULT_CHUNK_BUFFER = 50.0
+
+def _writer_stage(stages):
+    for stage in stages:
+        if isinstance(stage, dict) and stage.get("type") == "writers.gdal":
+            return stage
+    raise ValueError("Sub-tiled execution needs a writers.gdal stage in the template")
+
+def plan_chunks(bounds, chunk_size, buffer, resolution):
+    """
+    Split (min_x, max_x, min_y, max_y) into a grid of chunks.
+
+    chunk_size is rounded to a whole number of raster cells so every core lands
+    on the same pixel grid (origin at min_x / min_y) and cores mosaic without gaps.
+
+    Returns:
+        list of dicts with 'id', 'core' and 'buffered' (min_x, max_x, min_y, max_y),
+        and 'closed' (x, y): True for the last column / row, whose upper bound is
+        inclusive so points on the tile's max_x / max_y edge still land in a chunk.
+    """
+    min_x, max_x, min_y, max_y = bounds
+    cells = max(1, int(round(chunk_size / resolution)))
+    step = cells * resolution
+    nx = max(1, math.ceil((max_x - min_x) / step))
+    ny = max(1, math.ceil((max_y - min_y) / step))
+    chunks = []
+    for iy in range(ny):
+        for ix in range(nx):
+            core = (min_x + ix * step, min_x + (ix + 1) * step, min_y + iy * step, min_y + (iy + 1) * step)
+            buffered = (core[0] - buffer, core[1] + buffer, core[2] - buffer, core[3] + buffer)
+            chunks.append({"id": f"{ix}_{iy}", "core": core, "buffered": buffered, "closed": (ix == nx - 1, iy == ny - 1)})
+    return chunks
+
+def split_to_chunks(laz_path, chunks, scratch_dir, points_per_read=2_000_000):
+    """
+    Stream *laz_path* once and write each buffered chunk to '<scratch_dir>/<id>.las'.
+    Points in overlapping buffers go to every chunk they fall in. Adds 'las_path'
+    and 'n_points' to each chunk dict; chunks that receive no points get n_points 0
+    and no file.
+    """
+    writers = {}
+    counts = {c["id"]: 0 for c in chunks}
+    try:
+        with laspy.open(str(laz_path)) as reader:
+            header = reader.header
+            for points in reader.chunk_iterator(points_per_read):
+                x = np.asarray(points.x)
+                y = np.asarray(points.y)
+                for chunk in chunks:
+                    bx0, bx1, by0, by1 = chunk["buffered"]
+                    closed_x, closed_y = chunk.get("closed", (False, False))
+                    mask = ((x >= bx0) & ((x <= bx1) if closed_x else (x < bx1))
+                            & (y >= by0) & ((y <= by1) if closed_y else (y < by1)))
+                    n = int(mask.sum())
+                    if not n:
+                        continue
+                    if chunk["id"] not in writers:
+                        path = os.path.join(scratch_dir, f"{chunk['id']}.las")
+                        writers[chunk["id"]] = laspy.open(path, mode="w", header=header, do_compress=False)
+                        chunk["las_path"] = path
+                    writers[chunk["id"]].write_points(points[mask])
+                    counts[chunk["id"]] += n
+    finally:
+        for w in writers.values():
+            w.close()
+    for chunk in chunks:
+        chunk["n_points"] = counts[chunk["id"]]
+    return chunks
+
+def _run_chunk(pipeline_json, chunk_tif):
+    """Worker: execute one chunk pipeline. Module-level so it can run in a process pool."""
+    t0 = time.perf_counter()
+    count = pdal.Pipeline(pipeline_json).execute()
+    if not os.path.isfile(chunk_tif):
+        raise RuntimeError(f"Chunk output not created: {chunk_tif}")
+    return count, time.perf_counter() - t0
+
+def mosaic(chunk_tifs, out_tif_path, bounds, resolution):
+    """Mosaic chunk rasters (disjoint cores on a shared grid) into one GeoTIFF covering *bounds*."""
+    import rasterio
+    from rasterio.merge import merge
+
+    min_x, max_x, min_y, max_y = bounds
+    width = max(1, math.ceil((max_x - min_x) / resolution))
+    height = max(1, math.ceil((max_y - min_y) / resolution))
+    srcs = [rasterio.open(p) for p in chunk_tifs]
+    try:
+        profile = srcs[0].profile.copy()
+        nodata = srcs[0].nodata
+        array, transform = merge(
+            srcs,
+            # Anchor at (min_x, min_y): the same grid origin plan_chunks used for the cores
+            bounds=(min_x, min_y, min_x + width * resolution, min_y + height * resolution),
+            res=resolution,
+            nodata=nodata,
+        )
+    finally:
+        for src in srcs:
+            src.close()
+    profile.update(
+        driver="GTiff", width=array.shape[2], height=array.shape[1], count=array.shape[0],
+        transform=transform, nodata=nodata
+    )
+    tmp_path = f"{out_tif_path}.tmp.{os.getpid()}.tif"
+    with rasterio.open(tmp_path, "w", **profile) as dst:
+        dst.write(array)
+    os.replace(tmp_path, out_tif_path)
+
+def execute_chunked(
+    template,
+    input_path: str,
+    out_tif_path: str,
+    chunk_size: float,
+    buffer: float = DEFAULT_CHUNK_BUFFER,
+    workers: int = 1,
+    scratch_dir: Optional[str] = None,
+    verbose: int = 0
+) -> Tuple[int, int, List[Dict[str, Any]]]:
+    """
+    Run *template* (a PipelineTemplate) over *input_path* in buffered sub-tiles
+    and mosaic the result into *out_tif_path*.
+
+    Args:
+        chunk_size (float): Core chunk edge length in CRS units (metres).
+        buffer (float): Overlap added on every side of a chunk; should exceed
+            the largest filter neighbourhood (e.g. the SMRF window).
+        workers (int): Chunks to run concurrently.
+        scratch_dir (str, optional): Where chunk LAS/TIF files go (default: a
+            temp dir next to the output, removed afterwards).
+
+    Returns:
+        tuple: (points_out, points_in, stage_records), like lidar.execute_pipeline.
+        Per-chunk timings are not reported as stages; points_out counts buffer points
+        once per chunk they were processed in.
+    """
+    with laspy.open(str(input_path)) as fh:
+        hdr = fh.header
+        bounds = (float(hdr.mins[0]), float(hdr.maxs[0]), float(hdr.mins[1]), float(hdr.maxs[1]))
+        points_in = int(hdr.point_count)
+
+    stages = template.fill(in_laz=input_path, out_tif=out_tif_path)["pipeline"]
+    resolution = float(_writer_stage(stages).get("resolution", 1.0))
+    chunks = plan_chunks(bounds, chunk_size, buffer, resolution)
+
+    own_scratch = scratch_dir is None
+    scratch_dir = scratch_dir or tempfile.mkdtemp(prefix="subtile_", dir=os.path.dirname(out_tif_path) or None)
+    os.makedirs(scratch_dir, exist_ok=True)
+    try:
+        t0 = time.perf_counter()
+        split_to_chunks(input_path, chunks, scratch_dir)
+        chunks = [c for c in chunks if c["n_points"] > 0]
+        if not chunks:
+            raise RuntimeError(f"No points found in any chunk of {input_path}")
+        if verbose:
+            print(f"[subtile] Split {points_in:,} points into {len(chunks)} chunks "
+                  f"({chunk_size:g} + {buffer:g} buffer) in {time.perf_counter() - t0:.1f}s")
+
+        jobs = []
+        for chunk in chunks:
+            chunk_tif = os.path.join(scratch_dir, f"{chunk['id']}.tif")
+            chunk_stages = template.fill(in_laz=chunk["las_path"], out_tif=chunk_tif)["pipeline"]
+            chunk_stages = [dict(s) if isinstance(s, dict) else s for s in chunk_stages]
+            cx0, cx1, cy0, cy1 = chunk["core"]
+            _writer_stage(chunk_stages)["bounds"] = f"([{cx0}, {cx1}], [{cy0}, {cy1}])"
+            jobs.append((json.dumps(chunk_stages), chunk_tif))
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_run_chunk, *zip(*jobs)))
+        else:
+            results = [_run_chunk(*job) for job in jobs]
+        if verbose:
+            for chunk, (count, elapsed) in zip(chunks, results):
+                print(f"[subtile] chunk {chunk['id']}: {chunk['n_points']:,} pts in, {count:,} out, {elapsed:.1f}s")
+
+        mosaic([tif for _, tif in jobs], out_tif_path, bounds, resolution)
+        return sum(count for count, _ in results), points_in, []
+    finally:
+        if own_scratch:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
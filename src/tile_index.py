@@ -0,0 +1,127 @@
+# src/tile_index.py
+"""
+Filename-keyed index over the dataset metadata CSV.
+
+main.py used to filter ``df[df["filename"] == name]`` for every tile (and
+satellite.get_coords_from_df scanned again), which is O(N) per lookup. A
+TileIndex parses the CSV once, maps filename -> row position in a dict and
+keeps bbox/area as contiguous numpy arrays, so each lookup is O(1).
+
+The parsed table can also be cached next to the CSV as Parquet (or Feather)
+and is reused as long as it is newer than the CSV. Both formats need pyarrow;
+if it is not installed the CSV is simply read directly.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple, Union
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BBOX_COLUMNS = ["min_lat", "max_lat", "min_lon", "max_lon"]
+CACHE_FORMATS = ("parquet", "feather")
+
+def _cache_path(csv_path, cache_format):
+    return f"{csv_path}.{cache_format}"
+
+def read_metadata_table(csv_path: Union[str, Path], cache_format: Optional[str] = "parquet", verbose: bool = True) -> pd.DataFrame:
+    """
+    Read the metadata CSV, going through a Parquet/Feather copy when it is up to date.
+
+    Args:
+        csv_path (str): Path to the metadata CSV.
+        cache_format (str, optional): "parquet", "feather" or None to disable caching.
+        verbose (bool): Print cache hits/misses.
+
+    Returns:
+        pd.DataFrame
+    """
+    csv_path = str(csv_path)
+    if cache_format is None:
+        return pd.read_csv(csv_path)
+    if cache_format not in CACHE_FORMATS:
+        raise ValueError(f"cache_format must be one of {CACHE_FORMATS} or None, got {cache_format!r}")
+
+    cache_path = _cache_path(csv_path, cache_format)
+    if os.path.isfile(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(csv_path):
+        try:
+            df = pd.read_parquet(cache_path) if cache_format == "parquet" else pd.read_feather(cache_path)
+            if verbose:
+                print(f"[tile_index] Loaded cached metadata table: {cache_path}")
+            return df
+        except Exception as e:
+            print(f"[tile_index] Could not read {cache_path} ({e}), falling back to CSV")
+
+    df = pd.read_csv(csv_path)
+    try:
+        if cache_format == "parquet":
+            df.to_parquet(cache_path, index=False)
+        else:
+            df.reset_index(drop=True).to_feather(cache_path)
+        if verbose:
+            print(f"[tile_index] Wrote metadata table cache: {cache_path}")
+    except ImportError as e:
+        if verbose:
+            print(f"[tile_index] {cache_format} cache unavailable ({e}); reading CSV directly")
+    except Exception as e:
+        print(f"[tile_index] Failed to write {cache_path}: {e}")
+    return df
+
+class TileIndex:
+    """
+    O(1) filename lookups over the tile metadata table.
+
+    Args:
+        df (pd.DataFrame): Metadata table with a 'filename' column (and, for
+            bbox()/area(), the min/max lat/lon and 'tile_area_m2' columns).
+    """
+
+    def __init__(self, df: pd.DataFrame, filename_col: str = "filename"):
+        self.df = df.reset_index(drop=True)
+        self.filenames: List[str] = self.df[filename_col].tolist()
+        # First occurrence wins, matching the old df[df["filename"] == name].iloc[0]
+        self._pos: Dict[str, int] = {}
+        for i, name in enumerate(self.filenames):
+            self._pos.setdefault(name, i)
+
+        cols = self.df.columns
+        self._bbox = (
+            self.df[BBOX_COLUMNS].to_numpy(dtype=np.float64)
+            if all(c in cols for c in BBOX_COLUMNS) else None
+        )
+        self._area = (
+            self.df["tile_area_m2"].to_numpy(dtype=np.float64)
+            if "tile_area_m2" in cols else None
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path: Union[str, Path], cache_format: Optional[str] = "parquet", verbose: bool = True) -> "TileIndex":
+        return cls(read_metadata_table(csv_path, cache_format=cache_format, verbose=verbose))
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def __contains__(self, filename) -> bool:
+        return filename in self._pos
+
+    def position(self, filename: str) -> int:
+        """Row position of *filename*; raises KeyError if it is not in the table."""
+        return self._pos[filename]
+
+    def row(self, filename: str) -> pd.Series:
+        return self.df.iloc[self._pos[filename]]
+
+    def bbox(self, filename: str) -> Tuple[float, float, float, float]:
+        """(min_lat, max_lat, min_lon, max_lon), same order as satellite.get_coords_from_df."""
+        if self._bbox is None:
+            raise KeyError(f"Metadata table has no {BBOX_COLUMNS} columns")
+        return tuple(self._bbox[self._pos[filename]].tolist())
+
+    def area(self, filename: str) -> float:
+        if self._area is None:
+            raise KeyError("Metadata table has no 'tile_area_m2' column")
+        return float(self._area[self._pos[filename]])
+
+    def head(self, n: int) -> List[str]:
+        return self.filenames[:n]
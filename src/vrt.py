@@ -0,0 +1,204 @@
+# src/vrt.py
+"""
+GDAL virtual mosaics (VRT) over per-tile DTMs.
+
+DTMs are written one GeoTIFF per tile, so regional analysis would otherwise
+open them one by one or copy them into a giant mosaic. A VRT is a small XML file
+that references the tiles in place; GDAL/rasterio then read any window across
+tile boundaries as if it were one raster.
+
+update_vrt() writes '<dtm_dir>/<dir name>.vrt' over every DTM in a template
+output directory. With an overlap-cluster table (src/overlap_clusters.py) it also
+writes one 'clusters/cluster_<id>.vrt' per cluster. Updates are incremental:
+raster headers are cached in '<vrt>.sources.json' and only new or changed DTMs
+are re-read; the XML is then rewritten, which is cheap.
+
+Every source keeps its own nodata value (as a NODATA mask) and the mosaic gets
+a single output nodata (default -9999), so tiles written with different or
+missing nodata values still combine consistently. Where tiles overlap, later
+sources (sorted by filename) win except where they are nodata.
+
+    python -m src.vrt data/processed/dtm/fnands_openai_optimised_04 --clusters data/metadata/overlap_clusters.csv
+"""
+
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from xml.sax.saxutils import escape
+
+DEFAULT_NODATA = -9999.0
+
+_GDAL_TYPES = {
+    "uint8": "Byte", "int8": "Int8", "uint16": "UInt16", "int16": "Int16", "uint32": "UInt32",
+    "int32": "Int32", "float32": "Float32", "float64": "Float64",
+}
+
+def _raster_info(path) -> Dict[str, Any]:
+    import rasterio
+    with rasterio.open(path) as src:
+        return {
+            "width": src.width,
+            "height": src.height,
+            "transform": list(src.transform)[:6],
+            "crs": src.crs.to_wkt() if src.crs else None,
+            "dtype": src.dtypes[0],
+            "nodata": src.nodata,
+            "block": list(src.block_shapes[0]),
+        }
+
+def _sources_path(vrt_path) -> str:
+    return f"{vrt_path}.sources.json"
+
+def _load_sources(vrt_path) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(_sources_path(vrt_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def collect_sources(tif_paths: List[str], cached: Optional[Dict[str, Dict[str, Any]]] = None):
+    """
+    Raster info for every path, reusing *cached* entries whose size/mtime are unchanged.
+
+    Returns:
+        tuple: ({abs path: info}, number of rasters actually (re)read)
+    """
+    cached = cached or {}
+    sources, n_read = {}, 0
+    for path in tif_paths:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = cached.get(path)
+        if not entry or entry.get("size") != st.st_size or entry.get("mtime_ns") != st.st_mtime_ns:
+            entry = dict(_raster_info(path), size=st.st_size, mtime_ns=st.st_mtime_ns)
+            n_read += 1
+        sources[path] = entry
+    return sources, n_read
+
+def vrt_xml(sources: Dict[str, Dict[str, Any]], vrt_path, nodata: float = DEFAULT_NODATA) -> str:
+    """
+    Build the VRT XML for *sources* (all north-up, same CRS and resolution).
+    Source paths are written relative to the VRT so the directory can be moved.
+    """
+    infos = list(sources.values())
+    a, _, c, _, e, f = infos[0]["transform"]
+    res_x, res_y = a, -e
+    min_x = min(i["transform"][2] for i in infos)
+    max_y = max(i["transform"][5] for i in infos)
+    max_x = max(i["transform"][2] + i["width"] * res_x for i in infos)
+    min_y = min(i["transform"][5] - i["height"] * res_y for i in infos)
+    width = int(round((max_x - min_x) / res_x))
+    height = int(round((max_y - min_y) / res_y))
+    dtype = _GDAL_TYPES.get(infos[0]["dtype"], "Float32")
+    vrt_dir = os.path.dirname(os.path.abspath(str(vrt_path)))
+
+    lines = [f'<VRTDataset rasterXSize="{width}" rasterYSize="{height}">']
+    if infos[0]["crs"]:
+        lines.append(f'  <SRS dataAxisToSRSAxisMapping="1,2">{escape(infos[0]["crs"])}</SRS>')
+    lines.append(f"  <GeoTransform>{min_x!r}, {res_x!r}, 0.0, {max_y!r}, 0.0, {-res_y!r}</GeoTransform>")
+    lines.append(f'  <VRTRasterBand dataType="{dtype}" band="1">')
+    lines.append(f"    <NoDataValue>{nodata!r}</NoDataValue>")
+    for path, info in sorted(sources.items()):
+        x_off = (info["transform"][2] - min_x) / res_x
+        y_off = (max_y - info["transform"][5]) / res_y
+        rel = os.path.relpath(path, vrt_dir)
+        lines += [
+            "    <ComplexSource>",
+            f'      <SourceFilename relativeToVRT="1">{escape(rel)}</SourceFilename>',
+            "      <SourceBand>1</SourceBand>",
+            f'      <SourceProperties RasterXSize="{info["width"]}" RasterYSize="{info["height"]}" '
+            f'DataType="{_GDAL_TYPES.get(info["dtype"], "Float32")}" BlockXSize="{info["block"][1]}" BlockYSize="{info["block"][0]}" />',
+            f'      <SrcRect xOff="0" yOff="0" xSize="{info["width"]}" ySize="{info["height"]}" />',
+            f'      <DstRect xOff="{x_off:.6f}" yOff="{y_off:.6f}" xSize="{info["width"]}" ySize="{info["height"]}" />',
+        ]
+        if info["nodata"] is not None:
+            lines.append(f"      <NODATA>{info['nodata']!r}</NODATA>")
+        lines.append("    </ComplexSource>")
+    lines += ["  </VRTRasterBand>", "</VRTDataset>", ""]
+    return "\n".join(lines)
+
+def _compatible(sources):
+    """Split off sources whose CRS or resolution differ from the majority (they can't share a VRT grid)."""
+    def key(info):
+        return (info["crs"], round(info["transform"][0], 9), round(info["transform"][4], 9))
+    counts: Dict[Any, int] = {}
+    for info in sources.values():
+        counts[key(info)] = counts.get(key(info), 0) + 1
+    best = max(counts, key=counts.get)
+    keep = {p: i for p, i in sources.items() if key(i) == best}
+    return keep, sorted(set(sources) - set(keep))
+
+def write_vrt(tif_paths: List[str], vrt_path, nodata: float = DEFAULT_NODATA, verbose: int = 1) -> Optional[str]:
+    """
+    Create or incrementally update *vrt_path* over *tif_paths*. Rasters with a
+    different CRS/resolution from the majority are left out (and reported).
+
+    Returns:
+        str: vrt_path, or None if there were no rasters.
+    """
+    vrt_path = str(vrt_path)
+    if not tif_paths:
+        return None
+    sources, n_read = collect_sources(tif_paths, _load_sources(vrt_path))
+    usable, skipped = _compatible(sources)
+    for path in skipped:
+        print(f"[vrt] Skipping {path}: CRS/resolution differs from the other DTMs")
+
+    os.makedirs(os.path.dirname(os.path.abspath(vrt_path)), exist_ok=True)
+    for path, text in ((vrt_path, vrt_xml(usable, vrt_path, nodata)), (_sources_path(vrt_path), json.dumps(sources, indent=1))):
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    if verbose:
+        print(f"[vrt] {vrt_path}: {len(usable)} DTMs ({n_read} new/changed)")
+    return vrt_path
+
+def _dtm_paths(dtm_dir) -> List[str]:
+    return sorted(str(p) for p in Path(dtm_dir).glob("*.tif") if ".tmp." not in p.name)
+
+def update_vrt(dtm_dir, nodata: float = DEFAULT_NODATA, verbose: int = 1) -> Optional[str]:
+    """Create/update '<dtm_dir>/<dir name>.vrt' over every DTM in *dtm_dir*."""
+    dtm_dir = os.path.abspath(str(dtm_dir))
+    return write_vrt(_dtm_paths(dtm_dir), os.path.join(dtm_dir, f"{os.path.basename(dtm_dir)}.vrt"), nodata, verbose)
+
+def update_cluster_vrts(dtm_dir, clusters_csv, nodata: float = DEFAULT_NODATA, verbose: int = 1) -> List[str]:
+    """
+    One VRT per overlap cluster (>= 2 tiles) in '<dtm_dir>/clusters/'. DTMs are
+    matched to tiles by name: a DTM is '<laz stem>_<template>.tif'.
+    """
+    import pandas as pd
+
+    clusters = pd.read_csv(clusters_csv)
+    dtms = _dtm_paths(dtm_dir)
+    written = []
+    for cluster_id, group in clusters[clusters["cluster_size"] > 1].groupby("cluster_id"):
+        stems = tuple(f"{Path(f).stem}_" for f in group["filename"])
+        tifs = [p for p in dtms if Path(p).name.startswith(stems)]
+        vrt_path = os.path.join(str(dtm_dir), "clusters", f"cluster_{int(cluster_id):04d}.vrt")
+        if write_vrt(tifs, vrt_path, nodata, verbose):
+            written.append(vrt_path)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update GDAL VRT mosaics over a directory of DTM GeoTIFFs.")
+    parser.add_argument("dtm_dir", type=str, help="Template output directory containing DTM .tif files")
+    parser.add_argument("--clusters", default=None, help="Overlap-cluster CSV from src.overlap_clusters: also write one VRT per cluster")
+    parser.add_argument("--nodata", type=float, default=DEFAULT_NODATA, help=f"Output nodata value of the mosaic (default: {DEFAULT_NODATA:g})")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dtm_dir):
+        print(f"ERROR: DTM directory not found at: {args.dtm_dir}")
+        sys.exit(1)
+
+    if update_vrt(args.dtm_dir, args.nodata) is None:
+        print(f"No DTMs (*.tif) in {args.dtm_dir}")
+        return
+    if args.clusters:
+        update_cluster_vrts(args.dtm_dir, args.clusters, args.nodata)
+
+if __name__ == "__main__":
+    main()